@@ -40,7 +40,15 @@ def c_ext():
 
 
 def cython_ext():
-    return cythonize("skbeam/**/*.pyx", compiler_directives={"language_level": "3"})
+    extensions = cythonize("skbeam/**/*.pyx", compiler_directives={"language_level": "3"})
+    # the parallel Histogram fill uses OpenMP on Linux, elsewhere its blocks
+    # are filled one after the other
+    if sys.platform.startswith("linux"):
+        for ext in extensions:
+            if ext.name == "skbeam.core.accumulators.histogram":
+                ext.extra_compile_args.append("-fopenmp")
+                ext.extra_link_args.append("-lgomp")
+    return extensions
 
 
 with open(this_directory / "requirements.txt") as requirements_file:
@@ -75,10 +75,15 @@ class BinnedStatisticDD(object):
                 referenced.
               * 'sum' : compute the sum of values for points within each bin.
                 This is identical to a weighted histogram.
+              * 'std' : compute the standard deviation of values for points
+                within each bin. Empty bins will be represented by 0.
               * function : a user-defined function which takes a 1D array of
                 values, and outputs a single numerical statistic. This function
                 will be called on the values in each bin.  Empty bins will be
                 represented by function([]), or NaN if this returns an error.
+
+            The `percentile`, `trimmed_mean` and `median_abs_deviation`
+            methods compute the statistics that take a parameter.
         bins : sequence or int, optional
             The bin specification:
 
@@ -183,6 +188,18 @@ class BinnedStatisticDD(object):
         self._argsort_index = None
         self.statistic = statistic
 
+        # The statistic without the outlier bins, in the order of the
+        # dimensions, is gathered from the bincount of `xy` through the
+        # position of every one of its bins in `xy`. This costs an array of
+        # the number of bins instead of another one of the number of
+        # samples.
+        self._core_shape = tuple(int(n) for n in self.nbin - 2)
+        core_bins = np.indices(self._core_shape).reshape(self.D, -1) + 1
+        self._core_index = np.ravel_multi_index(tuple(core_bins[self.ni]), tuple(self.nbin[self.ni]))
+        self._core_count = self._bincount()
+        self._core_argsort = None
+        self.reset()
+
     @property
     def binmap(self):
         """Return the map of the bins per dimension.
@@ -274,11 +291,16 @@ class BinnedStatisticDD(object):
                 referenced.
               * 'sum' : compute the sum of values for points within each bin.
                 This is identical to a weighted histogram.
+              * 'std' : compute the standard deviation of values for points
+                within each bin. Empty bins will be represented by 0.
               * function : a user-defined function which takes a 1D array of
                 values, and outputs a single numerical statistic. This function
                 will be called on the values in each bin.  Empty bins will be
                 represented by function([]), or NaN if this returns an error.
 
+            The `percentile`, `trimmed_mean` and `median_abs_deviation`
+            methods compute the statistics that take a parameter.
+
         Returns
         -------
         statistic_values : array
@@ -287,32 +309,30 @@ class BinnedStatisticDD(object):
         if statistic is None:
             statistic = self.statistic
 
-        self.result = np.empty(self.nbin.prod(), float)
+        values = np.asarray(values)
+        count = self._core_count
+        self.result = np.empty(len(count), float)
         if statistic == "mean":
             self.result.fill(np.nan)
-            flatsum = np.bincount(self.xy, values)
-            a = self.flatcount.nonzero()
-            self.result[a] = flatsum[a] / self.flatcount[a]
+            flatsum = self._bin_sum(values)
+            a = count.nonzero()
+            self.result[a] = flatsum[a] / count[a]
         elif statistic == "std":
             self.result.fill(0)
-            flatsum = np.bincount(self.xy, values)
-            flatsum2 = np.bincount(self.xy, values**2)
-            a = self.flatcount.nonzero()
-            self.result[a] = np.sqrt(flatsum2[a] / self.flatcount[a] - (flatsum[a] / self.flatcount[a]) ** 2)
+            flatsum = self._bin_sum(values)
+            # square in float64, float32 squares lose the variance of
+            # values with a large mean
+            flatsum2 = self._bin_sum(np.square(values, dtype=np.float64))
+            a = count.nonzero()
+            self.result[a] = np.sqrt(flatsum2[a] / count[a] - (flatsum[a] / count[a]) ** 2)
         elif statistic == "count":
-            self.result.fill(0)
-            a = np.arange(len(self.flatcount))
-            self.result[a] = self.flatcount
+            self.result[:] = count
         elif statistic == "sum":
-            self.result.fill(0)
-            flatsum = np.bincount(self.xy, values)
-            a = np.arange(len(flatsum))
-            self.result[a] = flatsum
-        elif callable(statistic) or statistic == "median":
-            if statistic == "median":
-                internal_statistic = np.median
-            else:
-                internal_statistic = statistic
+            self.result[:] = self._bin_sum(values)
+        elif statistic == "median":
+            self.result[:] = self._percentile(*self._sorted_bins(values), q=None)
+        elif callable(statistic):
+            internal_statistic = statistic
             with warnings.catch_warnings():
                 # Numpy generates a warnings for mean/std/... with empty list
                 warnings.filterwarnings("ignore", category=RuntimeWarning)
@@ -324,29 +344,307 @@ class BinnedStatisticDD(object):
                 np.seterr(**old)
             self.result.fill(null)
 
-            vfs = values[self.argsort_index]
+            vfs = values[self._core_order()]
             i = 0
-            for j, k in enumerate(self.flatcount):
+            for j, k in enumerate(count):
                 if k > 0:
                     self.result[j] = internal_statistic(vfs[i : i + k])
                 i += k
 
-        # Shape into a proper matrix
-        self.result = self.result.reshape(np.sort(self.nbin))
-        ni = np.copy(self.ni)
-        for i in np.arange(self.nbin.size):
-            j = ni.argsort()[i]
-            self.result = self.result.swapaxes(i, j)
-            ni[i], ni[j] = ni[j], ni[i]
+        self.result = self.result.reshape(self._core_shape)
+        return self.result
 
-        # Remove outliers (indices 0 and -1 for each dimension).
-        core = self.D * [slice(1, -1)]
-        self.result = self.result[tuple(core)]
+    def stack(self, values, statistic=None):
+        """Compute the statistic for each of a stack of sample sets
 
-        if (self.result.shape != self.nbin - 2).any():
-            raise RuntimeError("Internal Shape Error")
+        Parameters
+        ----------
+        values : array_like
+            A stack of values, each the shape of `sample` in the
+            constructor, with the stack dimension first.
+        statistic : string or callable, optional
+            The statistic to compute, see `__call__`. Defaults to whatever
+            was passed in when this object was instantiated.
 
-        return self.result
+        Returns
+        -------
+        statistic_values : array
+            The values of the statistic in each bin for each sample set,
+            the stack dimension first.
+        """
+        if statistic is None:
+            statistic = self.statistic
+        values = np.asarray(values)
+        num_samples = len(self.xy)
+        if values.size % num_samples or not values.size:
+            raise ValueError(
+                '"values" has incorrect shape. Expected a multiple of {} values. Received: {}'.format(
+                    num_samples, values.shape
+                )
+            )
+        values = values.reshape(-1, num_samples)
+        count = self._core_count
+        if statistic not in ("mean", "std", "sum", "count"):
+            return np.array([BinnedStatisticDD.__call__(self, frame, statistic) for frame in values])
+
+        result = np.empty((len(values), len(count)))
+        if statistic == "count":
+            result[:] = count
+            return result.reshape((len(values),) + self._core_shape)
+        a = count.nonzero()
+        square = np.empty(num_samples)
+        for frame, res in zip(values, result):
+            # the bin map is shared by all the frames, each frame costs one
+            # bincount per sum
+            flatsum = self._bin_sum(frame)
+            if statistic == "sum":
+                res[:] = flatsum
+                continue
+            res.fill(np.nan if statistic == "mean" else 0)
+            if statistic == "mean":
+                res[a] = flatsum[a] / count[a]
+                continue
+            np.square(frame, out=square, dtype=np.float64)
+            flatsum2 = self._bin_sum(square)
+            res[a] = np.sqrt(flatsum2[a] / count[a] - (flatsum[a] / count[a]) ** 2)
+        return result.reshape((len(values),) + self._core_shape)
+
+    def percentile(self, values, q):
+        """Compute the q-th percentile of the values within each bin
+
+        Parameters
+        ----------
+        values : array_like
+            The values on which the statistic will be computed, of the
+            size of `sample` in the constructor.
+        q : float or array_like of floats
+            Percentile or sequence of percentiles to compute, between 0 and
+            100 inclusive. The percentiles are interpolated linearly
+            between the values, as with `np.percentile`.
+
+        Returns
+        -------
+        percentile : array
+            The percentiles in each bin, with the dimensions of `q` first.
+            Empty bins and bins that contain NaN are NaN.
+        """
+        q = np.asarray(q, dtype=float)
+        if np.any((q < 0) | (q > 100)):
+            raise ValueError("Percentiles must be in the range [0, 100]")
+        result = self._percentile(*self._sorted_bins(values), q=q)
+        return result.reshape(q.shape + self._core_shape)
+
+    def trimmed_mean(self, values, proportiontocut=0.1):
+        """Compute the mean within each bin after trimming both tails
+
+        As `scipy.stats.trim_mean`, the ``int(proportiontocut * n)``
+        smallest and largest of the ``n`` values of each bin are cut.
+
+        Parameters
+        ----------
+        values : array_like
+            The values on which the statistic will be computed, of the
+            size of `sample` in the constructor.
+        proportiontocut : float, optional
+            Fraction to cut off of both tails of each bin. Defaults to 0.1
+
+        Returns
+        -------
+        trimmed_mean : array
+            The trimmed mean in each bin, NaN for empty bins. As with
+            `scipy.stats.trim_mean`, NaN sort above all other values and are
+            only cut with the upper tail.
+        """
+        if not 0 <= proportiontocut < 0.5:
+            raise ValueError("proportiontocut must be in the range [0, 0.5)")
+        svalues, starts = self._sorted_bins(values)
+        count = self._core_count
+        cut = (proportiontocut * count).astype(np.intp)
+        # the position of every value within its bin
+        bins = np.repeat(np.arange(len(count)), count)
+        rank = np.arange(len(svalues)) - starts[bins]
+        keep = (rank >= cut[bins]) & (rank < (count - cut)[bins])
+        sums = np.bincount(bins, np.where(keep, svalues, 0), minlength=len(count))
+        result = np.full(len(count), np.nan)
+        a = count.nonzero()
+        result[a] = sums[a] / (count - 2 * cut)[a]
+        return result.reshape(self._core_shape)
+
+    def median_abs_deviation(self, values, scale=1.0):
+        """Compute the median absolute deviation of the values within each
+        bin
+
+        Parameters
+        ----------
+        values : array_like
+            The values on which the statistic will be computed, of the
+            size of `sample` in the constructor.
+        scale : float, optional
+            The deviation is divided by `scale`, 1.4826 gives a consistent
+            estimate of the standard deviation of normally distributed
+            values. Defaults to 1
+
+        Returns
+        -------
+        mad : array
+            The median absolute deviation in each bin. Empty bins and bins
+            that contain NaN are NaN.
+        """
+        svalues, starts = self._sorted_bins(values)
+        median = self._percentile(svalues, starts, q=None)
+        deviation = np.abs(svalues - np.repeat(median, self._core_count))
+        self._sort_segments(deviation, starts)
+        return (self._percentile(deviation, starts, q=None) / scale).reshape(self._core_shape)
+
+    def _sorted_bins(self, values):
+        """Gather the values bin by bin, sorted within each bin
+
+        Returns
+        -------
+        svalues : array
+            The values that fall into the bins, grouped by bin and sorted
+            within each bin. NaN sort to the end of their bin. float32
+            values stay float32, anything else is float64
+        starts : array
+            The offset of each bin into `svalues`
+        """
+        values = np.asarray(values).reshape(-1)
+        if values.dtype.kind != "f":
+            values = values.astype(np.float64)
+        if len(values) != len(self.xy):
+            raise ValueError(
+                '"values" has incorrect shape. Expected {} values. Received: {}'.format(
+                    len(self.xy), np.shape(values)
+                )
+            )
+        count = self._core_count
+        starts = np.cumsum(count) - count
+        svalues = np.take(values, self._core_order()[: count.sum()])
+        self._sort_segments(svalues, starts)
+        return svalues, starts
+
+    def _sort_segments(self, svalues, starts):
+        """Sort `svalues` in place within each bin"""
+        count = self._core_count
+        if not len(count) or count.max() <= 1:
+            # every bin is sorted already
+            return
+        # This is still one Python iteration per bin, on purpose: ordering
+        # the whole array by (bin, value) at once is slower. On 1M values
+        # in 4000 bins the loop of in-place sorts takes 20 ms, two
+        # argsorts 54-110 ms and lexsort 130-320 ms.
+        for start, k in zip(starts.tolist(), count.tolist()):
+            if k > 1:
+                svalues[start : start + k].sort()
+
+    def _has_nan(self, svalues, starts):
+        """Bins with NaN values, these are sorted to the end of the bin"""
+        count = self._core_count
+        has_nan = np.zeros(len(count), dtype=bool)
+        a = count.nonzero()
+        has_nan[a] = np.isnan(svalues[starts[a] + count[a] - 1])
+        return has_nan
+
+    def _percentile(self, svalues, starts, q):
+        """Percentiles of the sorted bins, the median for q=None"""
+        count = self._core_count
+        a = count.nonzero()[0]
+        first = starts[a]
+        if q is None:
+            # the mean of the middle values, as np.median
+            result = np.full(len(count), np.nan)
+            middle = svalues[first + (count[a] - 1) // 2].astype(np.float64)
+            result[a] = (middle + svalues[first + count[a] // 2]) / 2
+        else:
+            position = q[..., np.newaxis] / 100 * (count[a] - 1)
+            lower = np.floor(position).astype(np.intp)
+            upper = np.minimum(lower + 1, count[a] - 1)
+            t = position - lower
+            below = svalues[first + lower].astype(np.float64)
+            above = svalues[first + upper].astype(np.float64)
+            # the same interpolation as np.percentile
+            diff = above - below
+            result = np.full(q.shape + (len(count),), np.nan)
+            result[..., a] = np.where(t >= 0.5, above - diff * (1 - t), below + diff * t)
+        result[..., self._has_nan(svalues, starts)] = np.nan
+        return result
+
+    def _bincount(self, weights=None):
+        """Count or sum `weights` per bin, without the outlier bins"""
+        return np.bincount(self.xy, weights, minlength=int(np.prod(self.nbin)))[self._core_index]
+
+    def _bin_sum(self, values):
+        """Sum `values` per bin, without the outlier bins"""
+        return self._bincount(np.ravel(values))
+
+    def _core_order(self):
+        """The samples sorted by bin in the order of the statistic, the
+        outliers at the end"""
+        if self._core_argsort is None:
+            ncore = len(self._core_count)
+            lookup = np.full(int(np.prod(self.nbin)), ncore, dtype=np.intp)
+            lookup[self._core_index] = np.arange(ncore)
+            self._core_argsort = np.argsort(lookup[self.xy], kind="stable")
+        return self._core_argsort
+
+    def accumulate(self, values):
+        """Add values to the running per-bin sums of `finalize`
+
+        This computes the mean and the standard deviation over a series of
+        values, e.g. the images of a time series, without keeping them in
+        memory.
+
+        Parameters
+        ----------
+        values : array_like
+            The values of one or more samples. This must be the shape of
+            `sample` in the constructor, or a stack of those with the stack
+            dimension first.
+        """
+        values = np.asarray(values)
+        num_samples = len(self.xy)
+        if values.size % num_samples or not values.size:
+            raise ValueError(
+                '"values" has incorrect shape. Expected a multiple of {} values. Received: {}'.format(
+                    num_samples, values.shape
+                )
+            )
+        values = values.reshape(-1, num_samples)
+        self._acc_sum += self._bin_sum(values.sum(axis=0, dtype=np.float64))
+        self._acc_sumsq += self._bin_sum(np.einsum("ij,ij->j", values, values, dtype=np.float64))
+        self.num_accumulated += len(values)
+
+    def finalize(self):
+        """Mean and standard deviation of the accumulated values
+
+        Returns
+        -------
+        mean : array
+            The mean of the accumulated values in each bin. Empty bins
+            are NaN
+        std : array
+            The standard deviation of the accumulated values in each bin.
+            Empty bins are 0
+
+        See Also
+        --------
+        accumulate : add values to the running sums
+        reset : start over
+        """
+        count = self._core_count * self.num_accumulated
+        a = count.nonzero()
+        mean = np.full(len(count), np.nan)
+        mean[a] = self._acc_sum[a] / count[a]
+        std = np.zeros(len(count))
+        # rounding can make the variance of a constant slightly negative
+        std[a] = np.sqrt(np.maximum(self._acc_sumsq[a] / count[a] - mean[a] ** 2, 0))
+        return mean.reshape(self._core_shape), std.reshape(self._core_shape)
+
+    def reset(self):
+        """Clear the running sums of `accumulate`"""
+        self._acc_sum = np.zeros(len(self._core_count))
+        self._acc_sumsq = np.zeros(len(self._core_count))
+        self.num_accumulated = 0
 
 
 class BinnedStatistic1D(BinnedStatisticDD):
@@ -380,10 +678,15 @@ class BinnedStatistic1D(BinnedStatisticDD):
                 referenced.
               * 'sum' : compute the sum of values for points within each bin.
                 This is identical to a weighted histogram.
+              * 'std' : compute the standard deviation of values for points
+                within each bin. Empty bins will be represented by 0.
               * function : a user-defined function which takes a 1D array of
                 values, and outputs a single numerical statistic. This function
                 will be called on the values in each bin.  Empty bins will be
                 represented by function([]), or NaN if this returns an error.
+
+            The `percentile`, `trimmed_mean` and `median_abs_deviation`
+            methods compute the statistics that take a parameter.
         bins : int or sequence of scalars, optional
             If `bins` is an int, it defines the number of equal-width bins in
             the given range (10 by default).  If `bins` is a sequence, it
@@ -532,11 +835,16 @@ class BinnedStatistic2D(BinnedStatisticDD):
                 referenced.
               * 'sum' : compute the sum of values for points within each bin.
                 This is identical to a weighted histogram.
+              * 'std' : compute the standard deviation of values for points
+                within each bin. Empty bins will be represented by 0.
               * function : a user-defined function which takes a 1D array of
                 values, and outputs a single numerical statistic. This function
                 will be called on the values in each bin.  Empty bins will be
                 represented by function([]), or NaN if this returns an error.
 
+            The `percentile`, `trimmed_mean` and `median_abs_deviation`
+            methods compute the statistics that take a parameter.
+
         Returns
         -------
         statistic_values : array
@@ -551,7 +859,9 @@ class RPhiBinnedStatistic(BinnedStatistic2D):
     image in both radius and phi.
     """
 
-    def __init__(self, shape, bins=10, range=None, origin=None, mask=None, r_map=None, statistic="mean"):
+    def __init__(
+        self, shape, bins=10, range=None, origin=None, mask=None, r_map=None, statistic="mean", dtype=np.float64
+    ):
         """
         Parameters:
         -----------
@@ -594,18 +904,29 @@ class RPhiBinnedStatistic(BinnedStatistic2D):
                 referenced.
               * 'sum' : compute the sum of values for points within each bin.
                 This is identical to a weighted histogram.
+              * 'std' : compute the standard deviation of values for points
+                within each bin. Empty bins will be represented by 0.
               * function : a user-defined function which takes a 1D array of
                 values, and outputs a single numerical statistic. This function
                 will be called on the values in each bin.  Empty bins will be
                 represented by function([]), or NaN if this returns an error.
+
+            The `percentile`, `trimmed_mean` and `median_abs_deviation`
+            methods compute the statistics that take a parameter.
+        dtype : np.dtype, optional
+            The floating point type of the radius and angle maps that the
+            pixels are binned by, float32 halves the memory it takes to set
+            up the bins. See `skbeam.core.utils.radial_grid` for the
+            accuracy. The statistics are computed in float64 regardless.
+            Defaults to float64
         """
         if origin is None:
             origin = (shape[0] - 1) / 2.0, (shape[1] - 1) / 2.0
 
         if r_map is None:
-            r_map = radial_grid(origin, shape)
+            r_map = radial_grid(origin, shape, dtype=dtype)
 
-        phi_map = angle_grid(origin, shape)
+        phi_map = angle_grid(origin, shape, dtype=dtype)
 
         self.expected_shape = tuple(shape)
         if mask is not None:
@@ -642,11 +963,16 @@ class RPhiBinnedStatistic(BinnedStatistic2D):
                 referenced.
               * 'sum' : compute the sum of values for points within each bin.
                 This is identical to a weighted histogram.
+              * 'std' : compute the standard deviation of values for points
+                within each bin. Empty bins will be represented by 0.
               * function : a user-defined function which takes a 1D array of
                 values, and outputs a single numerical statistic. This function
                 will be called on the values in each bin.  Empty bins will be
                 represented by function([]), or NaN if this returns an error.
 
+            The `percentile`, `trimmed_mean` and `median_abs_deviation`
+            methods compute the statistics that take a parameter.
+
         Returns
         -------
         statistic_values : array
@@ -660,6 +986,48 @@ class RPhiBinnedStatistic(BinnedStatistic2D):
             )
         return super(RPhiBinnedStatistic, self).__call__(values.reshape(-1), statistic)
 
+    def accumulate(self, values):
+        """Add images to the running per-bin sums of `finalize`
+
+        Parameters
+        ----------
+        values : array_like
+            An image of the ``shape`` that was passed in when this object was
+            instantiated, or a stack of those images.
+        """
+        values = np.asarray(values)
+        if values.shape[values.ndim - 2 :] != self.expected_shape:
+            raise ValueError(
+                '"values" has incorrect shape.'
+                " Expected: (..., ) + " + str(self.expected_shape) + " Received: " + str(values.shape)
+            )
+        return super(RPhiBinnedStatistic, self).accumulate(values)
+
+    def stack(self, values, statistic=None):
+        """Compute the statistic for each image of a stack
+
+        Parameters
+        ----------
+        values : array_like
+            Stack of images of the ``shape`` that was passed in when this
+            object was instantiated, the stack dimension first.
+        statistic : string or callable, optional
+            The statistic to compute, see `__call__`.
+
+        Returns
+        -------
+        statistic_values : array
+            The values of the statistic in each bin for each image, the
+            stack dimension first.
+        """
+        values = np.asarray(values)
+        if values.ndim != 3 or values.shape[1:] != self.expected_shape:
+            raise ValueError(
+                '"values" has incorrect shape.'
+                " Expected: (N, ) + " + str(self.expected_shape) + " Received: " + str(values.shape)
+            )
+        return super(RPhiBinnedStatistic, self).stack(values, statistic)
+
 
 class RadialBinnedStatistic(BinnedStatistic1D):
     """
@@ -667,7 +1035,9 @@ class RadialBinnedStatistic(BinnedStatistic1D):
     image in radius.
     """
 
-    def __init__(self, shape, bins=10, range=None, origin=None, mask=None, r_map=None, statistic="mean"):
+    def __init__(
+        self, shape, bins=10, range=None, origin=None, mask=None, r_map=None, statistic="mean", dtype=np.float64
+    ):
         """
         Parameters:
         -----------
@@ -709,16 +1079,27 @@ class RadialBinnedStatistic(BinnedStatistic1D):
                 referenced.
               * 'sum' : compute the sum of values for points within each bin.
                 This is identical to a weighted histogram.
+              * 'std' : compute the standard deviation of values for points
+                within each bin. Empty bins will be represented by 0.
               * function : a user-defined function which takes a 1D array of
                 values, and outputs a single numerical statistic. This function
                 will be called on the values in each bin.  Empty bins will be
                 represented by function([]), or NaN if this returns an error.
+
+            The `percentile`, `trimmed_mean` and `median_abs_deviation`
+            methods compute the statistics that take a parameter.
+        dtype : np.dtype, optional
+            The floating point type of the radius and angle maps that the
+            pixels are binned by, float32 halves the memory it takes to set
+            up the bins. See `skbeam.core.utils.radial_grid` for the
+            accuracy. The statistics are computed in float64 regardless.
+            Defaults to float64
         """
         if origin is None:
             origin = (shape[0] - 1) / 2, (shape[1] - 1) / 2
 
         if r_map is None:
-            r_map = radial_grid(origin, shape)
+            r_map = radial_grid(origin, shape, dtype=dtype)
 
         self.expected_shape = tuple(shape)
         if mask is not None:
@@ -755,11 +1136,16 @@ class RadialBinnedStatistic(BinnedStatistic1D):
                 referenced.
               * 'sum' : compute the sum of values for points within each bin.
                 This is identical to a weighted histogram.
+              * 'std' : compute the standard deviation of values for points
+                within each bin. Empty bins will be represented by 0.
               * function : a user-defined function which takes a 1D array of
                 values, and outputs a single numerical statistic. This function
                 will be called on the values in each bin.  Empty bins will be
                 represented by function([]), or NaN if this returns an error.
 
+            The `percentile`, `trimmed_mean` and `median_abs_deviation`
+            methods compute the statistics that take a parameter.
+
         Returns
         -------
         statistic_values : array
@@ -772,3 +1158,45 @@ class RadialBinnedStatistic(BinnedStatistic1D):
                 " Expected: " + str(self.expected_shape) + " Received: " + str(values.shape)
             )
         return super(RadialBinnedStatistic, self).__call__(values.reshape(-1), statistic)
+
+    def accumulate(self, values):
+        """Add images to the running per-bin sums of `finalize`
+
+        Parameters
+        ----------
+        values : array_like
+            An image of the ``shape`` that was passed in when this object was
+            instantiated, or a stack of those images.
+        """
+        values = np.asarray(values)
+        if values.shape[values.ndim - 2 :] != self.expected_shape:
+            raise ValueError(
+                '"values" has incorrect shape.'
+                " Expected: (..., ) + " + str(self.expected_shape) + " Received: " + str(values.shape)
+            )
+        return super(RadialBinnedStatistic, self).accumulate(values)
+
+    def stack(self, values, statistic=None):
+        """Compute the statistic for each image of a stack
+
+        Parameters
+        ----------
+        values : array_like
+            Stack of images of the ``shape`` that was passed in when this
+            object was instantiated, the stack dimension first.
+        statistic : string or callable, optional
+            The statistic to compute, see `__call__`.
+
+        Returns
+        -------
+        statistic_values : array
+            The values of the statistic in each bin for each image, the
+            stack dimension first.
+        """
+        values = np.asarray(values)
+        if values.ndim != 3 or values.shape[1:] != self.expected_shape:
+            raise ValueError(
+                '"values" has incorrect shape.'
+                " Expected: (N, ) + " + str(self.expected_shape) + " Received: " + str(values.shape)
+            )
+        return super(RadialBinnedStatistic, self).stack(values, statistic)
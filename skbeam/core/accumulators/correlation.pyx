@@ -0,0 +1,196 @@
+"""
+Correlation
+
+Compiled inner loops of the multi-tau one time and two time correlation
+in `skbeam.core.correlation`.  The multiply, the ROI reduction and the
+running mean update are fused into a single loop over the pixel list that
+runs without the GIL.
+"""
+cimport cython
+
+import numpy as np
+
+cimport numpy as np
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _roi_sums(const double[::1] img, const np.intp_t[::1] labels,
+                    double[::1] sums, bint* isbad) noexcept nogil:
+    cdef Py_ssize_t p
+    cdef double value
+    sums[:] = 0
+    isbad[0] = False
+    for p in range(labels.shape[0]):
+        value = img[p]
+        if value != value:
+            isbad[0] = True
+        sums[labels[p]] += value
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _one_time_kernel(const double[:, ::1] buf, Py_ssize_t buf_no,
+                           const np.intp_t[::1] delay_no,
+                           const np.intp_t[::1] t_index,
+                           const double[::1] normalize,
+                           const np.intp_t[::1] labels,
+                           const double[::1] num_pixels,
+                           const double[:, ::1] buf_sums,
+                           double[:, ::1] G,
+                           double[:, ::1] past_intensity_norm,
+                           double[:, ::1] future_intensity_norm,
+                           double[::1] binned) noexcept nogil:
+    cdef Py_ssize_t k, p, r, t, past_no
+    cdef Py_ssize_t num_rois = G.shape[1]
+    for k in range(delay_no.shape[0]):
+        past_no = delay_no[k]
+        t = t_index[k]
+        binned[:] = 0
+        for p in range(labels.shape[0]):
+            binned[labels[p]] += buf[past_no, p] * buf[buf_no, p]
+        for r in range(num_rois):
+            G[t, r] += (binned[r + 1] / num_pixels[r] - G[t, r]) / normalize[k]
+            past_intensity_norm[t, r] += (
+                buf_sums[past_no, r] / num_pixels[r] - past_intensity_norm[t, r]) / normalize[k]
+            future_intensity_norm[t, r] += (
+                buf_sums[buf_no, r] / num_pixels[r] - future_intensity_norm[t, r]) / normalize[k]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _two_time_kernel(const double[:, ::1] buf, Py_ssize_t buf_no,
+                           const np.intp_t[::1] delay_no,
+                           const np.intp_t[::1] labels,
+                           const double[::1] num_pixels,
+                           double[:, ::1] out,
+                           double[:, ::1] binned) noexcept nogil:
+    cdef Py_ssize_t k, p, r, label, past_no
+    cdef double past, future
+    cdef Py_ssize_t num_rois = out.shape[1]
+    for k in range(delay_no.shape[0]):
+        past_no = delay_no[k]
+        binned[:, :] = 0
+        for p in range(labels.shape[0]):
+            label = labels[p]
+            past = buf[past_no, p]
+            future = buf[buf_no, p]
+            binned[0, label] += past * future
+            binned[1, label] += past
+            binned[2, label] += future
+        for r in range(num_rois):
+            out[k, r] = binned[0, r + 1] / (binned[1, r + 1] * binned[2, r + 1]) * num_pixels[r]
+
+
+def one_time_process(buf, G, past_intensity_norm, future_intensity_norm,
+                     label_array, num_bufs, num_pixels, img_per_level, level,
+                     buf_no, norm, lev_len, buf_sums, buf_bad):
+    """Compiled implementation of the inner loop of multi-tau one time
+    correlation
+
+    Drop-in replacement for
+    `skbeam.core.correlation._one_time_process_vectorized`, see there for
+    the description of the parameters.
+
+    .. warning :: This modifies inputs in place.
+    """
+    cdef bint isbad
+    cdef const np.intp_t[::1] labels = np.ascontiguousarray(label_array, dtype=np.intp)
+    npix = np.ascontiguousarray(num_pixels, dtype=np.float64)
+    cdef double[:, ::1] level_buf = buf[level]
+    cdef double[:, ::1] level_sums = buf_sums[level]
+    # lazy_one_time and lazy_two_time may pass buf_no = -1
+    cdef Py_ssize_t c_buf_no = buf_no % num_bufs
+
+    cdef double[::1] sums = np.empty(G.shape[1] + 1)
+
+    img_per_level[level] += 1
+    with nogil:
+        _roi_sums(level_buf[c_buf_no], labels, sums, &isbad)
+    # the background is accumulated into element 0
+    buf_sums[level, buf_no] = sums[1:]
+    buf_bad[level, buf_no] = isbad
+
+    # in multi-tau correlation, the subsequent levels have half as many
+    # buffers as the first
+    i_min = num_bufs // 2 if level else 0
+    lags = np.arange(i_min, min(img_per_level[level], num_bufs))
+    if not len(lags):
+        return None
+    t_index = level * num_bufs // 2 + lags
+    delay_no = (buf_no - lags) % num_bufs
+
+    # find the normalization that can work both for bad_images
+    #  and good_images
+    ind = t_index - lev_len[:level].sum()
+    normalize = img_per_level[level] - lags - np.take(norm[level + 1], ind)
+
+    # take out the past_ing and future_img created using bad images
+    # (bad images are converted to np.nan array)
+    bad = buf_bad[level, delay_no] | buf_bad[level, buf_no]
+    for j in ind[bad]:
+        norm[level + 1][j] += 1
+
+    cdef const np.intp_t[::1] c_delay_no = np.ascontiguousarray(delay_no[~bad], dtype=np.intp)
+    cdef const np.intp_t[::1] c_t_index = np.ascontiguousarray(t_index[~bad], dtype=np.intp)
+    cdef const double[::1] c_normalize = np.ascontiguousarray(normalize[~bad], dtype=np.float64)
+    cdef const double[::1] c_num_pixels = npix
+    cdef double[:, ::1] c_G = G
+    cdef double[:, ::1] c_past = past_intensity_norm
+    cdef double[:, ::1] c_future = future_intensity_norm
+    cdef double[::1] binned = np.empty(G.shape[1] + 1)
+    with nogil:
+        _one_time_kernel(level_buf, c_buf_no, c_delay_no, c_t_index,
+                         c_normalize, labels, c_num_pixels, level_sums,
+                         c_G, c_past, c_future, binned)
+    return None  # modifies arguments in place!
+
+
+def two_time_process(buf, g2, label_array, num_bufs, num_pixels,
+                     img_per_level, lag_steps, current_img_time, level,
+                     buf_no):
+    """Compiled implementation of the inner loop of multi-tau two time
+    correlation
+
+    Drop-in replacement for `skbeam.core.correlation._two_time_process`,
+    see there for the description of the parameters.
+
+    .. warning :: This modifies inputs in place.
+    """
+    img_per_level[level] += 1
+
+    # in multi-tau correlation other than first level all other levels
+    #  have to do the half of the correlation
+    i_min = num_bufs // 2 if level else 0
+    lags = np.arange(i_min, min(img_per_level[level], num_bufs))
+    t_index = level * num_bufs // 2 + lags
+    num_rois = len(num_pixels)
+
+    cdef double[:, ::1] level_buf = buf[level]
+    # lazy_one_time and lazy_two_time may pass buf_no = -1
+    cdef Py_ssize_t c_buf_no = buf_no % num_bufs
+    cdef const np.intp_t[::1] c_delay_no = np.ascontiguousarray((buf_no - lags) % num_bufs, dtype=np.intp)
+    cdef const np.intp_t[::1] c_labels = np.ascontiguousarray(label_array, dtype=np.intp)
+    cdef const double[::1] c_num_pixels = np.ascontiguousarray(num_pixels, dtype=np.float64)
+    corr = np.empty((len(lags), num_rois))
+    cdef double[:, ::1] c_corr = corr
+    cdef double[:, ::1] binned = np.empty((3, num_rois + 1))
+    with nogil:
+        _two_time_kernel(level_buf, c_buf_no, c_delay_no, c_labels,
+                         c_num_pixels, c_corr, binned)
+
+    tind1 = current_img_time - 1
+    for k, t in enumerate(t_index):
+        tind2 = current_img_time - lag_steps[t] - 1
+        if not isinstance(current_img_time, int):
+            nshift = 2 ** (level - 1)
+            for i in range(-nshift + 1, nshift + 1):
+                g2[:, int(tind1 + i), int(tind2 + i)] = corr[k]
+        else:
+            g2[:, int(tind1), int(tind2)] = corr[k]
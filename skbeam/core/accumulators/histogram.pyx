@@ -6,12 +6,14 @@ Histogram
 General purpose histogram classes.
 """
 cimport cython
+from cython.parallel cimport parallel, prange
 
 import numpy as np
 
 cimport numpy as np
 
 import logging
+import os
 
 from ..utils import bin_edges_to_centers
 
@@ -105,7 +107,30 @@ class Histogram:
         self._values.fill(0)
 
 
-    def fill(self, *coords, weights=1):
+    def merge(self, other):
+        """Add the counts of another histogram with the same binning
+
+        Use this to combine partial histograms filled e.g. in worker
+        processes.
+
+        Parameters
+        ----------
+        other : Histogram
+            Histogram with the same bins, low and high edges
+
+        Returns
+        -------
+        self : Histogram
+        """
+        if not (np.array_equal(self._nbins, other._nbins)
+                and np.array_equal(self._lows, other._lows)
+                and np.array_equal(self._highs, other._highs)):
+            raise ValueError("Cannot merge histograms with different bins.")
+        self._values += other._values
+        return self
+
+
+    def fill(self, *coords, weights=1, num_threads=1):
         """
 
         Parameters
@@ -117,6 +142,13 @@ class Histogram:
         weights: int/float/np.ndarray, optional.  Defaults to 1.
             The amount each histogram bin (determined by coords) is
             to be incremented.
+        num_threads : int, optional
+            Number of threads to fill with, -1 uses all CPUs. Each thread
+            fills a private histogram over a contiguous block of the
+            coordinates and the private histograms are added in order, so
+            the result does not depend on the scheduling of the threads.
+            Defaults to 1. Without OpenMP support in the build, the blocks
+            are filled one after the other.
 
         Returns
         -------
@@ -147,6 +179,14 @@ class Histogram:
             emsg = ("Weights must be scalar or have the same length "
                     "as coordinates.")
             raise ValueError(emsg)
+        if num_threads == -1:
+            num_threads = os.cpu_count() or 1
+        if num_threads < 1:
+            raise ValueError(
+                "num_threads must be at least 1, or -1 for all CPUs. Got {}".format(num_threads))
+        if num_threads > 1:
+            self._fill_parallel(coords, weights, num_threads)
+            return
         if self._always_use_fillnd:
             self._fillnd(coords, weights)
             return
@@ -269,6 +309,102 @@ class Histogram:
         return
 
 
+    def _fill_parallel(self, coords, weights, int num_threads):
+        coords = [np.ascontiguousarray(x) for x in coords]
+        weights = np.ascontiguousarray(weights)
+        # one private histogram per block of coordinates
+        local = np.zeros((num_threads, self._values.size))
+        if len(coords) == 1 and not self._always_use_fillnd:
+            self._fill1d_blocks(coords[0], weights, local)
+        elif len(coords) == 2 and not self._always_use_fillnd:
+            self._fill2d_blocks(coords[0], coords[1], weights, local)
+        else:
+            for x in coords:
+                if x.dtype not in (int, np.int32, np.int64, np.float64):
+                    emsg = "Numpy arrays of type {} are not supported."
+                    raise TypeError(emsg.format(x.dtype))
+            self._fillnd_blocks(
+                np.array(coords, dtype=np.float64), weights.astype(np.float64, copy=False), local)
+        self._values += local.sum(axis=0).reshape(self._values.shape)
+
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def _fill1d_blocks(self, const coordnumtype[::1] xval,
+                       const wnumtype[::1] weight, double[:, ::1] local):
+        cdef double low = self._lows[0]
+        cdef double high = self._highs[0]
+        cdef double binsize = self._binsizes[0]
+        cdef Py_ssize_t wstride = 0 if weight.shape[0] == 1 else 1
+        cdef Py_ssize_t n = xval.shape[0]
+        cdef Py_ssize_t nblocks = local.shape[0]
+        cdef Py_ssize_t block, i
+        cdef long xidx
+        with nogil, parallel(num_threads=nblocks):
+            for block in prange(nblocks, schedule='static', chunksize=1):
+                for i in range(block * n // nblocks, (block + 1) * n // nblocks):
+                    xidx = find_indices(xval[i], low, high, binsize)
+                    if xidx == -1:
+                        continue
+                    local[block, xidx] += weight[wstride * i]
+
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def _fill2d_blocks(self, const coordnumtype[::1] xval,
+                       const coordnumtype[::1] yval,
+                       const wnumtype[::1] weight, double[:, ::1] local):
+        cdef double xlow = self._lows[0], ylow = self._lows[1]
+        cdef double xhigh = self._highs[0], yhigh = self._highs[1]
+        cdef double xbinsize = self._binsizes[0], ybinsize = self._binsizes[1]
+        cdef long ybins = self._nbins[1]
+        cdef Py_ssize_t wstride = 0 if weight.shape[0] == 1 else 1
+        cdef Py_ssize_t n = xval.shape[0]
+        cdef Py_ssize_t nblocks = local.shape[0]
+        cdef Py_ssize_t block, i
+        cdef long xidx, yidx
+        with nogil, parallel(num_threads=nblocks):
+            for block in prange(nblocks, schedule='static', chunksize=1):
+                for i in range(block * n // nblocks, (block + 1) * n // nblocks):
+                    xidx = find_indices(xval[i], xlow, xhigh, xbinsize)
+                    if xidx == -1:
+                        continue
+                    yidx = find_indices(yval[i], ylow, yhigh, ybinsize)
+                    if yidx == -1:
+                        continue
+                    local[block, xidx * ybins + yidx] += weight[wstride * i]
+
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def _fillnd_blocks(self, const double[:, ::1] coords,
+                       const double[::1] weight, double[:, ::1] local):
+        istrides = np.asarray(self._values.strides) // self._values.itemsize
+        cdef const np.intp_t[::1] strides = istrides.astype(np.intp)
+        cdef const double[::1] low = self._lows
+        cdef const double[::1] high = self._highs
+        cdef const double[::1] binsize = self._binsizes
+        cdef Py_ssize_t ndims = coords.shape[0]
+        cdef Py_ssize_t wstride = 0 if weight.shape[0] == 1 else 1
+        cdef Py_ssize_t n = coords.shape[1]
+        cdef Py_ssize_t nblocks = local.shape[0]
+        cdef Py_ssize_t block, i, j
+        cdef long xidx, didx
+        with nogil, parallel(num_threads=nblocks):
+            for block in prange(nblocks, schedule='static', chunksize=1):
+                for i in range(block * n // nblocks, (block + 1) * n // nblocks):
+                    didx = 0
+                    for j in range(ndims):
+                        xidx = find_indices(coords[j, i], low[j], high[j], binsize[j])
+                        if xidx == -1:
+                            didx = -1
+                            break
+                        didx = didx + strides[j] * xidx
+                    if didx == -1:
+                        continue
+                    local[block, didx] += weight[wstride * i]
+
+
     @property
     def values(self):
         return self._values
@@ -283,10 +419,11 @@ class Histogram:
         return [bin_edges_to_centers(edge) for edge in self.edges]
 
 
-cdef long find_indices(coordnumtype pos, double low, double high, double binsize):
+cdef inline long find_indices(coordnumtype pos, double low, double high,
+                              double binsize) noexcept nogil:
     if not (low <= pos < high):
         return -1
-    return int((pos - low) / binsize)
+    return <long>((pos - low) / binsize)
 
 
 cdef void fillonecy(coordnumtype xval, wnumtype weight,
@@ -1,7 +1,7 @@
 import numpy as np
 import pytest
 import scipy.stats
-from numpy.testing import assert_array_almost_equal, assert_raises
+from numpy.testing import assert_array_almost_equal, assert_array_equal, assert_raises
 
 from skbeam.core.accumulators.binned_statistic import (
     BinnedStatistic1D,
@@ -242,3 +242,98 @@ def test_binmap3d():
 
     assert_array_almost_equal(rbinmap1[0][::1000], rbinmap2[0][::1000])
     assert_array_almost_equal(rbinmap1[0][::1000], np.array([1, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1]))
+
+
+def test_accumulate():
+    rs = np.random.RandomState(2)
+    shape = (31, 40)
+    frames = rs.poisson(5, (6,) + shape).astype(np.uint16)
+    mask = rs.randint(0, 5, shape).astype(bool)
+    for binstat in (
+        RadialBinnedStatistic(shape, bins=7, mask=mask),
+        RPhiBinnedStatistic(shape, bins=(5, 4), mask=mask),
+    ):
+        binstat.accumulate(frames[:2])
+        for frame in frames[2:]:
+            binstat.accumulate(frame)
+        assert binstat.num_accumulated == 6
+        mean, std = binstat.finalize()
+        # the mean and std over all frames and all pixels of each bin
+        assert_array_almost_equal(np.mean([binstat(f) for f in frames], axis=0), mean)
+        mean_square = np.mean([binstat(f.astype(float) ** 2) for f in frames], axis=0)
+        assert_array_almost_equal(np.nan_to_num(np.sqrt(mean_square - mean**2)), std)
+
+        assert_raises(ValueError, binstat.accumulate, frames[:, :, :-1])
+        binstat.reset()
+        assert binstat.num_accumulated == 0
+        assert np.all(np.isnan(binstat.finalize()[0]))
+
+
+def test_stack():
+    rs = np.random.RandomState(3)
+    shape = (31, 40)
+    frames = rs.poisson(5, (4,) + shape).astype(np.float32)
+    mask = rs.randint(0, 5, shape).astype(bool)
+    for binstat in (
+        RadialBinnedStatistic(shape, bins=7, mask=mask),
+        RPhiBinnedStatistic(shape, bins=(5, 4), mask=mask),
+    ):
+        for statistic in ("mean", "std", "sum", "count", "median", np.max):
+            stacked = binstat.stack(frames, statistic)
+            assert stacked.shape == (len(frames),) + binstat(frames[0], statistic).shape
+            assert_array_almost_equal(stacked, [binstat(f, statistic) for f in frames], decimal=4)
+        assert_raises(ValueError, binstat.stack, frames[0])
+        assert_raises(ValueError, binstat.stack, frames[:, :, :-1])
+
+
+def test_robust_statistics():
+    rs = np.random.RandomState(4)
+    shape = (31, 40)
+    image = rs.normal(5, 2, shape)
+    image[3, 4] = np.nan
+    mask = rs.randint(0, 5, shape).astype(bool)
+    for binstat in (
+        RadialBinnedStatistic(shape, bins=9, mask=mask),
+        RPhiBinnedStatistic(shape, bins=(5, 4), mask=mask),
+    ):
+        assert_array_almost_equal(binstat(image, "median"), binstat(image, np.median))
+        # the callable gives NaN for empty bins too
+        assert_array_almost_equal(
+            binstat.percentile(image, [10, 50, 97.5]),
+            [binstat(image, lambda x: np.percentile(x, q) if len(x) else np.nan) for q in [10, 50, 97.5]],
+        )
+        assert_array_almost_equal(
+            binstat.trimmed_mean(image, 0.2),
+            binstat(image, lambda x: scipy.stats.trim_mean(x, 0.2) if len(x) else np.nan),
+        )
+        assert_array_almost_equal(
+            binstat.median_abs_deviation(image, scale=1.4826),
+            binstat(image, lambda x: scipy.stats.median_abs_deviation(x, scale=1.4826) if len(x) else np.nan),
+        )
+        assert_raises(ValueError, binstat.percentile, image, 101)
+        assert_raises(ValueError, binstat.trimmed_mean, image, 0.5)
+        assert_raises(ValueError, binstat.median_abs_deviation, image[:, :-1])
+
+    # at most one value per bin, nothing is sorted
+    values = rs.rand(10)
+    binstat = BinnedStatistic1D(np.arange(10.0), bins=np.arange(13.0) - 1.5)
+    expected = np.concatenate([[np.nan], values, [np.nan]])
+    assert_array_equal(binstat(values, "median"), expected)
+    assert_array_equal(binstat.percentile(values, 30), expected)
+    assert_array_equal(binstat.median_abs_deviation(values), np.where(np.isnan(expected), np.nan, 0))
+
+
+def test_float32():
+    rs = np.random.RandomState(6)
+    shape = (300, 320)
+    image = rs.normal(1000, 1, shape).astype(np.float32)
+    for cls, bins in ((RadialBinnedStatistic, 100), (RPhiBinnedStatistic, (50, 8))):
+        binstat = cls(shape, bins=bins, origin=(140.3, 170.6))
+        binstat32 = cls(shape, bins=bins, origin=(140.3, 170.6), dtype=np.float32)
+        # only the pixels within the float32 rounding of a bin edge move
+        assert np.mean(binstat.xy != binstat32.xy) < 1e-3
+
+        # float32 values are summed and squared in float64
+        for statistic in ("mean", "std", "median"):
+            assert_array_almost_equal(binstat(image, statistic), binstat(image.astype(np.float64), statistic))
+        assert binstat(image, "std").dtype == np.float64
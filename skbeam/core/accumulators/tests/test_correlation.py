@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose, assert_array_equal
+
+from skbeam.core.correlation import lazy_one_time, lazy_two_time
+from skbeam.core.mask import bad_to_nan_gen
+
+pytest.importorskip("skbeam.core.accumulators.correlation")
+
+
+def _make_data(num_frames=60, shape=(32, 48)):
+    rs = np.random.RandomState(42)
+    images = rs.poisson(3, (num_frames,) + shape).astype(float)
+    labels = np.zeros(shape, dtype=np.int64)
+    # the labels do not have to start at 1 and be contiguous
+    labels[2:10, 4:20] = 7
+    labels[12:20, 20:40] = 2
+    labels[22:30, 1:47] = 4
+    return images, labels
+
+
+@pytest.mark.parametrize("num_levels, num_bufs", [(1, 8), (4, 4), (5, 6), (3, 16)])
+@pytest.mark.parametrize("bad_images", [[], [3, 17, 18, 40]])
+def test_one_time_parity(num_levels, num_bufs, bad_images):
+    images, labels = _make_data()
+    images = list(bad_to_nan_gen(images, bad_images))
+    for ref in lazy_one_time(images, num_levels, num_bufs, labels, engine="reference"):
+        pass
+    for cmp in lazy_one_time(images, num_levels, num_bufs, labels, engine="compiled"):
+        pass
+    assert_array_equal(cmp.lag_steps, ref.lag_steps)
+    assert_allclose(cmp.g2, ref.g2, rtol=1e-12)
+    for name in ("G", "past_intensity", "future_intensity"):
+        assert_allclose(getattr(cmp.internal_state, name), getattr(ref.internal_state, name), rtol=1e-12)
+    assert_array_equal(cmp.internal_state.img_per_level, ref.internal_state.img_per_level)
+    assert cmp.internal_state.norm == ref.internal_state.norm
+
+
+def test_one_time_resume_across_engines():
+    images, labels = _make_data()
+    for full in lazy_one_time(images, 4, 4, labels, engine="vectorized"):
+        pass
+    for first in lazy_one_time(images[:25], 4, 4, labels, engine="vectorized"):
+        pass
+    for second in lazy_one_time(images[25:], 4, 4, labels, internal_state=first.internal_state, engine="compiled"):
+        pass
+    assert_allclose(second.g2, full.g2, rtol=1e-12)
+
+
+@pytest.mark.parametrize("num_levels, num_bufs", [(1, 60), (1, 8), (3, 4)])
+def test_two_time_parity(num_levels, num_bufs):
+    images, labels = _make_data()
+    for ref in lazy_two_time(labels, images, len(images), num_bufs, num_levels, engine="reference"):
+        pass
+    for cmp in lazy_two_time(labels, images, len(images), num_bufs, num_levels, engine="compiled"):
+        pass
+    assert_allclose(cmp.g2, ref.g2, rtol=1e-12)
+    assert_array_equal(cmp.img_per_level, ref.img_per_level)
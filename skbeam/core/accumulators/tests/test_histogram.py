@@ -141,6 +141,39 @@ def test_simple_pass():
     assert_array_equal(h.values, np_res)
 
 
+@pytest.mark.parametrize("ndims", [1, 2, 3])
+@pytest.mark.parametrize("fillnd", [False, True])
+@pytest.mark.parametrize("dtype", [float, int])
+def test_parallel_fill(ndims, fillnd, dtype):
+    rs = np.random.RandomState(7)
+    binlowhighs = [(10, 0, 10.01), (7, 0, 7.01), (4, 0, 4.01)][:ndims]
+    coords = [(rs.random_sample(10001) * 12).astype(dtype) for _ in range(ndims)]
+    weights = rs.random_sample(10001)
+    serial = Histogram(*binlowhighs)
+    serial.fill(*coords, weights=weights)
+    for num_threads, w in [(3, weights), (4, 1), (-1, weights)]:
+        h = Histogram(*binlowhighs)
+        h._always_use_fillnd = fillnd
+        h.fill(*coords, weights=w, num_threads=num_threads)
+        expected = serial.values if w is weights else np.histogramdd(np.array(coords).T, bins=h.edges)[0]
+        assert_array_almost_equal(h.values, expected)
+    with pytest.raises(ValueError):
+        h.fill(*coords, num_threads=0)
+
+
+def test_merge():
+    x = np.random.random(1000) * 10
+    y = np.random.random(1000) * 10
+    h = Histogram((10, 0, 10.01), (5, 0, 10.01))
+    h.fill(x[:400], y[:400])
+    other = Histogram((10, 0, 10.01), (5, 0, 10.01))
+    other.fill(x[400:], y[400:])
+    assert h.merge(other) is h
+    assert_array_equal(h.values, np.histogram2d(x, y, bins=h.edges)[0])
+    with pytest.raises(ValueError):
+        h.merge(Histogram((10, 0, 10.01), (5, 0, 11)))
+
+
 if __name__ == "__main__":
     import itertools
 
@@ -46,7 +46,7 @@ import scipy.signal
 
 from .constants import calibration_standards
 from .feature import filter_peak_height, peak_refinement, refine_log_quadratic
-from .utils import angle_grid, bin_1D, bin_edges_to_centers, pairwise, radial_grid
+from .utils import angle_grid, bin_1D, bin_edges_to_centers, geometry_cache, pairwise, radial_grid  # noqa: F401
 
 
 def estimate_d_blind(name, wavelength, bin_centers, ring_average, window_size, max_peak_count, thresh):
@@ -193,8 +193,8 @@ def refine_center(
     if nx is None:
         nx = int(np.mean(image.shape) * 2)
 
-    phi = angle_grid(calibrated_center, image.shape, pixel_size).ravel()
-    r = radial_grid(calibrated_center, image.shape, pixel_size).ravel()
+    phi = geometry_cache.angle_grid(calibrated_center, image.shape, pixel_size).ravel()
+    r = geometry_cache.radial_grid(calibrated_center, image.shape, pixel_size).ravel()
     II = image.ravel()
 
     phi_steps = np.linspace(-np.pi, np.pi, phi_steps, endpoint=True)
@@ -44,9 +44,17 @@ This module is for functions specific to time correlation
 """
 from __future__ import absolute_import, division, print_function
 
+import itertools
+import json
+import mmap
+import numbers
+import os
+import shutil
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import numpy as np
+from scipy import fft as sp_fft
 from scipy.signal import fftconvolve
 
 from .roi import extract_label_indices
@@ -157,6 +165,195 @@ def _one_time_process(
     return None  # modifies arguments in place!
 
 
+def _one_time_process_vectorized(
+    buf,
+    G,
+    past_intensity_norm,
+    future_intensity_norm,
+    label_array,
+    num_bufs,
+    num_pixels,
+    img_per_level,
+    level,
+    buf_no,
+    norm,
+    lev_len,
+    buf_sums,
+    buf_bad,
+):
+    """Vectorized implementation of the inner loop of multi-tau one time
+    correlation
+
+    This produces bit-for-bit the same G, past_intensity_norm and
+    future_intensity_norm as `_one_time_process`. The per-ROI intensity
+    sum and the bad image flag of every buffered image are computed once,
+    when the image enters the ring buffer, and cached in ``buf_sums`` and
+    ``buf_bad``. Only the product image has to be reduced for each lag,
+    and the running mean update is done for all lags of the level at once.
+
+    .. warning :: This modifies inputs in place.
+
+    Parameters
+    ----------
+    buf : array
+        image data array to use for correlation
+    G : array
+        matrix of auto-correlation function without normalizations
+    past_intensity_norm : array
+        matrix of past intensity normalizations
+    future_intensity_norm : array
+        matrix of future intensity normalizations
+    label_array : array
+        labeled array where all nonzero values are ROIs
+    num_bufs : int, even
+        number of buffers(channels)
+    num_pixels : array
+        number of pixels in certain ROI's
+        ROI's, dimensions are : [number of ROI's]X1
+    img_per_level : array
+        to track how many images processed in each level
+    level : int
+        the current multi-tau level
+    buf_no : int
+        the current buffer number
+    norm : dict
+        to track bad images
+    lev_len : array
+        length of each level
+    buf_sums : array
+        per-ROI intensity sums of the images in `buf`
+        shape (num_levels, num_bufs, number of ROI's)
+    buf_bad : array
+        True where the image in `buf` contains np.nan
+        shape (num_levels, num_bufs)
+    """
+    img_per_level[level] += 1
+    future_img = buf[level, buf_no]
+    buf_bad[level, buf_no] = np.isnan(future_img).any()
+    buf_sums[level, buf_no] = np.bincount(label_array, weights=future_img)[1:]
+
+    # in multi-tau correlation, the subsequent levels have half as many
+    # buffers as the first
+    i_min = num_bufs // 2 if level else 0
+    lags = np.arange(i_min, min(img_per_level[level], num_bufs))
+    if not len(lags):
+        return None
+    t_index = level * num_bufs // 2 + lags
+    delay_no = (buf_no - lags) % num_bufs
+
+    # find the normalization that can work both for bad_images
+    #  and good_images
+    ind = t_index - lev_len[:level].sum()
+    normalize = img_per_level[level] - lags - np.take(norm[level + 1], ind)
+
+    # take out the past_ing and future_img created using bad images
+    # (bad images are converted to np.nan array)
+    bad = buf_bad[level, delay_no] | buf_bad[level, buf_no]
+    for j in ind[bad]:
+        norm[level + 1][j] += 1
+    t_index = t_index[~bad]
+    delay_no = delay_no[~bad]
+    normalize = normalize[~bad, np.newaxis]
+
+    binned_G = np.empty((len(t_index), G.shape[1]))
+    product = np.empty_like(future_img)
+    for k, past_no in enumerate(delay_no):
+        np.multiply(buf[level, past_no], future_img, out=product)
+        binned_G[k] = np.bincount(label_array, weights=product)[1:]
+
+    for binned, arr in zip(
+        [binned_G, buf_sums[level, delay_no], buf_sums[level, buf_no]],
+        [G, past_intensity_norm, future_intensity_norm],
+    ):
+        arr[t_index] += (binned / num_pixels - arr[t_index]) / normalize
+    return None  # modifies arguments in place!
+
+
+def _one_time_process_sparse(
+    buf,
+    G,
+    past_intensity_norm,
+    future_intensity_norm,
+    label_array,
+    num_bufs,
+    num_pixels,
+    img_per_level,
+    level,
+    buf_no,
+    norm,
+    lev_len,
+    buf_sums,
+    buf_bad,
+):
+    """Sparse implementation of the inner loop of multi-tau one time
+    correlation
+
+    Same as `_one_time_process_vectorized`, except that every element of
+    `buf` is a sparse image, i.e. a ``(positions, counts)`` tuple of the
+    nonzero pixels, with positions into `label_array` in increasing order.
+    Only pixels that are nonzero in both the past and the future image
+    contribute to G, so the work per lag scales with the number of
+    nonzero pixels instead of the number of ROI pixels.
+
+    .. warning :: This modifies inputs in place.
+
+    Parameters
+    ----------
+    buf : array of tuples
+        sparse image data to use for correlation
+        shape (num_levels, num_bufs)
+
+    For the remaining parameters see `_one_time_process_vectorized`.
+    """
+    img_per_level[level] += 1
+    num_rois = G.shape[1]
+    future_pos, future_counts = buf[level, buf_no]
+    buf_bad[level, buf_no] = np.isnan(future_counts).any()
+    # the background is accumulated into element 0
+    sums = np.bincount(label_array[future_pos], weights=future_counts, minlength=num_rois + 1)
+    buf_sums[level, buf_no] = sums[1:]
+
+    # in multi-tau correlation, the subsequent levels have half as many
+    # buffers as the first
+    i_min = num_bufs // 2 if level else 0
+    lags = np.arange(i_min, min(img_per_level[level], num_bufs))
+    if not len(lags):
+        return None
+    t_index = level * num_bufs // 2 + lags
+    delay_no = (buf_no - lags) % num_bufs
+
+    # find the normalization that can work both for bad_images
+    #  and good_images
+    ind = t_index - lev_len[:level].sum()
+    normalize = img_per_level[level] - lags - np.take(norm[level + 1], ind)
+
+    # take out the past_ing and future_img created using bad images
+    # (bad images contain np.nan)
+    bad = buf_bad[level, delay_no] | buf_bad[level, buf_no]
+    for j in ind[bad]:
+        norm[level + 1][j] += 1
+    t_index = t_index[~bad]
+    delay_no = delay_no[~bad]
+    normalize = normalize[~bad, np.newaxis]
+
+    binned_G = np.empty((len(t_index), num_rois))
+    for k, past_no in enumerate(delay_no):
+        past_pos, past_counts = buf[level, past_no]
+        past_idx, future_idx = _sparse_overlap(past_pos, future_pos)
+        binned_G[k] = np.bincount(
+            label_array[past_pos[past_idx]],
+            weights=past_counts[past_idx] * future_counts[future_idx],
+            minlength=num_rois + 1,
+        )[1:]
+
+    for binned, arr in zip(
+        [binned_G, buf_sums[level, delay_no], buf_sums[level, buf_no]],
+        [G, past_intensity_norm, future_intensity_norm],
+    ):
+        arr[t_index] += (binned / num_pixels - arr[t_index]) / normalize
+    return None  # modifies arguments in place!
+
+
 results = namedtuple("correlation_results", ["g2", "lag_steps", "internal_state"])
 
 _internal_state = namedtuple(
@@ -175,6 +372,8 @@ _internal_state = namedtuple(
         "lag_steps",
         "norm",
         "lev_len",
+        "buf_sums",
+        "buf_bad",
     ],
 )
 
@@ -199,7 +398,7 @@ _two_time_internal_state = namedtuple(
 )
 
 
-def _init_state_one_time(num_levels, num_bufs, labels):
+def _init_state_one_time(num_levels, num_bufs, labels, sparse=False):
     """Initialize a stateful namedtuple for the generator-based multi-tau
      for one time correlation
 
@@ -209,6 +408,9 @@ def _init_state_one_time(num_levels, num_bufs, labels):
     num_bufs : int
     labels : array
         Two dimensional labeled array that contains ROI information
+    sparse : bool, optional
+        if True, the ring buffer holds sparse images for
+        `lazy_one_time_sparse`
 
     Returns
     -------
@@ -229,7 +431,7 @@ def _init_state_one_time(num_levels, num_bufs, labels):
         cur,
         norm,
         lev_len,
-    ) = _validate_and_transform_inputs(num_bufs, num_levels, labels)
+    ) = _validate_and_transform_inputs(num_bufs, num_levels, labels, sparse=sparse)
 
     # G holds the un normalized auto- correlation result. We
     # accumulate computations into G as the algorithm proceeds.
@@ -238,6 +440,9 @@ def _init_state_one_time(num_levels, num_bufs, labels):
     past_intensity = np.zeros_like(G)
     # matrix for normalizing G into g2
     future_intensity = np.zeros_like(G)
+    # per-ROI sums and bad image flags of the images in the ring buffer
+    buf_sums = np.zeros(buf.shape[:2] + (num_rois,), dtype=np.float64)
+    buf_bad = np.zeros(buf.shape[:2], dtype=bool)
 
     return _internal_state(
         buf,
@@ -253,80 +458,51 @@ def _init_state_one_time(num_levels, num_bufs, labels):
         lag_steps,
         norm,
         lev_len,
+        buf_sums,
+        buf_bad,
     )
 
 
-def lazy_one_time(image_iterable, num_levels, num_bufs, labels, internal_state=None):
-    """Generator implementation of 1-time multi-tau correlation
+def _to_buffer(image, pixel_list):
+    """The ROI pixels of a dense image as they are stored in the ring
+    buffer"""
+    return np.ravel(image)[pixel_list]
 
-    If you do not want multi-tau correlation, set num_levels to 1 and
-    num_bufs to the number of images you wish to correlate
+
+def _average(buf1, buf2):
+    """Average two buffered dense images"""
+    return (buf1 + buf2) / 2
+
+
+def _one_time_loop(frames, s, num_levels, num_bufs, fill, average, process, extra_args=()):
+    """Driver loop of the multi-tau one time correlation, shared by the
+    dense and the sparse generators
 
     Parameters
     ----------
-    image_iterable : iterable of 2D arrays
-    num_levels : int
-        how many generations of downsampling to perform, i.e., the depth of
-        the binomial tree of averaged frames
-    num_bufs : int, must be even
-        maximum lag step to compute in each generation of downsampling
-    labels : array
-        Labeled array of the same shape as the image stack.
-        Each ROI is represented by sequential integers starting at one.  For
-        example, if you have four ROIs, they must be labeled 1, 2, 3,
-        4. Background is labeled as 0
-    internal_state : namedtuple, optional
-        internal_state is a bucket for all of the internal state of the
-        generator. It is part of the `results` object that is yielded from
-        this generator
+    frames : iterable
+        the frames to correlate
+    s : namedtuple
+        the internal state, modified in place
+    num_levels, num_bufs : int
+        see `lazy_one_time`
+    fill : callable
+        ``fill(frame, pixel_list)`` returns the ROI pixels of a frame as
+        they are stored in the ring buffer
+    average : callable
+        ``average(buf1, buf2)`` returns the average of two buffered frames,
+        which is stored in the next level
+    process : callable
+        the inner loop, see `_one_time_process`
+    extra_args : tuple, optional
+        passed to `process` after the common arguments
 
     Yields
     ------
     namedtuple
-        A `results` object is yielded after every image has been processed.
-        This `reults` object contains, in this order:
-
-        - `g2`: the normalized correlation
-          shape is (len(lag_steps), num_rois)
-        - `lag_steps`: the times at which the correlation was computed
-        - `_internal_state`: all of the internal state. Can be passed back in
-          to `lazy_one_time` as the `internal_state` parameter
-
-    Notes
-    -----
-    The normalized intensity-intensity time-autocorrelation function
-    is defined as
-
-    .. math::
-
-        g_2(q, t') = \\frac{<I(q, t)I(q, t + t')> }{<I(q, t)>^2}
-
-        t' > 0
-
-    Here, ``I(q, t)`` refers to the scattering strength at the momentum
-    transfer vector ``q`` in reciprocal space at time ``t``, and the brackets
-    ``<...>`` refer to averages over time ``t``. The quantity ``t'`` denotes
-    the delay time
-
-    This implementation is based on published work. [1]_
-
-    References
-    ----------
-
-    .. [1] D. Lumma, L. B. Lurio, S. G. J. Mochrie and M. Sutton,
-       "Area detector based photon correlation in the regime of
-       short data batches: Data reduction for dynamic x-ray
-       scattering," Rev. Sci. Instrum., vol 71, p 3274-3289, 2000.
-
+        a `results` object after every frame
     """
-
-    if internal_state is None:
-        internal_state = _init_state_one_time(num_levels, num_bufs, labels)
-    # create a shorthand reference to the results and state named tuple
-    s = internal_state
-
-    # iterate over the images to compute multi-tau correlation
-    for image in image_iterable:
+    for frame in frames:
         # Compute the correlations for all higher levels.
         level = 0
 
@@ -334,13 +510,13 @@ def lazy_one_time(image_iterable, num_levels, num_bufs, labels, internal_state=N
         s.cur[0] = (1 + s.cur[0]) % num_bufs
 
         # Put the ROI pixels into the ring buffer.
-        s.buf[0, s.cur[0] - 1] = np.ravel(image)[s.pixel_list]
+        s.buf[0, s.cur[0] - 1] = fill(frame, s.pixel_list)
         buf_no = s.cur[0] - 1
         # Compute the correlations between the first level
         # (undownsampled) frames. This modifies G,
         # past_intensity, future_intensity,
         # and img_per_level in place!
-        _one_time_process(
+        process(
             s.buf,
             s.G,
             s.past_intensity,
@@ -353,6 +529,7 @@ def lazy_one_time(image_iterable, num_levels, num_bufs, labels, internal_state=N
             buf_no,
             s.norm,
             s.lev_len,
+            *extra_args,
         )
 
         # check whether the number of levels is one, otherwise
@@ -368,9 +545,9 @@ def lazy_one_time(image_iterable, num_levels, num_bufs, labels, internal_state=N
                 prev = 1 + (s.cur[level - 1] - 2) % num_bufs
                 s.cur[level] = 1 + s.cur[level] % num_bufs
 
-                s.buf[level, s.cur[level] - 1] = (
-                    s.buf[level - 1, prev - 1] + s.buf[level - 1, s.cur[level - 1] - 1]
-                ) / 2
+                s.buf[level, s.cur[level] - 1] = average(
+                    s.buf[level - 1, prev - 1], s.buf[level - 1, s.cur[level - 1] - 1]
+                )
 
                 # make the track_level zero once that level is processed
                 s.track_level[level] = False
@@ -379,7 +556,7 @@ def lazy_one_time(image_iterable, num_levels, num_bufs, labels, internal_state=N
                 # than one. This is modifying things in place. See comment
                 # on previous call above.
                 buf_no = s.cur[level] - 1
-                _one_time_process(
+                process(
                     s.buf,
                     s.G,
                     s.past_intensity,
@@ -392,25 +569,116 @@ def lazy_one_time(image_iterable, num_levels, num_bufs, labels, internal_state=N
                     buf_no,
                     s.norm,
                     s.lev_len,
+                    *extra_args,
                 )
                 level += 1
 
                 # Checking whether there is next level for processing
                 processing = level < num_levels
 
-        # If any past intensities are zero, then g2 cannot be normalized at
-        # those levels. This if/else code block is basically preventing
-        # divide-by-zero errors.
-        if len(np.where(s.past_intensity == 0)[0]) != 0:
-            g_max = np.where(s.past_intensity == 0)[0][0]
-        else:
-            g_max = s.past_intensity.shape[0]
+        yield one_time_state_to_results(s)
+
+
+def _update_buf_sums(state):
+    """Recompute the per-ROI sums and bad image flags of all images in the
+    ring buffer of a dense one time `state`"""
+    num_rois = state.buf_sums.shape[-1]
+    for level, buf_no in np.ndindex(state.buf.shape[:2]):
+        image = state.buf[level, buf_no]
+        state.buf_sums[level, buf_no] = np.bincount(state.label_array, weights=image, minlength=num_rois + 1)[1:]
+        state.buf_bad[level, buf_no] = np.isnan(image).any()
+
+
+def lazy_one_time(image_iterable, num_levels, num_bufs, labels, internal_state=None, engine="vectorized"):
+    """Generator implementation of 1-time multi-tau correlation
+
+    If you do not want multi-tau correlation, set num_levels to 1 and
+    num_bufs to the number of images you wish to correlate
+
+    Parameters
+    ----------
+    image_iterable : iterable of 2D arrays
+    num_levels : int
+        how many generations of downsampling to perform, i.e., the depth of
+        the binomial tree of averaged frames
+    num_bufs : int, must be even
+        maximum lag step to compute in each generation of downsampling
+    labels : array
+        Labeled array of the same shape as the image stack.
+        Each ROI is represented by sequential integers starting at one.  For
+        example, if you have four ROIs, they must be labeled 1, 2, 3,
+        4. Background is labeled as 0
+    internal_state : namedtuple, optional
+        internal_state is a bucket for all of the internal state of the
+        generator. It is part of the `results` object that is yielded from
+        this generator
+    engine : {'vectorized', 'compiled', 'reference'}, optional
+        implementation of the inner loop. 'vectorized' (the default)
+        caches the per-ROI sums of the buffered images and updates all lags
+        of a level at once; 'compiled' does the same in a compiled loop
+        and falls back to 'vectorized' if the extension is not built;
+        'reference' is the original loop over lags. All engines give the
+        same results, and an `internal_state` created with one engine can
+        be resumed with any other.
+
+    Yields
+    ------
+    namedtuple
+        A `results` object is yielded after every image has been processed.
+        This `reults` object contains, in this order:
+
+        - `g2`: the normalized correlation
+          shape is (len(lag_steps), num_rois)
+        - `lag_steps`: the times at which the correlation was computed
+        - `_internal_state`: all of the internal state. Can be passed back in
+          to `lazy_one_time` as the `internal_state` parameter
+
+    Notes
+    -----
+    The normalized intensity-intensity time-autocorrelation function
+    is defined as
+
+    .. math::
 
-        g2 = s.G[:g_max] / (s.past_intensity[:g_max] * s.future_intensity[:g_max])
-        yield results(g2, s.lag_steps[:g_max], s)
+        g_2(q, t') = \\frac{<I(q, t)I(q, t + t')> }{<I(q, t)>^2}
+
+        t' > 0
 
+    Here, ``I(q, t)`` refers to the scattering strength at the momentum
+    transfer vector ``q`` in reciprocal space at time ``t``, and the brackets
+    ``<...>`` refer to averages over time ``t``. The quantity ``t'`` denotes
+    the delay time
 
-def multi_tau_auto_corr(num_levels, num_bufs, labels, images):
+    This implementation is based on published work. [1]_
+
+    References
+    ----------
+
+    .. [1] D. Lumma, L. B. Lurio, S. G. J. Mochrie and M. Sutton,
+       "Area detector based photon correlation in the regime of
+       short data batches: Data reduction for dynamic x-ray
+       scattering," Rev. Sci. Instrum., vol 71, p 3274-3289, 2000.
+
+    """
+
+    engine, _process = _get_engine(_one_time_engines, engine, fallback="vectorized")
+
+    if internal_state is None:
+        internal_state = _init_state_one_time(num_levels, num_bufs, labels)
+    elif engine != "reference":
+        # the state may come from the reference engine, which does not
+        # keep the per-ROI sums of the ring buffer up to date
+        _update_buf_sums(internal_state)
+    # create a shorthand reference to the results and state named tuple
+    s = internal_state
+    # the vectorized and compiled engines also keep the per-ROI sums of the
+    # ring buffer
+    extra_args = () if engine == "reference" else (s.buf_sums, s.buf_bad)
+
+    yield from _one_time_loop(image_iterable, s, num_levels, num_bufs, _to_buffer, _average, _process, extra_args)
+
+
+def multi_tau_auto_corr(num_levels, num_bufs, labels, images, engine="vectorized"):
     """Wraps generator implementation of multi-tau
 
     Original code(in Yorick) for multi tau auto correlation
@@ -423,12 +691,368 @@ def multi_tau_auto_corr(num_levels, num_bufs, labels, images):
     the `lazy_one_time()` function. The semantics of the variables remain
     unchanged.
     """
-    gen = lazy_one_time(images, num_levels, num_bufs, labels)
+    gen = lazy_one_time(images, num_levels, num_bufs, labels, engine=engine)
     for result in gen:
         pass
     return result.g2, result.lag_steps
 
 
+def one_time_state_to_results(state):
+    """Convert the internal state of the one time generator into usable
+    results
+
+    Parameters
+    ----------
+    state : namedtuple
+        The internal state of `lazy_one_time` or `lazy_one_time_sparse`
+
+    Returns
+    -------
+    results : namedtuple
+        A results object as yielded by `lazy_one_time`
+    """
+    # If any past intensities are zero, then g2 cannot be normalized at
+    # those levels. This if/else code block is basically preventing
+    # divide-by-zero errors.
+    if len(np.where(state.past_intensity == 0)[0]) != 0:
+        g_max = np.where(state.past_intensity == 0)[0][0]
+    else:
+        g_max = state.past_intensity.shape[0]
+
+    g2 = state.G[:g_max] / (state.past_intensity[:g_max] * state.future_intensity[:g_max])
+    return results(g2, state.lag_steps[:g_max], state)
+
+
+partial_one_time_state = namedtuple("partial_one_time_state", ["internal_state", "head"])
+
+
+def partial_one_time(images, num_levels, num_bufs, labels, engine="vectorized"):
+    """Multi-tau one time correlation of a contiguous chunk of an image
+    series, to be merged with the neighbouring chunks by `merge_one_time`
+
+    Besides the state of `lazy_one_time`, whose ring buffers hold the last
+    images of every level, the first images of every level are kept, so
+    that the pairs of images on both sides of a chunk boundary can be
+    correlated when merging.
+
+    For parameter description, please reference the docstring for
+    lazy_one_time. All chunks but the last must hold a multiple of
+    ``2 ** (num_levels - 1)`` images, so that the downsampled images of the
+    chunks are the same as the ones of the whole series.
+
+    Returns
+    -------
+    partial : namedtuple
+        - ``internal_state``: the state of `lazy_one_time` after the chunk
+        - ``head``: list of the first (up to) `num_bufs` images of every
+          level, shape (num_images, len(pixel_list))
+    """
+    state = _init_state_one_time(num_levels, num_bufs, labels)
+    num_head = num_bufs * 2 ** (num_levels - 1)
+    first = []
+
+    def record(images):
+        for image in images:
+            if len(first) < num_head:
+                first.append(np.ravel(image)[state.pixel_list])
+            yield image
+
+    for _ in lazy_one_time(record(images), num_levels, num_bufs, labels, internal_state=state, engine=engine):
+        pass
+
+    # the downsampled images are the averages of consecutive pairs, in the
+    # same order of operations as in lazy_one_time
+    frames = np.array(first, dtype=np.float64).reshape(-1, len(state.pixel_list))
+    head = []
+    for level in range(num_levels):
+        head.append(frames[:num_bufs].copy())
+        num_pairs = len(frames) // 2
+        frames = (frames[0 : 2 * num_pairs : 2] + frames[1 : 2 * num_pairs : 2]) / 2
+    return partial_one_time_state(state, head)
+
+
+def _ring_buffer_images(state, level):
+    """The images in the ring buffer of a level, oldest first"""
+    num_bufs = state.buf.shape[1]
+    num_images = state.img_per_level[level]
+    # the n-th image of a level is stored in slot n % num_bufs
+    slots = np.arange(max(1, num_images - num_bufs + 1), num_images + 1) % num_bufs
+    return state.buf[level, slots]
+
+
+def _one_time_pair_counts(state):
+    """Number of good image pairs that were averaged into each row of G"""
+    num_levels, num_bufs = state.buf.shape[:2]
+    counts = np.zeros(len(state.G), dtype=np.int64)
+    for level in range(num_levels):
+        lags = np.arange(num_bufs // 2 if level else 0, num_bufs)
+        t_index = level * num_bufs // 2 + lags
+        ind = t_index - state.lev_len[:level].sum()
+        num_bad = np.take(state.norm[level + 1], ind)
+        counts[t_index] = np.maximum(state.img_per_level[level] - lags, 0) - num_bad
+    return counts
+
+
+def merge_one_time(partials):
+    """Merge the partial one time correlations of consecutive chunks of an
+    image series
+
+    The result is the same (up to rounding) as running `partial_one_time`,
+    or `lazy_one_time`, over the whole series at once: the running means
+    of the chunks are weighted by their number of image pairs, and the
+    pairs of images on both sides of each chunk boundary, which are held in
+    the ring buffers and the heads of the chunks, are added.
+
+    Parameters
+    ----------
+    partials : sequence of namedtuple
+        the results of `partial_one_time` for consecutive chunks, in order
+
+    Returns
+    -------
+    partial : namedtuple
+        the partial correlation of all the chunks. It can be merged with
+        further chunks, and its ``internal_state`` can be passed back in to
+        `lazy_one_time` to process the images following the last chunk. Use
+        `one_time_state_to_results` for the g2
+
+    Raises
+    ------
+    ValueError
+        if the chunks were correlated with different parameters or a chunk
+        other than the last one does not hold a multiple of
+        ``2 ** (num_levels - 1)`` images
+    """
+    partials = list(partials)
+    if not partials:
+        raise ValueError("There are no partial correlations to merge")
+    merged = partials[0]
+    for partial in partials[1:]:
+        merged = _merge_two_one_time(merged, partial)
+    return merged
+
+
+def _merge_two_one_time(first, second):
+    s1, s2 = first.internal_state, second.internal_state
+    if s1.buf.dtype == object or s2.buf.dtype == object:
+        raise ValueError("Only the states of the dense lazy_one_time can be merged")
+    if s1.buf.shape != s2.buf.shape or not np.array_equal(s1.pixel_list, s2.pixel_list):
+        raise ValueError("The partial correlations were computed with different num_levels, num_bufs or labels")
+    if not s2.img_per_level[0]:
+        return first
+    if not s1.img_per_level[0]:
+        return second
+    num_levels, num_bufs = s1.buf.shape[:2]
+    if s1.img_per_level[0] % 2 ** (num_levels - 1):
+        raise ValueError(
+            "Every chunk but the last must hold a multiple of 2 ** (num_levels - 1) = {} images, "
+            "got {}".format(2 ** (num_levels - 1), s1.img_per_level[0])
+        )
+    num_rois = s1.G.shape[1]
+    label_array, num_pixels = s1.label_array, s1.num_pixels
+
+    counts1 = _one_time_pair_counts(s1)
+    counts2 = _one_time_pair_counts(s2)
+    sums = [
+        counts1[:, np.newaxis] * a1 + counts2[:, np.newaxis] * a2
+        for a1, a2 in (
+            (s1.G, s2.G),
+            (s1.past_intensity, s2.past_intensity),
+            (s1.future_intensity, s2.future_intensity),
+        )
+    ]
+    counts = counts1 + counts2
+    norm = {key: [n1 + n2 for n1, n2 in zip(s1.norm[key], s2.norm[key])] for key in s1.norm}
+
+    buf = np.zeros_like(s1.buf)
+    head = []
+    for level in range(num_levels):
+        # the pairs of images across the chunk boundary
+        tail = _ring_buffer_images(s1, level)
+        following = second.head[level]
+        for lag in range(num_bufs // 2 if level else 1, num_bufs):
+            t = level * num_bufs // 2 + lag
+            ind = t - s1.lev_len[:level].sum()
+            for k in range(1, lag + 1):
+                if k > len(tail) or lag - k >= len(following):
+                    continue
+                past, future = tail[-k], following[lag - k]
+                if np.isnan(past).any() or np.isnan(future).any():
+                    norm[level + 1][ind] += 1
+                    continue
+                for total, weights in zip(sums, (past * future, past, future)):
+                    total[t] += np.bincount(label_array, weights=weights, minlength=num_rois + 1)[1:] / num_pixels
+                counts[t] += 1
+
+        # the ring buffer holds the last images of both chunks
+        num_images = s1.img_per_level[level] + s2.img_per_level[level]
+        images = np.concatenate([tail, _ring_buffer_images(s2, level)])[-num_bufs:]
+        slots = np.arange(num_images - len(images) + 1, num_images + 1) % num_bufs
+        buf[level, slots] = images
+        head.append(np.concatenate([first.head[level], second.head[level]])[:num_bufs])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        G, past_intensity, future_intensity = [
+            np.where(counts[:, np.newaxis] > 0, a / counts[:, np.newaxis], 0) for a in sums
+        ]
+
+    img_per_level = s1.img_per_level + s2.img_per_level
+    # see lazy_one_time for how the ring buffer positions advance
+    cur = 1 + img_per_level % num_bufs
+    cur[0] = (1 + img_per_level[0]) % num_bufs
+    buf_sums = np.zeros_like(s1.buf_sums)
+    for index in np.ndindex(buf.shape[:2]):
+        buf_sums[index] = np.bincount(label_array, weights=buf[index], minlength=num_rois + 1)[1:]
+    buf_bad = np.isnan(buf).any(axis=-1)
+
+    state = s2._replace(
+        buf=buf,
+        G=G,
+        past_intensity=past_intensity,
+        future_intensity=future_intensity,
+        img_per_level=img_per_level,
+        cur=cur,
+        norm=norm,
+        buf_sums=buf_sums,
+        buf_bad=buf_bad,
+        # the downsampling of the first chunk ends on complete pairs
+        track_level=s2.track_level.copy(),
+    )
+    return partial_one_time_state(state, head)
+
+
+def _partial_one_time_worker(images, num_levels, num_bufs, labels, engine):
+    """`partial_one_time` in a worker process. The state is sent back as a
+    dict, the namedtuple can not be pickled
+
+    `images` is either the chunk itself or a (filename, dtype, shape,
+    offset, start, stop) tuple of a .npy or raw file, of which the worker
+    maps frames `start` to `stop` itself."""
+    if isinstance(images, tuple):
+        filename, dtype, shape, offset, start, stop = images
+        images = np.memmap(filename, dtype=dtype, mode="r", shape=shape, offset=offset)[start:stop]
+    state, head = partial_one_time(images, num_levels, num_bufs, labels, engine=engine)
+    return state._asdict(), head
+
+
+def multi_tau_auto_corr_parallel(num_levels, num_bufs, labels, images, processes=None, engine="vectorized"):
+    """Multi-tau one time correlation of an image series, split into
+    consecutive chunks that are correlated in a pool of processes
+
+    The chunks are correlated with `partial_one_time` and merged with
+    `merge_one_time`, which gives the same results as
+    `multi_tau_auto_corr`.
+
+    Parameters
+    ----------
+    num_levels, num_bufs, labels, engine :
+        see `lazy_one_time`
+    images : array
+        the image series, frames along the first axis. If it is a
+        `numpy.memmap` of a whole file, e.g. from ``np.load(filename,
+        mmap_mode="r")``, every process maps and reads its own frames.
+        Any other array, including a slice of a memmap, is sliced into the
+        chunks by the calling process and sent to the workers
+    processes : int, optional
+        number of worker processes and chunks, defaults to the number of
+        CPUs
+
+    Returns
+    -------
+    g2 : array
+        the normalized correlation, shape is (len(lag_steps), num_rois)
+    lag_steps : array
+        the times at which the correlation was computed
+    """
+    if processes is None:
+        processes = os.cpu_count()
+    if processes < 1:
+        raise ValueError("processes must be a positive integer. Got {}".format(processes))
+    if len(images) == 0:
+        raise ValueError("images must hold at least one frame")
+    # the chunks must hold whole downsampled images
+    step = 2 ** (num_levels - 1)
+    num_steps = len(images) // step
+    bounds = [n * num_steps // processes * step for n in range(processes)] + [len(images)]
+    chunks = [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+    if isinstance(images, np.memmap) and isinstance(images.base, mmap.mmap) and images.flags.c_contiguous:
+        # the memmap owns its mapping, so its offset is the one of the
+        # first frame in the file
+        layout = (images.filename, images.dtype, images.shape, images.offset)
+        sources = [layout + chunk for chunk in chunks]
+    else:
+        sources = [images[start:stop] for start, stop in chunks]
+
+    with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+        partials = executor.map(
+            _partial_one_time_worker,
+            sources,
+            *[[arg] * len(chunks) for arg in (num_levels, num_bufs, labels, engine)],
+        )
+        merged = merge_one_time(
+            partial_one_time_state(_internal_state(**fields), head) for fields, head in partials
+        )
+    result = one_time_state_to_results(merged.internal_state)
+    return result.g2, result.lag_steps
+
+
+def lazy_one_time_sparse(event_iterable, num_levels, num_bufs, labels, internal_state=None):
+    """Generator implementation of 1-time multi-tau correlation for sparse
+    photon-event data
+
+    This computes the same correlation as `lazy_one_time`, but every frame
+    is given as a list of photon events instead of a dense image. The ring
+    buffers only hold the nonzero ROI pixels of each frame, and G and the
+    intensity normalizations are computed over those pixels only. This is
+    much faster and lighter than `lazy_one_time` when most ROI pixels of a
+    frame are zero, as on photon-counting detectors at high frame rates.
+
+    Parameters
+    ----------
+    event_iterable : iterable of (pixel_index, counts) tuples
+        one tuple per frame. `pixel_index` holds indices into the raveled
+        image and `counts` the number of photons at those pixels. Indices
+        may repeat, their counts are summed. Events outside of the ROIs are
+        ignored. A frame with np.nan in `counts` is treated as a bad image
+    num_levels : int
+        how many generations of downsampling to perform, i.e., the depth of
+        the binomial tree of averaged frames
+    num_bufs : int, must be even
+        maximum lag step to compute in each generation of downsampling
+    labels : array
+        Labeled array of the same shape as the images.
+        Each ROI is represented by sequential integers starting at one.
+        Background is labeled as 0
+    internal_state : namedtuple, optional
+        internal_state is a bucket for all of the internal state of the
+        generator. It is part of the `results` object that is yielded from
+        this generator. Only states created by this generator can be passed
+        back in
+
+    Yields
+    ------
+    namedtuple
+        A `results` object is yielded after every frame has been processed,
+        see `lazy_one_time`
+    """
+    if internal_state is None:
+        internal_state = _init_state_one_time(num_levels, num_bufs, labels, sparse=True)
+    # create a shorthand reference to the results and state named tuple
+    s = internal_state
+
+    yield from _one_time_loop(
+        event_iterable,
+        s,
+        num_levels,
+        num_bufs,
+        _events_to_sparse,
+        _sparse_average,
+        _one_time_process_sparse,
+        (s.buf_sums, s.buf_bad),
+    )
+
+
 def auto_corr_scat_factor(lags, beta, relaxation_rate, baseline=1):
     """
     This model will provide normalized intensity-intensity time
@@ -480,7 +1104,9 @@ def auto_corr_scat_factor(lags, beta, relaxation_rate, baseline=1):
     return beta * np.exp(-2 * relaxation_rate * lags) + baseline
 
 
-def two_time_corr(labels, images, num_frames, num_bufs, num_levels=1):
+def two_time_corr(
+    labels, images, num_frames, num_bufs, num_levels=1, engine="reference", g2_file=None, triangular=False
+):
     """Wraps generator implementation of multi-tau two time correlation
 
     This function computes two-time correlation
@@ -493,89 +1119,37 @@ def two_time_corr(labels, images, num_frames, num_bufs, num_levels=1):
     For parameter definition, see the docstring for the `lazy_two_time()`
     function in this module
     """
-    gen = lazy_two_time(labels, images, num_frames, num_bufs, num_levels)
+    gen = lazy_two_time(
+        labels, images, num_frames, num_bufs, num_levels, engine=engine, g2_file=g2_file, triangular=triangular
+    )
     for result in gen:
         pass
     return two_time_state_to_results(result)
 
 
-def lazy_two_time(labels, images, num_frames, num_bufs, num_levels=1, two_time_internal_state=None):
-    """Generator implementation of two-time correlation
-
-    If you do not want multi-tau correlation, set num_levels to 1 and
-    num_bufs to the number of images you wish to correlate
-
-    Multi-tau correlation uses a scheme to achieve long-time correlations
-    inexpensively by downsampling the data, iteratively combining successive
-    frames.
-
-    The longest lag time computed is ``num_levels * num_bufs``.
-
-    See Also: ``multi_tau_auto_corr`` for a non-generator implementation
+def _two_time_loop(frames, s, num_levels, num_bufs, fill, average, process):
+    """Driver loop of the multi-tau two time correlation, shared by the
+    dense and the sparse generators
 
     Parameters
     ----------
-    labels : array
-        labeled array of the same shape as the image stack;
-        each ROI is represented by a distinct label (i.e., integer)
-    images : iterable of 2D arrays
-        dimensions are: (rr, cc), iterable of 2D arrays
-    num_frames : int
-        number of images to use
-        default is number of images
-    num_bufs : int, must be even
-        maximum lag step to compute in each generation of
-        downsampling
-    num_levels : int, optional
-        how many generations of downsampling to perform, i.e.,
-        the depth of the binomial tree of averaged frames
-        default is one
+    frames : iterable
+        the frames to correlate
+    s : namedtuple
+        the internal state, its arrays are modified in place
+    num_levels, num_bufs : int
+        see `lazy_two_time`
+    fill, average : callable
+        see `_one_time_loop`
+    process : callable
+        the inner loop, see `_two_time_process`
 
     Yields
     ------
     namedtuple
-        A ``results`` object is yielded after every image has been processed.
-        This `reults` object contains, in this order:
-
-        - ``g2``: the normalized correlation
-          shape is (num_rois, len(lag_steps), len(lag_steps))
-        - ``lag_steps``: the times at which the correlation was computed
-        - ``_internal_state``: all of the internal state. Can be passed back in
-          to ``lazy_one_time`` as the ``internal_state`` parameter
-
-    Notes
-    -----
-    The two-time correlation function is defined as
-
-    .. math::
-        C(q,t_1,t_2) = \\frac{<I(q,t_1)I(q,t_2)>}{<I(q, t_1)><I(q,t_2)>}
-
-    Here, the ensemble averages are performed over many pixels of detector,
-    all having the same ``q`` value. The average time or age is equal to
-    ``(t1+t2)/2``, measured by the distance along the ``t1 = t2`` diagonal.
-    The time difference ``t = |t1 - t2|``, with is distance from the
-    ``t1 = t2`` diagonal in the perpendicular direction.
-    In the equilibrium system, the two-time correlation functions depend only
-    on the time difference ``t``, and hence the two-time correlation contour
-    lines are parallel.
-
-    [1]_
-
-    References
-    ----------
-
-    .. [1] A. Fluerasu, A. Moussaid, A. Mandsen and A. Schofield,
-       "Slow dynamics and aging in collodial gels studied by x-ray
-       photon correlation spectroscopy," Phys. Rev. E., vol 76, p
-       010401(1-4), 2007.
-
+        the internal state after every frame
     """
-    if two_time_internal_state is None:
-        two_time_internal_state = _init_state_two_time(num_levels, num_bufs, labels, num_frames)
-    # create a shorthand reference to the results and state named tuple
-    s = two_time_internal_state
-
-    for img in images:
+    for frame in frames:
         s.cur[0] = (1 + s.cur[0]) % num_bufs  # increment buffer
 
         s.count_level[0] = 1 + s.count_level[0]
@@ -583,12 +1157,12 @@ def lazy_two_time(labels, images, num_frames, num_bufs, num_levels=1, two_time_i
         # get the current image time
         s = s._replace(current_img_time=(s.current_img_time + 1))
 
-        # Put the image into the ring buffer.
-        s.buf[0, s.cur[0] - 1] = (np.ravel(img))[s.pixel_list]
+        # Put the ROI pixels into the ring buffer.
+        s.buf[0, s.cur[0] - 1] = fill(frame, s.pixel_list)
 
         # Compute the two time correlations between the first level
         # (undownsampled) frames. two_time and img_per_level in place!
-        _two_time_process(
+        process(
             s.buf,
             s.g2,
             s.label_array,
@@ -619,9 +1193,9 @@ def lazy_two_time(labels, images, num_frames, num_bufs, num_levels=1, two_time_i
                 s.cur[level] = 1 + s.cur[level] % num_bufs
                 s.count_level[level] = 1 + s.count_level[level]
 
-                s.buf[level, s.cur[level] - 1] = (
-                    s.buf[level - 1, prev - 1] + s.buf[level - 1, s.cur[level - 1] - 1]
-                ) / 2
+                s.buf[level, s.cur[level] - 1] = average(
+                    s.buf[level - 1, prev - 1], s.buf[level - 1, s.cur[level - 1] - 1]
+                )
 
                 t1_idx = (s.count_level[level] - 1) * 2
 
@@ -637,7 +1211,7 @@ def lazy_two_time(labels, images, num_frames, num_bufs, num_levels=1, two_time_i
                 # for multi-tau levels greater than one
                 # Again, this is modifying things in place. See comment
                 # on previous call above.
-                _two_time_process(
+                process(
                     s.buf,
                     s.g2,
                     s.label_array,
@@ -656,13 +1230,190 @@ def lazy_two_time(labels, images, num_frames, num_bufs, num_levels=1, two_time_i
         yield s
 
 
-def two_time_state_to_results(state):
+def lazy_two_time(
+    labels,
+    images,
+    num_frames,
+    num_bufs,
+    num_levels=1,
+    two_time_internal_state=None,
+    engine="reference",
+    g2_file=None,
+    triangular=False,
+):
+    """Generator implementation of two-time correlation
+
+    If you do not want multi-tau correlation, set num_levels to 1 and
+    num_bufs to the number of images you wish to correlate
+
+    Multi-tau correlation uses a scheme to achieve long-time correlations
+    inexpensively by downsampling the data, iteratively combining successive
+    frames.
+
+    The longest lag time computed is ``num_levels * num_bufs``.
+
+    See Also: ``multi_tau_auto_corr`` for a non-generator implementation
+
+    Parameters
+    ----------
+    labels : array
+        labeled array of the same shape as the image stack;
+        each ROI is represented by a distinct label (i.e., integer)
+    images : iterable of 2D arrays
+        dimensions are: (rr, cc), iterable of 2D arrays
+    num_frames : int
+        number of images to use
+        default is number of images
+    num_bufs : int, must be even
+        maximum lag step to compute in each generation of
+        downsampling
+    num_levels : int, optional
+        how many generations of downsampling to perform, i.e.,
+        the depth of the binomial tree of averaged frames
+        default is one
+    two_time_internal_state : namedtuple, optional
+        the internal state yielded by a previous call, to resume processing
+    engine : {'reference', 'compiled'}, optional
+        implementation of the inner loop. 'compiled' falls back to
+        'reference' if the extension is not built
+    g2_file : str, optional
+        if given, ``g2`` is stored in this .npy file through a
+        `numpy.memmap` instead of in memory, so that the memory use does
+        not grow with `num_frames`. The file is laid out as
+        (num_frames, num_frames, num_rois), every processed image writes one
+        contiguous row of it. Reopen it with
+        ``np.load(g2_file, mmap_mode='r').transpose(2, 0, 1)``, or with
+        ``TriangularTwoTime.load(g2_file)`` if `triangular` is True
+    triangular : bool, optional
+        if True, only the lower triangle of the symmetric ``g2`` is stored,
+        see `TriangularTwoTime`. This halves the storage
+
+    Yields
+    ------
+    namedtuple
+        A ``results`` object is yielded after every image has been processed.
+        This `reults` object contains, in this order:
+
+        - ``g2``: the normalized correlation
+          shape is (num_rois, len(lag_steps), len(lag_steps))
+        - ``lag_steps``: the times at which the correlation was computed
+        - ``_internal_state``: all of the internal state. Can be passed back in
+          to ``lazy_one_time`` as the ``internal_state`` parameter
+
+    Notes
+    -----
+    The two-time correlation function is defined as
+
+    .. math::
+        C(q,t_1,t_2) = \\frac{<I(q,t_1)I(q,t_2)>}{<I(q, t_1)><I(q,t_2)>}
+
+    Here, the ensemble averages are performed over many pixels of detector,
+    all having the same ``q`` value. The average time or age is equal to
+    ``(t1+t2)/2``, measured by the distance along the ``t1 = t2`` diagonal.
+    The time difference ``t = |t1 - t2|``, with is distance from the
+    ``t1 = t2`` diagonal in the perpendicular direction.
+    In the equilibrium system, the two-time correlation functions depend only
+    on the time difference ``t``, and hence the two-time correlation contour
+    lines are parallel.
+
+    [1]_
+
+    References
+    ----------
+
+    .. [1] A. Fluerasu, A. Moussaid, A. Mandsen and A. Schofield,
+       "Slow dynamics and aging in collodial gels studied by x-ray
+       photon correlation spectroscopy," Phys. Rev. E., vol 76, p
+       010401(1-4), 2007.
+
+    """
+    engine, _process = _get_engine(_two_time_engines, engine, fallback="reference")
+
+    if two_time_internal_state is None:
+        two_time_internal_state = _init_state_two_time(
+            num_levels, num_bufs, labels, num_frames, g2_file=g2_file, triangular=triangular
+        )
+    yield from _two_time_loop(
+        images, two_time_internal_state, num_levels, num_bufs, _to_buffer, _average, _process
+    )
+
+
+def lazy_two_time_sparse(
+    labels,
+    events,
+    num_frames,
+    num_bufs,
+    num_levels=1,
+    two_time_internal_state=None,
+    g2_file=None,
+    triangular=False,
+):
+    """Generator implementation of two-time correlation for sparse
+    photon-event data
+
+    This computes the same correlation as `lazy_two_time`, but every frame
+    is given as a list of photon events instead of a dense image, see
+    `lazy_one_time_sparse`. The ring buffers only hold the nonzero ROI
+    pixels of each frame.
+
+    Parameters
+    ----------
+    labels : array
+        labeled array of the same shape as the images;
+        each ROI is represented by a distinct label (i.e., integer)
+    events : iterable of (pixel_index, counts) tuples
+        one tuple per frame, indices into the raveled image and the counts
+        at those pixels
+    num_frames : int
+        number of frames to use
+    num_bufs : int, must be even
+        maximum lag step to compute in each generation of
+        downsampling
+    num_levels : int, optional
+        how many generations of downsampling to perform, i.e.,
+        the depth of the binomial tree of averaged frames
+        default is one
+    two_time_internal_state : namedtuple, optional
+        the internal state yielded by a previous call, to resume processing
+    g2_file : str, optional
+        store ``g2`` on disk, see `lazy_two_time`
+    triangular : bool, optional
+        store only the lower triangle of ``g2``, see `lazy_two_time`
+
+    Yields
+    ------
+    namedtuple
+        the internal state after every frame has been processed, see
+        `lazy_two_time`
+    """
+    if two_time_internal_state is None:
+        two_time_internal_state = _init_state_two_time(
+            num_levels, num_bufs, labels, num_frames, sparse=True, g2_file=g2_file, triangular=triangular
+        )
+    yield from _two_time_loop(
+        events,
+        two_time_internal_state,
+        num_levels,
+        num_bufs,
+        _events_to_sparse,
+        _sparse_average,
+        _two_time_process_sparse,
+    )
+
+
+def two_time_state_to_results(state, tile_size=256):
     """Convert the internal state of the two time generator into usable results
 
+    Only the lower triangle of ``g2`` is computed by the generator. It is
+    mirrored onto the upper triangle in place, one tile at a time, so that
+    an on-disk ``g2`` is never loaded into memory as a whole.
+
     Parameters
     ----------
     state : namedtuple
         The internal state that is yielded from `lazy_two_time`
+    tile_size : int, optional
+        number of frames along each side of the tiles that are copied
 
     Returns
     -------
@@ -670,10 +1421,229 @@ def two_time_state_to_results(state):
         A results object that contains the two time correlation results
         and the lag steps
     """
-    for q in range(np.max(state.label_array)):
-        x0 = (state.g2)[q, :, :]
-        (state.g2)[q, :, :] = np.tril(x0) + np.tril(x0).T - np.diag(np.diag(x0))
-    return results(state.g2, state.lag_steps, state)
+    g2 = state.g2
+    if isinstance(g2, TriangularTwoTime):
+        # symmetric by construction
+        g2.flush()
+        return results(g2, state.lag_steps, state)
+    num_frames = g2.shape[1]
+    for r0 in range(0, num_frames, tile_size):
+        r1 = min(r0 + tile_size, num_frames)
+        # the diagonal tile
+        tile = g2[:, r0:r1, r0:r1]
+        rows, cols = np.triu_indices(r1 - r0, 1)
+        tile[:, rows, cols] = tile[:, cols, rows]
+        # the tiles right of the diagonal are the transposes of the tiles
+        # below it
+        for c0 in range(r1, num_frames, tile_size):
+            c1 = min(c0 + tile_size, num_frames)
+            g2[:, r0:r1, c0:c1] = np.swapaxes(g2[:, c0:c1, r0:r1], 1, 2)
+    if isinstance(g2, np.memmap):
+        g2.flush()
+    return results(g2, state.lag_steps, state)
+
+
+def save_state(state, path):
+    """Write the internal state of a correlation generator to disk
+
+    The state of `lazy_one_time`, `lazy_two_time` and their sparse
+    counterparts is written to the directory `path`, one .npy file per
+    array, so that the large ring buffers and accumulators are written and
+    read without any conversion. An existing checkpoint at `path` is only
+    replaced once the new one is complete.
+
+    A ``g2`` of `lazy_two_time` that is already stored on disk through
+    ``g2_file`` is flushed and referenced by its file name instead of
+    copied.
+
+    Parameters
+    ----------
+    state : namedtuple
+        the internal state yielded by one of the generators
+    path : str
+        directory to write the state to
+
+    See Also
+    --------
+    load_state, checkpoint_gen
+    """
+    if isinstance(state, _internal_state):
+        kind = "one_time"
+    elif isinstance(state, _two_time_internal_state):
+        kind = "two_time"
+    else:
+        raise ValueError("Expected the internal state of a correlation generator, got {}".format(type(state)))
+
+    path = os.path.abspath(path)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    manifest = {"kind": kind, "sparse": False}
+    for name, value in state._asdict().items():
+        if name == "buf" and value.dtype == object:
+            # sparse ring buffers are stored as their concatenated
+            # positions and counts
+            manifest["sparse"] = True
+            images = value.ravel()
+            np.save(os.path.join(tmp_path, "buf_shape.npy"), np.array(value.shape))
+            np.save(os.path.join(tmp_path, "buf_lengths.npy"), np.array([len(pos) for pos, _ in images]))
+            np.save(
+                os.path.join(tmp_path, "buf_positions.npy"),
+                np.concatenate([pos for pos, _ in images]).astype(np.intp),
+            )
+            np.save(
+                os.path.join(tmp_path, "buf_counts.npy"),
+                np.concatenate([counts for _, counts in images]).astype(np.float64),
+            )
+        elif name == "g2":
+            if isinstance(value, TriangularTwoTime):
+                value.flush()
+                if isinstance(value.data, np.memmap):
+                    manifest["g2"] = {"layout": "triangular", "file": os.path.abspath(value.data.filename)}
+                else:
+                    manifest["g2"] = {"layout": "triangular"}
+                    np.save(os.path.join(tmp_path, "g2.npy"), value.data)
+            elif isinstance(value, np.memmap):
+                value.flush()
+                manifest["g2"] = {"layout": "memmap", "file": os.path.abspath(value.filename)}
+            else:
+                manifest["g2"] = {"layout": "dense"}
+                np.save(os.path.join(tmp_path, "g2.npy"), value)
+        elif isinstance(value, dict):
+            # norm and time_ind are small dicts of lists
+            manifest[name] = {str(key): np.asarray(items).tolist() for key, items in value.items()}
+        elif isinstance(value, np.ndarray):
+            np.save(os.path.join(tmp_path, name + ".npy"), value)
+        else:
+            manifest[name] = np.asarray(value).tolist()
+
+    with open(os.path.join(tmp_path, "state.json"), "w") as f:
+        json.dump(manifest, f)
+
+    # swap the complete checkpoint in
+    if os.path.exists(path):
+        old_path = path + ".old"
+        if os.path.exists(old_path):
+            shutil.rmtree(old_path)
+        os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path)
+    else:
+        os.rename(tmp_path, path)
+
+
+def load_state(path, mmap_mode=None):
+    """Read the internal state of a correlation generator from disk
+
+    The returned state can be passed back in to the generator that created
+    it (``internal_state=`` or ``two_time_internal_state=``) to resume the
+    processing after the images that were already processed, which are
+    ``state.img_per_level[0]`` images for one time and
+    ``state.current_img_time`` images for two time correlation.
+
+    Parameters
+    ----------
+    path : str
+        directory that was written by `save_state`
+    mmap_mode : {None, 'r+', 'c'}, optional
+        passed on to `numpy.load` for the arrays. With 'c' the arrays are
+        mapped copy-on-write, so that the state is not copied up front and
+        the checkpoint on disk is left unchanged. With 'r+' resuming updates
+        the checkpoint files in place. Default is None, which reads the
+        arrays into memory
+
+    Returns
+    -------
+    internal_state : namedtuple
+
+    See Also
+    --------
+    save_state, checkpoint_gen
+    """
+    with open(os.path.join(path, "state.json")) as f:
+        manifest = json.load(f)
+
+    def load(name, mode=mmap_mode):
+        return np.load(os.path.join(path, name + ".npy"), mmap_mode=mode)
+
+    if manifest["kind"] == "one_time":
+        state_type = _internal_state
+    else:
+        state_type = _two_time_internal_state
+
+    fields = {}
+    for name in state_type._fields:
+        if name == "buf" and manifest["sparse"]:
+            lengths = load("buf_lengths", None)
+            offsets = np.concatenate([[0], np.cumsum(lengths)])
+            positions, counts = load("buf_positions", None), load("buf_counts", None)
+            buf = np.empty(int(np.prod(load("buf_shape", None))), dtype=object)
+            for n, (start, stop) in enumerate(zip(offsets[:-1], offsets[1:])):
+                buf[n] = (positions[start:stop], counts[start:stop])
+            fields[name] = buf.reshape(tuple(load("buf_shape", None)))
+        elif name == "g2":
+            layout = manifest["g2"]["layout"]
+            # g2 on disk keeps being written to
+            if layout == "memmap":
+                fields[name] = np.load(manifest["g2"]["file"], mmap_mode="r+").transpose(2, 0, 1)
+            elif layout == "triangular" and "file" in manifest["g2"]:
+                fields[name] = TriangularTwoTime.load(manifest["g2"]["file"], mmap_mode="r+")
+            elif layout == "triangular":
+                data = load("g2")
+                num_frames = int(np.sqrt(8 * data.shape[0] + 1) - 1) // 2
+                fields[name] = TriangularTwoTime(data.shape[1], num_frames, data=data)
+            else:
+                fields[name] = load("g2")
+        elif name in ("norm", "time_ind"):
+            fields[name] = {int(key): list(items) for key, items in manifest[name].items()}
+        elif name in manifest:
+            fields[name] = manifest[name]
+        else:
+            fields[name] = load(name)
+    return state_type(**fields)
+
+
+def checkpoint_gen(gen, path, every=1000):
+    """Write the state of a correlation generator to disk as it runs
+
+    Wraps the generators `lazy_one_time`, `lazy_two_time` and their sparse
+    counterparts, and passes their results through unchanged. The internal
+    state is written with `save_state` after every `every` processed
+    images and once more when the generator is exhausted.
+
+    Parameters
+    ----------
+    gen : generator
+        the correlation generator
+    path : str
+        directory the state is written to
+    every : int, optional
+        number of images between checkpoints, defaults to 1000
+
+    Yields
+    ------
+    result
+        whatever `gen` yields
+
+    Examples
+    --------
+    >>> for result in checkpoint_gen(lazy_one_time(images, 4, 8, labels), 'state', every=100):
+    ...     pass
+    >>> # after a crash
+    >>> state = load_state('state')
+    >>> resumed = lazy_one_time(images[state.img_per_level[0]:], 4, 8, labels, internal_state=state)
+    """
+    if every < 1:
+        raise ValueError("every must be a positive integer. Got {}".format(every))
+    result = None
+    for n, result in enumerate(gen, 1):
+        if n % every == 0:
+            save_state(getattr(result, "internal_state", result), path)
+        yield result
+    if result is not None and n % every != 0:
+        save_state(getattr(result, "internal_state", result), path)
 
 
 def _two_time_process(
@@ -754,7 +1724,116 @@ def _two_time_process(
             g2[:, int(tind1), int(tind2)] = tmp_binned / (pi_binned * fi_binned) * num_pixels
 
 
-def _init_state_two_time(num_levels, num_bufs, labels, num_frames):
+def _two_time_process_sparse(
+    buf,
+    g2,
+    label_array,
+    num_bufs,
+    num_pixels,
+    img_per_level,
+    lag_steps,
+    current_img_time,
+    level,
+    buf_no,
+):
+    """Sparse implementation of `_two_time_process`
+
+    Every element of `buf` is a sparse image, i.e. a ``(positions, counts)``
+    tuple of the nonzero pixels, with positions into `label_array` in
+    increasing order. For the parameters see `_two_time_process`.
+    """
+    img_per_level[level] += 1
+    num_rois = len(num_pixels)
+
+    # in multi-tau correlation other than first level all other levels
+    #  have to do the half of the correlation
+    if level == 0:
+        i_min = 0
+    else:
+        i_min = num_bufs // 2
+
+    future_pos, future_counts = buf[level, buf_no]
+    # get the matrix of future intensity normalizations
+    fi_binned = np.bincount(label_array[future_pos], weights=future_counts, minlength=num_rois + 1)[1:]
+
+    for i in range(i_min, min(img_per_level[level], num_bufs)):
+        t_index = level * num_bufs // 2 + i
+
+        delay_no = (buf_no - i) % num_bufs
+
+        past_pos, past_counts = buf[level, delay_no]
+        past_idx, future_idx = _sparse_overlap(past_pos, future_pos)
+
+        #  get the matrix of correlation function without normalizations
+        tmp_binned = np.bincount(
+            label_array[past_pos[past_idx]],
+            weights=past_counts[past_idx] * future_counts[future_idx],
+            minlength=num_rois + 1,
+        )[1:]
+        # get the matrix of past intensity normalizations
+        pi_binned = np.bincount(label_array[past_pos], weights=past_counts, minlength=num_rois + 1)[1:]
+
+        tind1 = current_img_time - 1
+
+        tind2 = current_img_time - lag_steps[t_index] - 1
+
+        if not isinstance(current_img_time, int):
+            nshift = 2 ** (level - 1)
+            for i in range(-nshift + 1, nshift + 1):
+                g2[:, int(tind1 + i), int(tind2 + i)] = (tmp_binned / (pi_binned * fi_binned)) * num_pixels
+        else:
+            g2[:, int(tind1), int(tind2)] = tmp_binned / (pi_binned * fi_binned) * num_pixels
+
+
+# implementations of the inner loops, selected by the `engine` argument of
+# `lazy_one_time` and `lazy_two_time`
+_one_time_engines = {
+    "reference": _one_time_process,
+    "vectorized": _one_time_process_vectorized,
+}
+_two_time_engines = {"reference": _two_time_process}
+
+try:
+    from .accumulators.correlation import one_time_process as _one_time_process_compiled
+    from .accumulators.correlation import two_time_process as _two_time_process_compiled
+except ImportError:
+    logger.debug("The compiled correlation extension is not available")
+else:
+    _one_time_engines["compiled"] = _one_time_process_compiled
+    _two_time_engines["compiled"] = _two_time_process_compiled
+
+
+def _get_engine(engines, engine, fallback):
+    """Look up the inner loop implementation named `engine`
+
+    Parameters
+    ----------
+    engines : dict
+        mapping of engine names to implementations
+    engine : str
+        requested engine
+    fallback : str
+        engine to use if the compiled extension was requested but could
+        not be imported
+
+    Returns
+    -------
+    engine : str
+        name of the engine that is used
+    process : callable
+        the implementation of the inner loop
+    """
+    if engine == "compiled" and engine not in engines:
+        logger.warning(
+            "The compiled correlation extension is not available, using the '%s' engine instead", fallback
+        )
+        engine = fallback
+    if engine not in engines:
+        raise ValueError("engine must be one of {}. You provided {}".format(sorted(engines), engine))
+    return engine, engines[engine]
+
+
+def _init_state_two_time(num_levels, num_bufs, labels, num_frames, sparse=False, g2_file=None, triangular=False):
     """Initialize a stateful namedtuple for two time correlation
 
     Parameters
@@ -766,6 +1845,13 @@ def _init_state_two_time(num_levels, num_bufs, labels, num_frames):
     num_frames : int
         number of images to use
         default is number of images
+    sparse : bool, optional
+        if True, the ring buffer holds sparse images for
+        `lazy_two_time_sparse`
+    g2_file : str, optional
+        .npy file to store the two time correlation in
+    triangular : bool, optional
+        if True, store only the lower triangle of the two time correlation
     Returns
     -------
     internal_state : namedtuple
@@ -785,7 +1871,7 @@ def _init_state_two_time(num_levels, num_bufs, labels, num_frames):
         cur,
         norm,
         lev_len,
-    ) = _validate_and_transform_inputs(num_bufs, num_levels, labels)
+    ) = _validate_and_transform_inputs(num_bufs, num_levels, labels, sparse=sparse)
 
     # to count images in each level
     count_level = np.zeros(num_levels, dtype=np.int64)
@@ -797,7 +1883,16 @@ def _init_state_two_time(num_levels, num_bufs, labels, num_frames):
     time_ind = {key: [] for key in range(num_levels)}
 
     # two time correlation results (array)
-    g2 = np.zeros((num_rois, num_frames, num_frames), dtype=np.float64)
+    if triangular:
+        g2 = TriangularTwoTime(num_rois, num_frames, filename=g2_file)
+    elif g2_file is not None:
+        # frames first, so that the results of one image are written to
+        # one contiguous block of the file
+        g2 = np.lib.format.open_memmap(
+            g2_file, mode="w+", dtype=np.float64, shape=(num_frames, num_frames, num_rois)
+        ).transpose(2, 0, 1)
+    else:
+        g2 = np.zeros((num_rois, num_frames, num_frames), dtype=np.float64)
 
     return _two_time_internal_state(
         buf,
@@ -817,7 +1912,143 @@ def _init_state_two_time(num_levels, num_bufs, labels, num_frames):
     )
 
 
-def _validate_and_transform_inputs(num_bufs, num_levels, labels):
+class TriangularTwoTime:
+    """Stack of symmetric two time correlation matrices of which only the
+    lower triangle is stored
+
+    The matrices are indexed like a (num_rois, num_frames, num_frames)
+    array, with integers, slices or integer arrays on every axis. Element
+    ``[q, t1, t2]`` and ``[q, t2, t1]`` are the same storage.
+    Internally, the lower triangles are packed row by row into an array of
+    shape (num_frames * (num_frames + 1) // 2, num_rois), which can be a
+    .npy file on disk.
+
+    Parameters
+    ----------
+    num_rois : int
+        number of ROIs
+    num_frames : int
+        number of frames along each side of the matrices
+    filename : str, optional
+        if given, the packed triangles are stored in this .npy file
+        through a `numpy.memmap`
+    dtype : dtype, optional
+        data type of the stored correlation, defaults to np.float64
+    data : array, optional
+        existing packed triangles to wrap, used by `load`
+    """
+
+    def __init__(self, num_rois, num_frames, filename=None, dtype=np.float64, data=None):
+        size = num_frames * (num_frames + 1) // 2
+        if data is None:
+            if filename is None:
+                data = np.zeros((size, num_rois), dtype=dtype)
+            else:
+                data = np.lib.format.open_memmap(filename, mode="w+", dtype=dtype, shape=(size, num_rois))
+        if data.shape != (size, num_rois):
+            raise ValueError("Expected packed data of shape {}, got {}".format((size, num_rois), data.shape))
+        self.data = data
+        self.num_frames = num_frames
+
+    @classmethod
+    def load(cls, filename, mmap_mode="r"):
+        """Open the packed triangles that were stored in a .npy file
+
+        Parameters
+        ----------
+        filename : str
+            the file given as `filename` or `g2_file` before
+        mmap_mode : str, optional
+            passed on to `numpy.load`
+
+        Returns
+        -------
+        TriangularTwoTime
+        """
+        data = np.load(filename, mmap_mode=mmap_mode)
+        num_frames = int(np.sqrt(8 * data.shape[0] + 1) - 1) // 2
+        return cls(data.shape[1], num_frames, data=data)
+
+    @property
+    def shape(self):
+        return (self.data.shape[1], self.num_frames, self.num_frames)
+
+    @property
+    def ndim(self):
+        return 3
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    def _packed_index(self, t1, t2):
+        t1 = np.asarray(t1)
+        t2 = np.asarray(t2)
+        # support negative indices like numpy does
+        t1 = np.where(t1 < 0, t1 + self.num_frames, t1)
+        t2 = np.where(t2 < 0, t2 + self.num_frames, t2)
+        if np.any((t1 < 0) | (t1 >= self.num_frames) | (t2 < 0) | (t2 >= self.num_frames)):
+            raise IndexError("index out of bounds for {} frames".format(self.num_frames))
+        row = np.maximum(t1, t2)
+        return row * (row + 1) // 2 + np.minimum(t1, t2)
+
+    def _dense_index(self, key):
+        if isinstance(key, tuple) and len(key) == 3 and all(isinstance(t, numbers.Integral) for t in key[1:]):
+            # a single element of every selected ROI, as written by the two
+            # time correlation
+            t1, t2 = (int(t) + self.num_frames if t < 0 else int(t) for t in key[1:])
+            if not (0 <= t1 < self.num_frames and 0 <= t2 < self.num_frames):
+                raise IndexError("index out of bounds for {} frames".format(self.num_frames))
+            row = max(t1, t2)
+            return row * (row + 1) // 2 + min(t1, t2), key[0]
+        # index zero stride views of the ROI and frame numbers with `key`,
+        # which gives the positions it selects in the dense array with all
+        # of numpy's rules for integers, slices and arrays
+        positions = np.ogrid[tuple(slice(n) for n in self.shape)]
+        roi, t1, t2 = (np.broadcast_to(pos, self.shape)[key] for pos in positions)
+        return self._packed_index(t1, t2), roi
+
+    def diagonal(self, offset=0):
+        """Return the `offset` diagonal of all ROIs
+
+        Returns
+        -------
+        array
+            shape (num_rois, num_frames - abs(offset))
+        """
+        offset = abs(offset)
+        t1 = np.arange(offset, self.num_frames)
+        return self.data[self._packed_index(t1, t1 - offset)].T
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            # the full matrix of one or more ROIs
+            data = self.data[:, key]
+            t1, t2 = np.indices((self.num_frames, self.num_frames))
+            matrices = data[self._packed_index(t1, t2)]
+            return matrices if data.ndim == 1 else np.moveaxis(matrices, -1, 0)
+        return self.data[self._dense_index(key)]
+
+    def __setitem__(self, key, value):
+        self.data[self._dense_index(key)] = value
+
+    def __iter__(self):
+        for q in range(len(self)):
+            yield self[q]
+
+    def __array__(self, dtype=None):
+        return np.asarray(self[:], dtype=dtype)
+
+    def flush(self):
+        """Write pending changes of an on-disk `data` to the file"""
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
+
+
+def _validate_and_transform_inputs(num_bufs, num_levels, labels, sparse=False):
     """
     This is a helper function to validate inputs and create initial state
     inputs for both one time and two time correlation
@@ -826,9 +2057,12 @@ def _validate_and_transform_inputs(num_bufs, num_levels, labels):
     ----------
     num_bufs : int
     num_levels : int
-    labels : array
+    labels : array or LabelIndex
         labeled array of the same shape as the image stack;
         each ROI is represented by a distinct label (i.e., integer)
+    sparse : bool, optional
+        if True, `buf` is an object array of empty sparse images instead of
+        a dense array
 
     Returns
     -------
@@ -846,6 +2080,8 @@ def _validate_and_transform_inputs(num_bufs, num_levels, labels):
         the times at which the correlation was computed
     buf : array
         image data for correlation
+        shape (num_levels, num_bufs, len(pixel_list)), or
+        (num_levels, num_bufs) of sparse images if `sparse` is True
     img_per_level : array
         to track how many images processed in each level
     track_level : array
@@ -860,6 +2096,8 @@ def _validate_and_transform_inputs(num_bufs, num_levels, labels):
     if num_bufs % 2 != 0:
         raise ValueError("There must be an even number of `num_bufs`. You " "provided %s" % num_bufs)
     label_array, pixel_list = extract_label_indices(labels)
+    # compact labeled arrays have small unsigned types, bincount wants intp
+    label_array = label_array.astype(np.intp, copy=False)
 
     # map the indices onto a sequential list of integers starting at 1
     label_mapping = {label: n + 1 for n, label in enumerate(np.unique(label_array))}
@@ -883,7 +2121,12 @@ def _validate_and_transform_inputs(num_bufs, num_levels, labels):
 
     # Ring buffer, a buffer with periodic boundary conditions.
     # Images must be keep for up to maximum delay in buf.
-    buf = np.zeros((num_levels, num_bufs, len(pixel_list)), dtype=np.float64)
+    if sparse:
+        buf = np.empty((num_levels, num_bufs), dtype=object)
+        for index in np.ndindex(buf.shape):
+            buf[index] = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.float64))
+    else:
+        buf = np.zeros((num_levels, num_bufs, len(pixel_list)), dtype=np.float64)
     # to track how many images processed in each level
     img_per_level = np.zeros(num_levels, dtype=np.int64)
     # to track which levels have already been processed
@@ -906,19 +2149,102 @@ def _validate_and_transform_inputs(num_bufs, num_levels, labels):
     )
 
 
-def one_time_from_two_time(two_time_corr, calc_errors=False):
+def _events_to_sparse(events, pixel_list):
+    """Convert a frame of photon events into a sparse ring buffer image
+
+    Parameters
+    ----------
+    events : tuple
+        ``(pixel_index, counts)``, indices into the raveled image and the
+        counts at those pixels
+    pixel_list : array
+        sorted indices into the raveled image of all ROI pixels
+
+    Returns
+    -------
+    positions : array
+        sorted, unique positions into `pixel_list` of the events that fall
+        into an ROI
+    counts : array
+        total counts at `positions`
+    """
+    pixel_index, counts = events
+    pixel_index = np.asarray(pixel_index, dtype=np.intp).ravel()
+    counts = np.asarray(counts, dtype=np.float64).ravel()
+    if pixel_index.shape != counts.shape:
+        raise ValueError(
+            "pixel_index and counts must have the same length. "
+            "Got {} and {}".format(len(pixel_index), len(counts))
+        )
+    positions = np.searchsorted(pixel_list, pixel_index)
+    np.minimum(positions, len(pixel_list) - 1, out=positions)
+    in_roi = pixel_list[positions] == pixel_index
+    positions, inverse = np.unique(positions[in_roi], return_inverse=True)
+    counts = np.bincount(inverse, weights=counts[in_roi], minlength=len(positions))
+    return positions, counts
+
+
+def _sparse_overlap(positions1, positions2):
+    """Find the positions that two sparse images have in common
+
+    Parameters
+    ----------
+    positions1, positions2 : array
+        sorted, unique positions of the nonzero pixels
+
+    Returns
+    -------
+    idx1, idx2 : array
+        indices into `positions1` and `positions2` such that
+        ``positions1[idx1] == positions2[idx2]``
+    """
+    if not len(positions2):
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    idx2 = np.searchsorted(positions2, positions1)
+    np.minimum(idx2, len(positions2) - 1, out=idx2)
+    idx1 = np.flatnonzero(positions2[idx2] == positions1)
+    return idx1, idx2[idx1]
+
+
+def _sparse_average(sparse1, sparse2):
+    """Average two sparse images, the sparse counterpart of ``(a + b) / 2``
+
+    Parameters
+    ----------
+    sparse1, sparse2 : tuple
+        ``(positions, counts)`` of the nonzero pixels
+
+    Returns
+    -------
+    positions, counts : array
+        the union of the nonzero pixels and their average counts
+    """
+    positions, inverse = np.unique(np.concatenate([sparse1[0], sparse2[0]]), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate([sparse1[1], sparse2[1]]), minlength=len(positions))
+    return positions, counts / 2
+
+
+def one_time_from_two_time(two_time_corr, calc_errors=False, block_size=None):
     """
     This will provide the one-time correlation data from two-time
     correlation data. An estimator for errors can be calculated
     according to the central limit theorem.
 
+    The means (and errors) of all diagonals are computed at once: rows of
+    the two time matrix are skewed, through a strided view, so that the
+    diagonals become columns. The rows are processed in blocks to bound the
+    memory use.
+
     Parameters
     ----------
-    two_time_corr : array
+    two_time_corr : array or TriangularTwoTime
         matrix of two time correlation
         shape (number of labels(ROI's), number of frames, number of frames)
     calc_errors: boolean
         True to calculate error bars, False to not calculate error bars
+    block_size : int, optional
+        number of rows of the two time matrix that are processed at once.
+        Defaults to blocks of about 4 million elements
 
     Returns
     -------
@@ -929,22 +2255,102 @@ def one_time_from_two_time(two_time_corr, calc_errors=False):
         matrix of errors for one time correlation
         shape (number of labels(ROI's), number of frames)
     """
-
-    one_time_corr = np.zeros((two_time_corr.shape[0], two_time_corr.shape[2]))
+    num_rois, num_frames = two_time_corr.shape[0], two_time_corr.shape[2]
+    if block_size is None:
+        block_size = max(1, 2**22 // num_frames)
+    block_size = min(block_size, num_frames)
+    blocks = [(i0, min(i0 + block_size, num_frames)) for i0 in range(0, num_frames, block_size)]
+    # the rows are copied into the left half, the right half stays zero
+    padded = np.zeros((block_size, 2 * num_frames))
+    lags = np.arange(num_frames)
+    diag_len = num_frames - lags
+
+    one_time_corr = np.zeros((num_rois, num_frames))
     if calc_errors:
-        err_one_time_corr = np.zeros((two_time_corr.shape[0], two_time_corr.shape[2]))
-    for i, g in enumerate(two_time_corr):
-        for j in range(g.shape[1]):
-            diag_array = np.diag(g, k=j)
-            one_time_corr[i, j] = np.nanmean(diag_array)
-            if calc_errors:
-                err_one_time_corr[i, j] = np.nanstd(diag_array) / np.sqrt(len(diag_array))
+        err_one_time_corr = np.zeros((num_rois, num_frames))
+        # the padded lags of the last rows of a block, for each block width
+        paddings = {}
+        for width in {i1 - i0 for i0, i1 in blocks}:
+            paddings[width] = np.add.outer(np.arange(width), np.arange(width)) >= width
+    for q in range(num_rois):
+        total = np.zeros(num_frames)
+        num_nan = np.zeros(num_frames, dtype=np.int64)
+        for i0, i1 in blocks:
+            rows = _skewed_rows(two_time_corr, q, i0, i1, padded)
+            block_total = rows.sum(axis=0)
+            if np.isnan(block_total).any():
+                isnan = np.isnan(rows)
+                num_nan += isnan.sum(axis=0)
+                block_total = np.where(isnan, 0, rows).sum(axis=0)
+            total += block_total
+        count = diag_len - num_nan
+        with np.errstate(invalid="ignore", divide="ignore"):
+            one_time_corr[q] = total / count
+        if not calc_errors:
+            continue
+
+        mean = one_time_corr[q]
+        squares = np.zeros(num_frames)
+        for i0, i1 in blocks:
+            deviation = _skewed_rows(two_time_corr, q, i0, i1, padded) - mean
+            # drop the zero padding past the last frame, row r of the block
+            # is padded from lag num_frames - i0 - r on
+            deviation[:, num_frames - i0 :] = 0
+            np.copyto(deviation[:, num_frames - i1 : num_frames - i0], 0, where=paddings[i1 - i0])
+            block_squares = np.einsum("ij,ij->j", deviation, deviation)
+            if np.isnan(block_squares).any():
+                deviation[np.isnan(deviation)] = 0
+                block_squares = np.einsum("ij,ij->j", deviation, deviation)
+            squares += block_squares
+        # the standard error uses the length of the diagonal, np.nan
+        # elements included
+        with np.errstate(invalid="ignore", divide="ignore"):
+            err_one_time_corr[q] = np.sqrt(squares / count) / np.sqrt(diag_len)
     if calc_errors:
         return one_time_corr, err_one_time_corr
     else:
         return one_time_corr
 
 
+def _skewed_rows(two_time_corr, q, i0, i1, padded):
+    """Return rows ``i0:i1`` of a two time matrix, shifted so that the
+    diagonals become columns
+
+    Parameters
+    ----------
+    two_time_corr : array or TriangularTwoTime
+        shape (number of labels(ROI's), number of frames, number of frames)
+    q : int
+        index of the ROI
+    i0, i1 : int
+        first and last (exclusive) row
+    padded : array
+        scratch array of at least ``i1 - i0`` rows and twice the number of
+        frames as columns, of which the right half is zero
+
+    Returns
+    -------
+    skewed : array
+        read only view of `padded` with
+        ``skewed[r, k] == two_time_corr[q, i0 + r, i0 + r + k]``, and zero
+        where ``i0 + r + k`` is past the last frame
+        shape (i1 - i0, number of frames)
+    """
+    num_frames = two_time_corr.shape[2]
+    if isinstance(two_time_corr, TriangularTwoTime):
+        t1, t2 = np.ogrid[i0:i1, 0:num_frames]
+        padded[: i1 - i0, :num_frames] = two_time_corr[q, t1, t2]
+    else:
+        padded[: i1 - i0, :num_frames] = two_time_corr[q, i0:i1]
+    # step one element further to the right on every row
+    return np.lib.stride_tricks.as_strided(
+        padded[:, i0:],
+        shape=(i1 - i0, num_frames),
+        strides=(padded.strides[0] + padded.strides[1], padded.strides[1]),
+        writeable=False,
+    )
+
+
 class CrossCorrelator:
     """
     Compute a 1D or 2D cross-correlation on data.
@@ -981,7 +2387,7 @@ class CrossCorrelator:
 
     """
 
-    def __init__(self, shape, mask=None, normalization=None):
+    def __init__(self, shape, mask=None, normalization=None, workers=1):
         """
         Prepare the spatial correlator for various regions specified by the
         id's in the image.
@@ -1003,12 +2409,17 @@ class CrossCorrelator:
                 'regular' : divide by pixel number
                 'symavg' : use symmetric averaging
             Defaults to ['regular'] normalization
+
+        workers : int, optional
+            Number of threads the regions are spread over when correlating.
+            -1 uses all the available CPUs. Defaults to 1
         """
         if normalization is None:
             normalization = ["regular"]
         elif not isinstance(normalization, list):
             normalization = list([normalization])
         self.normalization = normalization
+        self.workers = workers
 
         if mask is None:
             mask = np.ones(shape)
@@ -1097,6 +2508,9 @@ class CrossCorrelator:
         self.maskcorrs = list()
         # regions where the correlations are not zero
         self.pxlst_maskcorrs = list()
+        # the padded shapes and the FFTs of the submasks
+        self.fft_shapes = list()
+        self.mask_ffts = list()
 
         # basically saving bunch of mask related stuff like indexing etc, just
         # to save some time when actually computing the cross correlations
@@ -1108,7 +2522,12 @@ class CrossCorrelator:
             submask[ppiis, ppjjs] = 1
             self.submasks.append(submask)
 
-            maskcorr = _cross_corr(submask)
+            fft_shape = _fft_corr_shape(submask.shape)
+            mask_fft = sp_fft.rfftn(submask, fft_shape)
+            self.fft_shapes.append(fft_shape)
+            self.mask_ffts.append(mask_fft)
+
+            maskcorr = _fft_corr(mask_fft, mask_fft, submask.shape, fft_shape)
             # choose some small value to threshold
             maskcorr *= maskcorr > 0.5
             # This following line was originally placed two lines below. It was moved here in order
@@ -1133,7 +2552,17 @@ class CrossCorrelator:
             self.positions = self.positions[0]
             self.centers = self.centers[0]
 
-    def __call__(self, img1, img2=None, normalization=None):
+    def _num_workers(self, workers):
+        # resolve the `workers` argument of `map` and `correlate_stack`
+        if workers is None:
+            workers = self.workers
+        if workers == -1:
+            workers = os.cpu_count()
+        if workers < 1:
+            raise ValueError("workers must be a positive integer or -1. Got {}".format(workers))
+        return workers
+
+    def __call__(self, img1, img2=None, normalization=None, workers=None):
         """Run the cross correlation on an image/curve or against two
             images/curves
 
@@ -1150,6 +2579,11 @@ class CrossCorrelator:
             normalization types. If not set, use internally saved
             normalization parameters
 
+        workers : int, optional
+            Number of threads the regions are spread over. -1 uses all
+            the available CPUs. If not set, use the internally saved
+            number of workers
+
         Returns
         -------
         ccorrs : 1d or 2d np.ndarray
@@ -1158,80 +2592,272 @@ class CrossCorrelator:
             shape of the array
 
         """
+        return self.map([img1], None if img2 is None else [img2], normalization=normalization, workers=workers)[0]
+
+    def map(self, images1, images2=None, normalization=None, workers=None):
+        """Run the cross correlation on a batch of images/curves or image
+            pairs
+
+        The (pair, region) tasks of the whole batch are spread over one
+        pool of threads. The FFTs release the GIL, so the regions are
+        correlated in parallel.
+
+        Parameters
+        ----------
+        images1 : iterable of 1D or 2D np.ndarray
+            The images (or curves) to run the cross correlation on
+
+        images2 : iterable of 1D or 2D np.ndarray, optional
+            If not set to None, run cross correlation of each of these
+            images (or curves) against the image of images1 at the same
+            position. Default is None.
+
+        normalization : string or list of strings
+            normalization types. If not set, use internally saved
+            normalization parameters
+
+        workers : int, optional
+            Number of threads the tasks are spread over. -1 uses all the
+            available CPUs. If not set, use the internally saved number of
+            workers
+
+        Returns
+        -------
+        results : list
+            One entry per image (pair), as returned by `__call__`
+        """
         if normalization is None:
             normalization = self.normalization
+        workers = self._num_workers(workers)
 
-        if img1.shape != self.shape:
-            raise ValueError(
-                "Image not expected shape." + "Got {}, ".format(img1.shape) + "expected {}".format(self.shape)
-            )
-        # reshape for 1D case
-        if self.ndim == 1:
-            img1 = img1.reshape((1, self.shape[0]))
-
-        if img2 is None:
-            self_correlation = True
+        images1 = [self._check_image(img, "Image") for img in images1]
+        if images2 is None:
+            images2 = [None] * len(images1)
         else:
-            self_correlation = False
-            if img2.shape != self.shape:
+            images2 = [self._check_image(img, "Second image") for img in images2]
+            if len(images2) != len(images1):
                 raise ValueError(
-                    "Second image not expected shape. "
-                    + "Got {}".format(img2.shape)
-                    + " expected {}".format(self.shape)
+                    "Number of images doesn't match. "
+                    + "(images1 : {}; images2 : {})".format(len(images1), len(images2))
                 )
-            if self.ndim == 1:
-                img2 = img2.reshape((1, self.shape[0]))
 
-        ccorrs = list()
-        rngiter = tqdm(range(self.nids))
+        tasks = [(img1, img2, i) for img1, img2 in zip(images1, images2) for i in range(self.nids)]
 
-        idpos = self.idpos
-        for i in rngiter:
-            index_start, index_stop = idpos[i], idpos[i + 1]
-            ppiis = self.ppii[index_start:index_stop]
-            ppjjs = self.ppjj[index_start:index_stop]
-            pis = self.pi[index_start:index_stop]
-            pjs = self.pj[index_start:index_stop]
-            tmpimg = np.zeros(self.shapes[i, :])
-            tmpimg[ppiis, ppjjs] = img1[pis, pjs]
-
-            if not self_correlation:
-                tmpimg2 = np.zeros_like(tmpimg)
-                tmpimg2[ppiis, ppjjs] = img2[pis, pjs]
-                tmpimg2[ppiis, ppjjs] = img2[pis, pjs]
+        def correlate(task):
+            img1, img2, i = task
+            # correlate stacks of a single frame
+            img1 = img1[np.newaxis]
+            if img2 is not None:
+                img2 = img2[np.newaxis]
+            return self._correlate_region(i, img1, img2, normalization)[0]
+
+        if workers == 1:
+            ccorrs = [correlate(task) for task in tqdm(tasks)]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # map keeps the order of the tasks
+                ccorrs = list(tqdm(executor.map(correlate, tasks)))
+
+        results = [ccorrs[k : k + self.nids] for k in range(0, len(ccorrs), self.nids)]
+        if self.nids == 1:
+            results = [ccorr[0] for ccorr in results]
+        return results
+
+    def correlate_stack(self, images1, images2=None, normalization=None, mean=False, chunk_size=64, workers=None):
+        """Run the cross correlation on every frame of an image series
+
+        All the frames of a chunk are correlated per region in one batched
+        FFT along the frame axis.
+
+        Parameters
+        ----------
+        images1 : 2D or 3D np.ndarray
+            The stack of curves or images (frames x rows x cols) to run the
+            cross correlation on. May be a `numpy.memmap`, it is read one
+            chunk at a time
+
+        images2 : 2D or 3D np.ndarray, optional
+            If not set to None, run cross correlation of each frame of this
+            stack against the frame of images1 at the same position. Default
+            is None.
+
+        normalization : string or list of strings
+            normalization types. If not set, use internally saved
+            normalization parameters
+
+        mean : bool, optional
+            If True, return the mean correlation over all the frames. Only
+            the running sum is kept, not the correlation of every frame.
+            Default is False
+
+        chunk_size : int, optional
+            Number of frames transformed at once. Default is 64
+
+        workers : int, optional
+            Number of threads the regions are spread over. -1 uses all the
+            available CPUs. If not set, use the internally saved number of
+            workers
 
+        Returns
+        -------
+        ccorrs : np.ndarray or list of np.ndarray
+            The correlations of every frame, stacked along the first axis,
+            one array per region as in `__call__`. If mean is True, the mean
+            correlation of the frames, as `__call__` returns for a single
+            frame
+        """
+        if normalization is None:
+            normalization = self.normalization
+        workers = self._num_workers(workers)
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer. Got {}".format(chunk_size))
+
+        if images1.shape[1:] != self.shape:
+            raise ValueError(
+                "Images not expected shape. "
+                + "Got frames of shape {}, ".format(images1.shape[1:])
+                + "expected {}".format(self.shape)
+            )
+        if images2 is not None and images2.shape != images1.shape:
+            raise ValueError(
+                "Image stack shapes don't match. "
+                + "(images1 : {}; images2 : {})".format(images1.shape, images2.shape)
+            )
+        num_frames = len(images1)
+        if num_frames == 0:
+            raise ValueError("No frames to correlate")
+
+        ccorrs = [None] * self.nids
+        executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            for start in tqdm(range(0, num_frames, chunk_size)):
+                stop = min(start + chunk_size, num_frames)
+                # read the chunk of frames once for all the regions
+                chunk1 = np.asarray(images1[start:stop]).reshape((stop - start, -1, self.shape[-1]))
+                chunk2 = None
+                if images2 is not None:
+                    chunk2 = np.asarray(images2[start:stop]).reshape((stop - start, -1, self.shape[-1]))
+
+                def correlate(i):
+                    return self._correlate_region(i, chunk1, chunk2, normalization)
+
+                if executor is None:
+                    results = map(correlate, range(self.nids))
+                else:
+                    results = executor.map(correlate, range(self.nids))
+
+                for i, ccorr in enumerate(results):
+                    if mean:
+                        if ccorrs[i] is None:
+                            ccorrs[i] = np.zeros(ccorr.shape[1:])
+                        ccorrs[i] += ccorr.sum(axis=0)
+                    else:
+                        if ccorrs[i] is None:
+                            ccorrs[i] = np.empty((num_frames,) + ccorr.shape[1:])
+                        ccorrs[i][start:stop] = ccorr
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        if mean:
+            for ccorr in ccorrs:
+                ccorr /= num_frames
+        if len(ccorrs) == 1:
+            ccorrs = ccorrs[0]
+        return ccorrs
+
+    def _check_image(self, img, name):
+        """Check the shape of an incoming image and reshape it for the 1D
+        case"""
+        if img.shape != self.shape:
+            raise ValueError(
+                "{} not expected shape. ".format(name)
+                + "Got {}, ".format(img.shape)
+                + "expected {}".format(self.shape)
+            )
+        if self.ndim == 1:
+            img = img.reshape((1, self.shape[0]))
+        return img
+
+    def _correlate_region(self, i, img1, img2, normalization):
+        """Cross correlate region i of a stack of images img1 (against the
+        stack img2 if it is not None), frames along the first axis"""
+        self_correlation = img2 is None
+        index_start, index_stop = self.idpos[i], self.idpos[i + 1]
+        ppiis = self.ppii[index_start:index_stop]
+        ppjjs = self.ppjj[index_start:index_stop]
+        pis = self.pi[index_start:index_stop]
+        pjs = self.pj[index_start:index_stop]
+        tmpimg = np.zeros((len(img1),) + tuple(self.shapes[i, :]))
+        tmpimg[:, ppiis, ppjjs] = img1[:, pis, pjs]
+
+        if not self_correlation:
+            tmpimg2 = np.zeros_like(tmpimg)
+            tmpimg2[:, ppiis, ppjjs] = img2[:, pis, pjs]
+
+        # the images are zero outside of the submask, so their FFTs are also
+        # the FFTs of the masked images needed by the symmetric averaging
+        shape, fft_shape, mask_fft = tmpimg.shape[1:], self.fft_shapes[i], self.mask_ffts[i]
+        img_fft = sp_fft.rfftn(tmpimg, fft_shape, axes=(1, 2))
+        if self_correlation:
+            img_fft2 = img_fft
+        else:
+            img_fft2 = sp_fft.rfftn(tmpimg2, fft_shape, axes=(1, 2))
+        ccorr = _fft_corr(img_fft, img_fft2, shape, fft_shape)
+
+        # Note, in this code, non-overlapping regions will now get np.nan
+        # also, for sym averaging, if Icorr*Icorr2==0, then we also get
+        # np.nan
+        if "symavg" in normalization:
+            # do symmetric averaging
+            Icorr = _fft_corr(img_fft, mask_fft, shape, fft_shape)
             if self_correlation:
-                ccorr = _cross_corr(tmpimg)
+                # correlating the other way round mirrors the shifts
+                Icorr2 = Icorr[:, ::-1, ::-1]
             else:
-                ccorr = _cross_corr(tmpimg, tmpimg2)
-
-            # Note, in this code, non-overlapping regions will now get np.nan
-            # also, for sym averaging, if Icorr*Icorr2==0, then we also get
-            # np.nan
-            if "symavg" in normalization:
-                # do symmetric averaging
-                Icorr = _cross_corr(tmpimg * self.submasks[i], self.submasks[i])
-                if self_correlation:
-                    Icorr2 = _cross_corr(self.submasks[i], tmpimg * self.submasks[i])
-                else:
-                    Icorr2 = _cross_corr(self.submasks[i], tmpimg2 * self.submasks[i])
+                Icorr2 = _fft_corr(mask_fft, img_fft2, shape, fft_shape)
+            # exact zeros in Icorr * Icorr2 give np.nan or inf, see above
+            with np.errstate(divide="ignore", invalid="ignore"):
                 ccorr *= self.maskcorrs[i] / Icorr / Icorr2
 
-            if "regular" in normalization:
-                if self_correlation:
-                    ccorr /= self.maskcorrs[i] * np.average(tmpimg[ppiis, ppjjs]) ** 2
-                else:
-                    ccorr /= (
-                        self.maskcorrs[i] * np.average(tmpimg[ppiis, ppjjs]) * np.average(tmpimg2[ppiis, ppjjs])
-                    )
-            if self.ndim == 1:
-                ccorr = ccorr.reshape(-1)
-            ccorrs.append(ccorr)
+        if "regular" in normalization:
+            average = np.mean(tmpimg[:, ppiis, ppjjs], axis=1)[:, np.newaxis, np.newaxis]
+            if self_correlation:
+                ccorr /= self.maskcorrs[i] * average**2
+            else:
+                average2 = np.mean(tmpimg2[:, ppiis, ppjjs], axis=1)[:, np.newaxis, np.newaxis]
+                ccorr /= self.maskcorrs[i] * average * average2
+        if self.ndim == 1:
+            ccorr = ccorr.reshape(len(ccorr), -1)
+        return ccorr
 
-        if len(ccorrs) == 1:
-            ccorrs = ccorrs[0]
 
-        return ccorrs
+def _fft_corr_shape(shape):
+    """The shape that arrays of a shape are zero padded to for their FFT
+    based full cross correlation. It is fast to transform"""
+    return tuple(sp_fft.next_fast_len(2 * n - 1, real=True) for n in shape)
+
+
+def _fft_corr(fft1, fft2, shape, fft_shape):
+    """Compute the full cross correlation from the FFTs of two images
+
+    Same as `_cross_corr` of the two images, given their ``scipy.fft.rfftn``
+    over the last ``len(shape)`` axes, zero padded to
+    ``fft_shape = _fft_corr_shape(shape)``. Leading axes are broadcast.
+    """
+    ndim = len(shape)
+    imgc = sp_fft.irfftn(fft1 * fft2.conj(), fft_shape, axes=tuple(range(-ndim, 0)))
+    # the correlation is circular, the negative shifts wrapped around to
+    # the end of each axis are moved in front of the positive ones
+    corr = np.empty(imgc.shape[:-ndim] + tuple(2 * n - 1 for n in shape))
+    blocks = [
+        ((slice(None, n - 1), slice(m - n + 1, None)), (slice(n - 1, None), slice(None, n)))
+        for n, m in zip(shape, fft_shape)
+    ]
+    for block in itertools.product(*blocks):
+        dest, source = zip(*block)
+        corr[(Ellipsis,) + dest] = imgc[(Ellipsis,) + source]
+    return corr
 
 
 def _cross_corr(img1, img2=None):
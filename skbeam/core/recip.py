@@ -41,12 +41,13 @@ calculations.
 """
 from __future__ import absolute_import, division, print_function
 
+import os
 import time
 from collections import namedtuple
 
 import numpy as np
 
-from .utils import verbosedict
+from .utils import _defaults, verbosedict
 
 try:
     from pyFAI import geometry as geo
@@ -60,7 +61,16 @@ logger = logging.getLogger(__name__)
 
 
 def process_to_q(
-    setting_angles, detector_size, pixel_size, calibrated_center, dist_sample, wavelength, ub, frame_mode=None
+    setting_angles,
+    detector_size,
+    pixel_size,
+    calibrated_center,
+    dist_sample,
+    wavelength,
+    ub,
+    frame_mode=None,
+    num_threads=None,
+    dtype=np.float64,
 ):
     """
     This will compute the hkl values for all pixels in a shape specified by
@@ -106,12 +116,26 @@ def process_to_q(
         See the `process_to_q.frame_mode` attribute for an exact list of
         valid options.
 
+    num_threads : int, optional
+        Number of threads to convert with, -1 uses all CPUs. Defaults to
+        the OpenMP default, usually all CPUs
+
+    dtype : {np.float64, np.float32}, optional
+        The type of the returned values. They are computed in float64 and
+        rounded to float32 row by row, so a float32 result takes half the
+        memory without a float64 copy. Defaults to float64
+
     Returns
     -------
     hkl : ndarray
         (Qx, Qy, Qz) - HKL values
         shape is [num_images * num_rows * num_columns][3]
 
+    See Also
+    --------
+    lazy_process_to_q : the HKL values of a batch of images at a time
+    process_to_grid : grid the images without keeping the HKL values
+
     Notes
     -----
     Six angles of an image: (delta, theta, chi, phi, mu, gamma )
@@ -128,6 +152,252 @@ def process_to_q(
        1998.
 
     """
+    angles, convert = _q_converter(
+        setting_angles,
+        detector_size,
+        pixel_size,
+        calibrated_center,
+        dist_sample,
+        wavelength,
+        ub,
+        frame_mode,
+        num_threads,
+        dtype,
+    )
+    # *********** Converting to Q   **************
+
+    # starting time for the process
+    t1 = time.time()
+
+    hkl = convert(angles)
+
+    # ending time for the process
+    t2 = time.time()
+    logger.info(
+        "Processing time for {0} {1} x {2} images took {3} seconds."
+        "".format(angles.shape[0], detector_size[0], detector_size[1], (t2 - t1))
+    )
+    return hkl
+
+
+# Assign frame_mode as an attribute to the process_to_q function so that the
+# autowrapping knows what the valid options are
+process_to_q.frame_mode = ["theta", "phi", "cart", "hkl"]
+
+
+def lazy_process_to_q(
+    setting_angles,
+    detector_size,
+    pixel_size,
+    calibrated_center,
+    dist_sample,
+    wavelength,
+    ub,
+    frame_mode=None,
+    chunk_size=1,
+    num_threads=None,
+    dtype=np.float64,
+):
+    """Generator of the HKL values of a batch of images at a time
+
+    `process_to_q` returns the values of all the images in one array,
+    num_images * num_rows * num_columns * 3 values, e.g. 48 GB for 500
+    images of a 2k x 2k detector. This yields them for `chunk_size` images
+    at a time instead.
+
+    Parameters
+    ----------
+    setting_angles, detector_size, pixel_size, calibrated_center,
+    dist_sample, wavelength, ub, frame_mode, num_threads, dtype
+        See `process_to_q`
+    chunk_size : int, optional
+        Number of images per batch. Defaults to 1
+
+    Yields
+    ------
+    hkl : ndarray
+        (Qx, Qy, Qz) - HKL values of a batch of images, shape is
+        [num_batch_images * num_rows * num_columns][3]. Concatenated, the
+        batches are the result of `process_to_q`
+    """
+    if int(chunk_size) < 1:
+        raise ValueError("chunk_size must be a positive integer. Received: {}".format(chunk_size))
+    angles, convert = _q_converter(
+        setting_angles,
+        detector_size,
+        pixel_size,
+        calibrated_center,
+        dist_sample,
+        wavelength,
+        ub,
+        frame_mode,
+        num_threads,
+        dtype,
+    )
+    for start in range(0, len(angles), int(chunk_size)):
+        yield convert(angles[start : start + int(chunk_size)])
+
+
+def process_to_grid(
+    setting_angles,
+    img_stack,
+    detector_size,
+    pixel_size,
+    calibrated_center,
+    dist_sample,
+    wavelength,
+    ub,
+    frame_mode=None,
+    nx=None,
+    ny=None,
+    nz=None,
+    xmin=None,
+    xmax=None,
+    ymin=None,
+    ymax=None,
+    zmin=None,
+    zmax=None,
+    binary_mask=None,
+    chunk_size=1,
+    num_threads=None,
+):
+    """Grid images in reciprocal space without keeping their HKL values
+
+    This is ``grid3d(process_to_q(...), img_stack, ...)``, but the HKL
+    values are computed and gridded `chunk_size` images at a time, so that
+    the HKL values of the whole stack are never in memory.
+
+    Parameters
+    ----------
+    setting_angles, detector_size, pixel_size, calibrated_center,
+    dist_sample, wavelength, ub, frame_mode, num_threads
+        See `process_to_q`
+    img_stack : ndarray
+        Intensity array of the images, dimensions are
+        [num_img][num_rows][num_cols]. Only a batch of images at a time
+        is read, so this can be a memory mapped file
+    nx, ny, nz, xmin, xmax, ymin, ymax, zmin, zmax, binary_mask
+        See `skbeam.core.utils.grid3d`. If any of the limits is not given,
+        the HKL values are computed twice, once to find the limits and once
+        to grid them
+    chunk_size : int, optional
+        Number of images per batch. Defaults to 1
+
+    Returns
+    -------
+    mean, occupancy, std_err, bounds
+        See `skbeam.core.utils.grid3d`
+    """
+    if int(chunk_size) < 1:
+        raise ValueError("chunk_size must be a positive integer. Received: {}".format(chunk_size))
+    chunk_size = int(chunk_size)
+    angles, convert = _q_converter(
+        setting_angles,
+        detector_size,
+        pixel_size,
+        calibrated_center,
+        dist_sample,
+        wavelength,
+        ub,
+        frame_mode,
+        num_threads,
+        np.float64,
+    )
+    from ..ext import ctrans
+
+    if len(img_stack) != len(angles):
+        raise ValueError(
+            "There must be one image per row of setting_angles. Received {} images and {} setting angles"
+            "".format(len(img_stack), len(angles))
+        )
+    image_shape = np.shape(img_stack[0])
+    if binary_mask is not None and binary_mask.shape not in (image_shape, (len(angles),) + image_shape):
+        raise ValueError(
+            "The binary mask must be the same shape as the"
+            "img_stack ({0}) or a single image in the image "
+            "stack ({1}).  The input binary mask is shaped ({2})"
+            "".format((len(angles),) + image_shape, image_shape, binary_mask.shape)
+        )
+
+    def batches():
+        for start in range(0, len(angles), chunk_size):
+            yield start, convert(angles[start : start + chunk_size])
+
+    t1 = time.time()
+    limits = (xmin, ymin, zmin, xmax, ymax, zmax)
+    if any(limit is None for limit in limits):
+        qmin = np.full(3, np.inf)
+        qmax = np.full(3, -np.inf)
+        for _, q in batches():
+            np.minimum(qmin, q.min(axis=0), out=qmin)
+            np.maximum(qmax, q.max(axis=0), out=qmax)
+        # the same padding as grid3d, so that all of the points are in
+        # bounds with the binning rules: lo <= val < hi
+        qmax += np.spacing(qmax)
+    else:
+        qmin = np.empty(3)
+        qmax = np.empty(3)
+    dqn = [_defaults["nx"], _defaults["ny"], _defaults["nz"]]
+    for target, input_vals in ((dqn, (nx, ny, nz)), (qmin, (xmin, ymin, zmin)), (qmax, (xmax, ymax, zmax))):
+        for j, in_val in enumerate(input_vals):
+            if in_val is not None:
+                target[j] = in_val
+
+    grids = {}
+    for start, q in batches():
+        images = np.asarray(img_stack[start : start + chunk_size])
+        data = np.empty((len(q), 4))
+        data[:, :3] = q
+        data[:, 3] = np.ravel(images)
+        if binary_mask is not None:
+            if binary_mask.ndim == 3:
+                mask = binary_mask[start : start + chunk_size]
+            else:
+                mask = np.broadcast_to(binary_mask, images.shape)
+            data = data[np.ravel(mask)]
+        # the first call allocates the grids, the following ones add to them
+        total, total2, occupancy, _ = ctrans.grid3d(data, qmin, qmax, dqn, **grids)
+        grids = dict(gridout=total, grid2out=total2, nout=occupancy)
+
+    mean = total / occupancy
+    # ctrans.grid3d only fills in the standard error where the last batch
+    # had data, compute it for the sums of all batches with its formula
+    std_err = np.zeros(total.shape)
+    filled = occupancy > 0
+    n = occupancy[filled].astype(float)
+    var = (total2[filled] - total[filled] ** 2 / n) / n
+    std_err[filled] = np.sqrt(var) / np.sqrt(n)
+
+    t2 = time.time()
+    logger.info(
+        "Processing and gridding {0} {1} x {2} images took {3} seconds."
+        "".format(len(angles), detector_size[0], detector_size[1], (t2 - t1))
+    )
+    bounds = np.array([qmin, qmax, dqn]).T
+    return mean, occupancy, std_err, bounds
+
+
+def _q_converter(
+    setting_angles,
+    detector_size,
+    pixel_size,
+    calibrated_center,
+    dist_sample,
+    wavelength,
+    ub,
+    frame_mode,
+    num_threads,
+    dtype,
+):
+    """Validate the parameters of `process_to_q`
+
+    Returns
+    -------
+    angles : ndarray
+        The setting angles in radians, [num_images][6]
+    convert : callable
+        Computes the HKL values of the images of some rows of `angles`
+    """
     try:
         from ..ext import ctrans
     except ImportError:
@@ -137,7 +407,16 @@ def process_to_q(
             "to follow updates to this problem."
         )
 
-    # Set default threads
+    # Set default threads, 0 leaves the choice to OpenMP
+    if num_threads is None:
+        num_threads = 0
+    elif num_threads == -1:
+        num_threads = os.cpu_count() or 1
+    elif num_threads < 1:
+        raise ValueError("num_threads must be at least 1, or -1 for all CPUs. Got {}".format(num_threads))
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float64, np.float32):
+        raise ValueError("dtype must be float64 or float32. Got {}".format(dtype))
 
     # set default frame_mode
     if frame_mode is None:
@@ -162,35 +441,24 @@ def process_to_q(
             "the setting_angles parameter. You provided {0}"
             " angles.".format(setting_angles.shape[1])
         )
-    # *********** Converting to Q   **************
-
-    # starting time for the process
-    t1 = time.time()
-
-    # ctrans - c routines for fast data analysis
-    hkl = ctrans.ccdToQ(
-        angles=setting_angles * np.pi / 180.0,
-        mode=frame_mode,
-        ccd_size=(detector_size),
-        ccd_pixsize=(pixel_size),
-        ccd_cen=(calibrated_center),
-        dist=dist_sample,
-        wavelength=wavelength,
-        UBinv=np.linalg.inv(ub),
-    )
-
-    # ending time for the process
-    t2 = time.time()
-    logger.info(
-        "Processing time for {0} {1} x {2} images took {3} seconds."
-        "".format(setting_angles.shape[0], detector_size[0], detector_size[1], (t2 - t1))
-    )
-    return hkl
-
+    ubinv = np.linalg.inv(ub)
+
+    def convert(angles):
+        # ctrans - c routines for fast data analysis
+        return ctrans.ccdToQ(
+            angles=angles,
+            mode=frame_mode,
+            ccd_size=(detector_size),
+            ccd_pixsize=(pixel_size),
+            ccd_cen=(calibrated_center),
+            dist=dist_sample,
+            wavelength=wavelength,
+            UBinv=ubinv,
+            num_threads=int(num_threads),
+            single=dtype == np.float32,
+        )
 
-# Assign frame_mode as an attribute to the process_to_q function so that the
-# autowrapping knows what the valid options are
-process_to_q.frame_mode = ["theta", "phi", "cart", "hkl"]
+    return setting_angles * np.pi / 180.0, convert
 
 
 def hkl_to_q(hkl_arr):
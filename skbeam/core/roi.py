@@ -42,10 +42,10 @@ from __future__ import absolute_import, division, print_function
 
 import collections
 import logging
+import time
 
 import numpy as np
-from scipy import ndimage
-from skimage import color, draw, feature, img_as_float
+from skimage import color, draw, feature, img_as_float, transform
 from skimage.draw import line
 from skimage.measure import CircleModel, ransac
 
@@ -308,7 +308,7 @@ def roi_max_counts(images_sets, label_array):
         iterable of 4D arrays
         shapes is: (len(images_sets), )
 
-    label_array : array
+    label_array : array or LabelIndex
         labeled array; 0 is background.
         Each ROI is represented by a distinct label (i.e., integer).
 
@@ -317,10 +317,17 @@ def roi_max_counts(images_sets, label_array):
     max_counts : int
         maximum pixel counts
     """
+    label_index = _as_label_index(label_array)
     max_cts = 0
+    if not len(label_index.pixel_list):
+        return max_cts
     for img_set in images_sets:
+        if isinstance(img_set, np.ndarray):
+            # the whole stack in one reduction
+            max_cts = max(max_cts, label_index.gather(img_set).max())
+            continue
         for img in img_set:
-            max_cts = max(max_cts, ndimage.maximum(img, label_array))
+            max_cts = max(max_cts, label_index.gather(img).max())
     return max_cts
 
 
@@ -333,9 +340,10 @@ def roi_pixel_values(image, labels, index=None):
     Parameters
     ----------
     image : array
-        image data dimensions are: (rr, cc)
+        image data dimensions are: (rr, cc), or a stack of images
+        (num_img, rr, cc)
 
-    labels : array
+    labels : array or LabelIndex
         labeled array; 0 is background.
         Each ROI is represented by a distinct label (i.e., integer).
 
@@ -348,34 +356,51 @@ def roi_pixel_values(image, labels, index=None):
     -------
     roi_pix : list
         intensities of the ROI's of the labeled array according
-        to the pixel list
+        to the pixel list. For a stack of images each element has
+        the dimensions (num_img, num_pixels)
 
     """
-    if labels.shape != image.shape:
+    label_index = _as_label_index(labels)
+    image = np.asarray(image)
+    if image.shape[image.ndim - len(label_index.shape) :] != label_index.shape or image.ndim > 3:
         raise ValueError("Shape of the image data should be equal to" " shape of the labeled array")
     if index is None:
-        index = np.arange(1, np.max(labels) + 1)
+        index = np.arange(1, (label_index.labels.max() if len(label_index) else 0) + 1)
 
+    pixels = label_index.gather(image)
     roi_pix = []
-    for n in index:
-        roi_pix.append(image[labels == n])
+    for pos in label_index.positions(index):
+        if pos < 0:
+            roi_pix.append(pixels[..., :0])
+            continue
+        start = label_index.offsets[pos]
+        roi_pix.append(pixels[..., start : start + label_index.counts[pos]])
     return roi_pix, index
 
 
-def mean_intensity(images, labeled_array, index=None):
+# default amount of image data reduced at once by mean_intensity
+_MEAN_INTENSITY_CHUNK_BYTES = 2**24
+
+
+def mean_intensity(images, labeled_array, index=None, chunk_size=None):
     """Compute the mean intensity for each ROI in the image list
 
     Parameters
     ----------
-    images : list
-        List of images
-    labeled_array : array
+    images : array
+        Stack of images, e.g. a 3D array, a `np.memmap` or a list of
+        images. It is read in blocks of `chunk_size` frames
+    labeled_array : array or LabelIndex
         labeled array; 0 is background.
         Each ROI is represented by a nonzero integer. It is not required that
         the ROI labels are contiguous
     index : int, list, optional
         The ROI's to use. If None, this function will extract averages for all
         ROIs
+    chunk_size : int, optional
+        Number of frames reduced at once. The memory used is about
+        `chunk_size` frames plus their ROI pixels. Defaults to as many frames
+        as fit in 16 MiB
 
     Returns
     -------
@@ -388,30 +413,41 @@ def mean_intensity(images, labeled_array, index=None):
     index : list
         The labels for each element of the `mean_intensity` list
     """
-    if labeled_array.shape != images[0].shape[0:]:
+    label_index = _as_label_index(labeled_array)
+    if label_index.shape != images[0].shape[0:]:
         raise ValueError(
             "`images` shape (%s) needs to be equal to the labeled_array shape"
-            "(%s)" % (images[0].shape, labeled_array.shape)
+            "(%s)" % (images[0].shape, label_index.shape)
         )
     # handle various input for `index`
     if index is None:
-        index = list(np.unique(labeled_array))
-        index.remove(0)
+        index = list(label_index.labels)
     try:
         len(index)
     except TypeError:
         index = [index]
-    # pre-allocate an array for performance
-    # might be able to use list comprehension to make this faster
-    mean_intensity = np.zeros((images.shape[0], len(index)))
-    for n, img in enumerate(images):
-        # use a mean that is mask-aware
-        mean_intensity[n] = ndimage.mean(img, labeled_array, index=index)
+    if chunk_size is None:
+        frame_bytes = np.asarray(images[0]).nbytes
+        chunk_size = max(1, _MEAN_INTENSITY_CHUNK_BYTES // max(frame_bytes, 1))
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1. Got {}".format(chunk_size))
+    positions = label_index.positions(index)
+    # ROIs that are not in the labeled array have no pixels and get nan
+    mean_intensity = np.full((len(images), len(index)), np.nan)
+    found = positions >= 0
+    if not len(label_index):
+        return mean_intensity, index
+    counts = label_index.counts[positions[found]]
+    for start in range(0, len(images), chunk_size):
+        # slicing a memmap only reads this block from disk
+        block = np.asarray(images[start : start + chunk_size])
+        sums = np.add.reduceat(label_index.gather(block), label_index.offsets, axis=1, dtype=np.float64)
+        mean_intensity[start : start + len(block), found] = sums[:, positions[found]] / counts
     return mean_intensity, index
 
 
 def circular_average(
-    image, calibrated_center, threshold=0, nx=100, pixel_size=(1, 1), min_x=None, max_x=None, mask=None
+    image, calibrated_center, threshold=0, nx=100, pixel_size=(1, 1), min_x=None, max_x=None, mask=None, split=1
 ):
     """Circular average of the the image data
     The circular average is also known as the radial integration
@@ -439,6 +475,12 @@ def circular_average(
         Right edge of last bin defaults to maximum value of x
     mask : mask for 2D data. Assumes 1 is non masked and 0 masked.
         None defaults to no mask.
+    split : int, optional
+        Split each pixel into ``split x split`` sub-pixels that are binned
+        separately, so that pixels on a bin edge are shared between the
+        bins instead of going to the bin of their center. With splitting,
+        the pixel counts that are compared to `threshold` are fractional.
+        Defaults to 1, no splitting.
 
     Returns
     -------
@@ -447,24 +489,48 @@ def circular_average(
     ring_averages : array
         Radial average of the image. shape is (nx, ).
 
+    Notes
+    -----
+    The pixel-to-bin matrix of the geometry is cached, see
+    `utils.IntegrationMatrix`, so that averaging many images of the same
+    geometry costs one sparse matrix-vector product per image.
+
     See Also
     --------
     bad_to_nan_gen : Create a mask with np.nan entries
     bin_grid : Bin and integrate an image, given the radial array of pixels
         Useful for nonlinear spacing (Ewald curvature)
     """
-    radial_val = utils.radial_grid(calibrated_center, image.shape, pixel_size)
-
     if mask is not None:
-        w = np.where(mask == 1)
-        radial_val = radial_val[w]
-        image = image[w]
-
-    bin_edges, sums, counts = utils.bin_1D(np.ravel(radial_val), np.ravel(image), nx, min_x=min_x, max_x=max_x)
+        mask = np.asarray(mask) == 1
+    if min_x is None or max_x is None:
+        # the bin range is taken from the radii themselves
+        if mask is None:
+            r_range = utils.radial_range(calibrated_center, image.shape, pixel_size)
+        else:
+            # float64, as the unmasked range
+            radial_val = utils.radial_grid(calibrated_center, image.shape, pixel_size)[mask]
+            r_range = np.min(radial_val), np.max(radial_val)
+        if min_x is None:
+            min_x = r_range[0]
+        if max_x is None:
+            max_x = r_range[1]
+    if nx is None:
+        nx = int(max_x - min_x)
+
+    matrix = utils.geometry_cache.integration_matrix(
+        calibrated_center, image.shape, bins=nx, range=(min_x, max_x), pixel_size=pixel_size, split=split
+    )
+    if mask is None:
+        sums = matrix.matvec(image)
+        counts = matrix.counts
+    else:
+        sums = matrix.matvec(np.where(mask, image, 0))
+        counts = matrix.matvec(mask)
     th_mask = counts > threshold
     ring_averages = sums[th_mask] / counts[th_mask]
 
-    bin_centers = utils.bin_edges_to_centers(bin_edges)[th_mask]
+    bin_centers = matrix.bin_centers[0][th_mask]
 
     return bin_centers, ring_averages
 
@@ -478,7 +544,7 @@ def kymograph(images, labels, num):
     ----------
     images : array
         Image stack. dimensions are: (num_img, num_rows, num_cols)
-    labels : array
+    labels : array or LabelIndex
         labeled array; 0 is background. Each ROI is represented by an integer
     num : int
         The ROI to turn into a kymograph
@@ -490,11 +556,7 @@ def kymograph(images, labels, num):
         for required ROI
 
     """
-    kymo = []
-    for n, img in enumerate(images):
-        kymo.append((roi_pixel_values(img, labels == num)[0]))
-
-    return np.vstack(kymo)
+    return roi_pixel_values(np.asarray(images), labels, [num])[0][0]
 
 
 def extract_label_indices(labels):
@@ -505,7 +567,7 @@ def extract_label_indices(labels):
 
     Parameters
     ----------
-    labels : array
+    labels : array or LabelIndex
         labeled array; 0 is background.
         Each ROI is represented by a distinct label (i.e., integer).
 
@@ -520,6 +582,12 @@ def extract_label_indices(labels):
         foreground pixels (labeled nonzero)
         e.g., [5, 6, 7, 8, 14, 15, 21, 22]
     """
+    if isinstance(labels, LabelIndex):
+        # back to raster order, as for a labeled array
+        order = np.argsort(labels.pixel_list, kind="stable")
+        label_mask = np.repeat(labels.labels, labels.counts)[order]
+        return label_mask, labels.pixel_list[order].astype(np.intp)
+
     img_dim = labels.shape
 
     # TODO Make this tighter.
@@ -533,6 +601,167 @@ def extract_label_indices(labels):
     return label_mask, pixel_list
 
 
+class LabelIndex(object):
+    """Precomputed pixel lists of a labeled array
+
+    Reducing an image over the ROIs of a labeled array with
+    `scipy.ndimage` or boolean masks rescans the whole label array for
+    every image.  A `LabelIndex` is built once from
+    `extract_label_indices` and holds the foreground pixels sorted by
+    label, so that the ROI reductions in this module become a single gather
+    followed by `np.add.reduceat` over a whole stack of images.
+
+    It is also a sparse, CSR-like form of the labeled array: the pixels of
+    ``labels[i]`` are ``pixel_list[offsets[i]:offsets[i] + counts[i]]``.
+    The labels and the pixel list are stored in the smallest sufficient
+    unsigned integer type, so for ROIs covering a small part of the detector
+    it is much smaller than the labeled array, e.g. to send to worker
+    processes. The correlation, speckle and ROI functions accept it in
+    place of a labeled array.
+
+    Parameters
+    ----------
+    labels : array
+        labeled array; 0 is background.
+        Each ROI is represented by a distinct label (i.e., integer). It is
+        not required that the ROI labels are contiguous
+
+    Attributes
+    ----------
+    shape : tuple
+        The shape of the labeled array
+    labels : array
+        The sorted, distinct nonzero labels
+    pixel_list : array
+        Indices into the raveled image of all foreground pixels, grouped by
+        label and in raster order within each label
+    offsets : array
+        Start of the pixels of ``labels[i]`` in `pixel_list`
+    counts : array
+        Number of pixels of ``labels[i]``
+    """
+
+    def __init__(self, labels):
+        labels = np.asarray(labels)
+        self.shape = labels.shape
+        label_mask, pixel_list = extract_label_indices(labels)
+        label_mask = label_mask.astype(np.intp)
+        # a stable sort keeps the raster order within each ROI
+        order = np.argsort(label_mask, kind="stable")
+        self.pixel_list = pixel_list[order].astype(_min_uint_dtype(max(labels.size - 1, 0)))
+        labels, self.offsets, self.counts = np.unique(label_mask[order], return_index=True, return_counts=True)
+        self.labels = labels.astype(_min_uint_dtype(labels.max() if len(labels) else 0))
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def nbytes(self):
+        """Total bytes of the index arrays"""
+        return sum(a.nbytes for a in (self.labels, self.pixel_list, self.offsets, self.counts))
+
+    def to_array(self):
+        """Expand back into a labeled array
+
+        Returns
+        -------
+        label_array : array
+            labeled array of the smallest unsigned integer type that holds
+            the labels
+        """
+        label_array = np.zeros(int(np.prod(self.shape)), dtype=self.labels.dtype)
+        label_array[self.pixel_list] = np.repeat(self.labels, self.counts)
+        return label_array.reshape(self.shape)
+
+    def positions(self, index):
+        """Find the position of ROI labels in `labels`
+
+        Parameters
+        ----------
+        index : array_like
+            ROI labels
+
+        Returns
+        -------
+        positions : array
+            Position of each label in `labels`, -1 for the labels that
+            do not occur in the labeled array
+        """
+        index = np.asarray(index)
+        positions = np.searchsorted(self.labels, index)
+        positions[positions == len(self.labels)] = 0
+        found = len(self.labels) > 0
+        if found:
+            found = self.labels[positions] == index
+        return np.where(found, positions, -1)
+
+    def gather(self, images):
+        """Extract the foreground pixels of an image or a stack of images
+
+        Parameters
+        ----------
+        images : array
+            image, or stack of images with the shape of the labeled array as
+            the trailing dimensions
+
+        Returns
+        -------
+        pixels : array
+            Dimensions are ``images.shape[:-2] + (len(pixel_list),)``, the
+            pixels are ordered as `pixel_list`
+        """
+        images = np.asarray(images)
+        stack_shape = images.shape[: images.ndim - len(self.shape)]
+        if stack_shape + self.shape != images.shape:
+            raise ValueError(
+                "`images` shape (%s) needs to end with the labeled array shape (%s)" % (images.shape, self.shape)
+            )
+        flat = images.reshape(stack_shape + (-1,))
+        return np.take(flat, self.pixel_list, axis=-1)
+
+
+def compact_labels(labels):
+    """Store a labeled array in the smallest sufficient integer type
+
+    The ROI functions return `np.int64` labeled arrays, 8 bytes per pixel for
+    what usually are fewer than 256 labels.
+
+    Parameters
+    ----------
+    labels : array
+        labeled array; 0 is background.
+        Each ROI is represented by a distinct label (i.e., integer).
+
+    Returns
+    -------
+    label_array : array
+        `labels` as `np.uint8`, `np.uint16`, `np.uint32` or `np.uint64`
+
+    See Also
+    --------
+    LabelIndex : sparse form of a labeled array
+    """
+    labels = np.asarray(labels)
+    if labels.size and labels.min() < 0:
+        raise ValueError("Labels must be non-negative. Got {}".format(labels.min()))
+    return labels.astype(_min_uint_dtype(labels.max() if labels.size else 0), copy=False)
+
+
+def _min_uint_dtype(max_value):
+    """The smallest unsigned integer type that holds `max_value`"""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+def _as_label_index(labels):
+    """Return `labels` as a `LabelIndex`, building one if needed"""
+    if isinstance(labels, LabelIndex):
+        return labels
+    return LabelIndex(labels)
+
+
 def _make_roi(coords, edges, shape):
     """Helper function to create ring rois and bar rois
 
@@ -710,7 +939,18 @@ def lines(end_points, shape):
     return label_array
 
 
-def auto_find_center_rings(avg_img, sigma=1, no_rings=4, min_samples=3, residual_threshold=1, max_trials=1000):
+def auto_find_center_rings(
+    avg_img,
+    sigma=1,
+    no_rings=4,
+    min_samples=3,
+    residual_threshold=1,
+    max_trials=1000,
+    downsample=1,
+    time_limit=None,
+    rng=None,
+    return_timings=False,
+):
     """This will find the center of the speckle pattern and the radii of the
     most intense rings.
 
@@ -727,7 +967,22 @@ def auto_find_center_rings(avg_img, sigma=1, no_rings=4, min_samples=3, residual
     residual_threshold : float, optional
         Maximum distance for a data point to be classified as an inlier.
     max_trials : int, optional
-        Maximum number of iterations for random sample selection.
+        Maximum number of iterations for random sample selection, per ring.
+        Together with `rng` this makes the amount of work deterministic.
+    downsample : int, optional
+        If larger than 1, the rings are found on the image block-averaged by
+        this factor and then refined at full resolution in small windows
+        along each ring. `residual_threshold` applies at both resolutions.
+        Edges closer than about `downsample` pixels merge at the low
+        resolution. Defaults to 1, fitting the full resolution image.
+    time_limit : float, optional
+        Time budget in seconds. Once exceeded, no further rings are fitted
+        and the rings found so far are returned; the first ring is always
+        fitted.
+    rng : int or numpy.random.Generator, optional
+        Seed or generator for the random sample selection of RANSAC.
+    return_timings : bool, optional
+        If True, also return the time spent in each stage.
 
     Returns
     -------
@@ -738,6 +993,10 @@ def auto_find_center_rings(avg_img, sigma=1, no_rings=4, min_samples=3, residual
         directly index into an array
     radii : list
         values of the radii of the rings
+    timings : dict
+        Seconds spent finding the edges (``"edges"``), fitting the rings
+        (``"fit"``), refining them at full resolution (``"refine"``) and in
+        total (``"total"``). Only returned if `return_timings` is True.
 
     Notes
     -----
@@ -745,6 +1004,11 @@ def auto_find_center_rings(avg_img, sigma=1, no_rings=4, min_samples=3, residual
     method(http://www.imagexd.org/tutorial/lessons/1_ransac.html) is used to
     automatically find the center and the most intense rings.
     """
+    start_time = time.perf_counter()
+    deadline = None if time_limit is None else start_time + time_limit
+    if downsample < 1:
+        raise ValueError("downsample must be at least 1. Got {}".format(downsample))
+    rng = np.random.default_rng(rng)
 
     if avg_img.ndim == 3:
         image_tmp = color.rgb2gray(avg_img)
@@ -752,21 +1016,128 @@ def auto_find_center_rings(avg_img, sigma=1, no_rings=4, min_samples=3, residual
         image_tmp = avg_img
     image = img_as_float(image_tmp, force_copy=True)
 
-    edges = feature.canny(image, sigma)
+    coarse = image
+    if downsample > 1:
+        rows, cols = (n - n % downsample for n in image.shape)
+        coarse = transform.downscale_local_mean(image[:rows, :cols], (downsample, downsample))
+    edges = feature.canny(coarse, sigma / downsample)
     coords = np.column_stack(np.nonzero(edges))
     edge_pts_xy = coords[:, ::-1]
-    radii = []
+    edges_time = time.perf_counter()
 
+    circles = []
     for i in range(no_rings):
+        if i and deadline is not None and time.perf_counter() > deadline:
+            logger.warning("auto_find_center_rings ran out of time after %d of %d rings", i, no_rings)
+            break
         model_robust, inliers = ransac(
-            edge_pts_xy, CircleModel, min_samples, residual_threshold, max_trials=max_trials
+            edge_pts_xy, CircleModel, min_samples, residual_threshold, max_trials=max_trials, rng=rng
         )
+        circles.append(model_robust.params)
+        edge_pts_xy = edge_pts_xy[~inliers]
+    fit_time = time.perf_counter()
+
+    if downsample > 1:
+        refined = []
+        for i, (xc, yc, radius) in enumerate(circles):
+            if i and deadline is not None and time.perf_counter() > deadline:
+                logger.warning("auto_find_center_rings ran out of time refining the rings")
+                break
+            # the center of coarse pixel j is at full resolution j * f + (f - 1) / 2
+            coarse_params = (np.array([xc, yc]) + 0.5) * downsample - 0.5
+            refined.append(
+                _refine_ring(
+                    image,
+                    (coarse_params[0], coarse_params[1], radius * downsample),
+                    sigma,
+                    (residual_threshold + 1) * downsample,
+                    residual_threshold,
+                )
+            )
+        circles = refined
+    refine_time = time.perf_counter()
+
+    radii = []
+    for i, params in enumerate(circles):
         if i == 0:
-            center = int(model_robust.params[0]), int(model_robust.params[1])
-        radii.append(model_robust.params[2])
+            center = int(params[0]), int(params[1])
+        radii.append(params[2])
 
-        rr, cc = draw.circle_perimeter(center[1], center[0], int(model_robust.params[2]), shape=image.shape)
+        rr, cc = draw.circle_perimeter(center[1], center[0], int(params[2]), shape=image.shape)
         image[rr, cc] = i + 1
-        edge_pts_xy = edge_pts_xy[~inliers]
 
+    timings = {
+        "edges": edges_time - start_time,
+        "fit": fit_time - edges_time,
+        "refine": refine_time - fit_time,
+        "total": time.perf_counter() - start_time,
+    }
+    logger.info("auto_find_center_rings timings (s): %s", timings)
+    if return_timings:
+        return center, image, radii, timings
     return center, image, radii
+
+
+# number of windows along a ring in which auto_find_center_rings refines it
+_REFINE_WINDOWS = 16
+# number of outlier trimming rounds of the refinement
+_REFINE_ITERATIONS = 5
+
+
+def _refine_ring(image, params, sigma, band, residual_threshold):
+    """Refit a circle to the full resolution edges close to it
+
+    Edges are only detected in `_REFINE_WINDOWS` windows centered on the
+    circle, which is far cheaper than edge detection of the whole image.
+
+    Parameters
+    ----------
+    image : 2D array
+        full resolution image
+    params : tuple
+        (xc, yc, radius) of the circle found at low resolution
+    sigma : float
+        Standard deviation of the Gaussian filter of the edge detection
+    band : float
+        Only edges closer than this to the circle are used
+    residual_threshold : float
+        Maximum distance for an edge to be kept in the fit
+
+    Returns
+    -------
+    params : tuple
+        the refined (xc, yc, radius), or `params` if the edges close to the
+        circle do not determine one
+    """
+    xc, yc, radius = params
+    # margin for the Gaussian filter at the border of the windows
+    pad = max(int(np.ceil(4 * sigma)), 1)
+    half = int(np.ceil(band)) + pad
+    points = []
+    for angle in np.linspace(0, 2 * np.pi, _REFINE_WINDOWS, endpoint=False):
+        x0 = int(round(xc + radius * np.cos(angle)))
+        y0 = int(round(yc + radius * np.sin(angle)))
+        r0, r1 = max(y0 - half, 0), min(y0 + half + 1, image.shape[0])
+        c0, c1 = max(x0 - half, 0), min(x0 + half + 1, image.shape[1])
+        if r1 - r0 <= 2 * pad or c1 - c0 <= 2 * pad:
+            continue
+        edges = feature.canny(image[r0:r1, c0:c1], sigma)
+        # the edges within `pad` of a window border are artifacts
+        edges[:pad] = edges[-pad:] = False
+        edges[:, :pad] = edges[:, -pad:] = False
+        yy, xx = np.nonzero(edges)
+        points.append(np.column_stack([xx + c0, yy + r0]))
+    points = np.concatenate(points) if points else np.zeros((0, 2))
+    points = points[np.abs(np.hypot(points[:, 0] - xc, points[:, 1] - yc) - radius) < band]
+
+    # the edges in the band belong to the ring, so a least squares fit
+    # trimmed of the outliers replaces the random sampling
+    model = CircleModel()
+    for _ in range(_REFINE_ITERATIONS):
+        if len(points) < 3 or not model.estimate(points):
+            return params
+        inliers = np.abs(model.residuals(points)) < residual_threshold
+        if inliers.all():
+            break
+        points = points[inliers]
+    return tuple(model.params)
@@ -48,7 +48,7 @@ from __future__ import absolute_import, division, print_function
 
 import logging
 import time
-import warnings
+from collections import namedtuple
 
 import numpy as np
 
@@ -58,7 +58,7 @@ from .utils import bin_edges_to_centers, geometric_series
 logger = logging.getLogger(__name__)
 
 
-def xsvs(image_sets, label_array, number_of_img, timebin_num=2, max_cts=None):
+def xsvs(image_sets, label_array, number_of_img, timebin_num=2, max_cts=None, dtype=np.float64):
     """
     This function will provide the probability density of detecting photons
     for different integration times.
@@ -88,6 +88,10 @@ def xsvs(image_sets, label_array, number_of_img, timebin_num=2, max_cts=None):
        the brightest pixel in any ROI in any image in the image set.
        defaults to using skbeam.core.roi.roi_max_counts to determine
        the brightest pixel in any of the ROIs
+    dtype : dtype, optional
+        data type of the buffered images, defaults to np.float64. An
+        unsigned integer type, e.g. np.uint16, selects the faster integer
+        path for photon counting detectors, see `lazy_xsvs`
 
     Returns
     -------
@@ -114,16 +118,17 @@ def xsvs(image_sets, label_array, number_of_img, timebin_num=2, max_cts=None):
     It will demonstrate the use of these functions in this module for
     experimental data.
 
+    See Also
+    --------
+    lazy_xsvs : generator implementation for a single set of images
+
     """
     if max_cts is None:
         max_cts = roi.roi_max_counts(image_sets, label_array)
 
-    # find the label's and pixel indices for ROI's
-    labels, indices = roi.extract_label_indices(label_array)
-
-    # number of ROI's
-    u_labels = list(np.unique(labels))
-    num_roi = len(u_labels)
+    # find the ROI of each pixel once for all the image sets
+    layout = _xsvs_layout(label_array)
+    num_roi = layout[2]
 
     # create integration times
     time_bin = geometric_series(timebin_num, number_of_img)
@@ -140,87 +145,13 @@ def xsvs(image_sets, label_array, number_of_img, timebin_num=2, max_cts=None):
     # standard deviation of probability density of detecting photons
     prob_k_std_dev = np.zeros_like(prob_k_all)
 
-    # get the bin edges for each time bin for each ROI
-    bin_edges = np.zeros(prob_k_all.shape[0], dtype=prob_k_all.dtype)
-    for i in range(num_times):
-        bin_edges[i] = np.arange(max_cts * 2**i)
-
     start_time = time.time()  # used to log the computation time (optionally)
 
     for i, images in enumerate(image_sets):
-        # Ring buffer, a buffer with periodic boundary conditions.
-        # Images must be keep for up to maximum delay in buf.
-        buf = np.zeros([num_times, timebin_num], dtype=np.object_)  # matrix of buffers
-
-        # to track processing each time level
-        track_level = np.zeros(num_times)
-
-        # to track bad images in each time level
-        track_bad = np.zeros(num_times)
-        #  bad images, represented as an array filled with np.nan
-        # (using bad_to_nan function in mask.py all the bad
-        # images are converted into np.nan arrays)
-
-        # to increment buffer
-        cur = np.full(num_times, timebin_num)
-
-        # to track how many images processed in each level
-        img_per_level = np.zeros(num_times, dtype=np.int64)
-
-        prob_k = np.zeros_like(prob_k_all)
-        prob_k_pow = np.zeros_like(prob_k_all)
-
-        for n, img in enumerate(images):
-            cur[0] = (1 + cur[0]) % timebin_num
-            # read each frame
-            # Put the image into the ring buffer.
-            buf[0, cur[0] - 1] = (np.ravel(img))[indices]
-
-            _process(
-                num_roi,
-                0,
-                cur[0] - 1,
-                buf,
-                img_per_level,
-                labels,
-                max_cts,
-                bin_edges[0],
-                prob_k,
-                prob_k_pow,
-                track_bad,
-            )
-
-            # check whether the number of levels is one, otherwise
-            # continue processing the next level
-            level = 1
-
-            while level < num_times:
-                if not track_level[level]:
-                    track_level[level] = 1
-                else:
-                    prev = 1 + (cur[level - 1] - 2) % timebin_num
-                    cur[level] = 1 + cur[level] % timebin_num
-
-                    buf[level, cur[level] - 1] = buf[level - 1, prev - 1] + buf[level - 1, cur[level - 1] - 1]
-                    track_level[level] = 0
-
-                    _process(
-                        num_roi,
-                        level,
-                        cur[level] - 1,
-                        buf,
-                        img_per_level,
-                        labels,
-                        max_cts,
-                        bin_edges[level],
-                        prob_k,
-                        prob_k_pow,
-                        track_bad,
-                    )
-                    level += 1
-
-            prob_k_all += (prob_k - prob_k_all) / (i + 1)
-            prob_k_pow_all += (prob_k_pow - prob_k_pow_all) / (i + 1)
+        state = _init_state_xsvs(layout, number_of_img, max_cts, timebin_num, dtype=dtype)
+        for state in _xsvs_gen(images, timebin_num, state):
+            prob_k_all += (state.prob_k - prob_k_all) / (i + 1)
+            prob_k_pow_all += (state.prob_k_pow - prob_k_pow_all) / (i + 1)
 
     prob_k_std_dev = np.power((prob_k_pow_all - np.power(prob_k_all, 2)), 0.5)
 
@@ -228,8 +159,303 @@ def xsvs(image_sets, label_array, number_of_img, timebin_num=2, max_cts=None):
     return prob_k_all, prob_k_std_dev
 
 
+xsvs_results = namedtuple("xsvs_results", ["prob_k", "prob_k_std_dev", "internal_state"])
+
+_xsvs_internal_state = namedtuple(
+    "xsvs_state",
+    [
+        "buf",
+        "prob_k",
+        "prob_k_pow",
+        "img_per_level",
+        "track_level",
+        "track_bad",
+        "cur",
+        "roi_index",
+        "pixel_list",
+        "bin_edges",
+        "max_cts",
+        "buf_bad",
+    ],
+)
+
+
+def _xsvs_layout(label_array):
+    """Find the ROI of every pixel of the ROIs
+
+    Returns
+    -------
+    roi_index : array
+        the ROI of each pixel, counted from 0, so that all the ROIs are
+        histogrammed in one pass
+    pixel_list : array
+        indices into the raveled image of the pixels of the ROIs
+    num_roi : int
+        number of ROI's
+    """
+    labels, pixel_list = roi.extract_label_indices(label_array)
+    u_labels = np.unique(labels)
+    return np.searchsorted(u_labels, labels), pixel_list, len(u_labels)
+
+
+def _init_state_xsvs(layout, number_of_img, max_cts, timebin_num, dtype=np.float64):
+    """Initialize a stateful namedtuple for `lazy_xsvs`
+
+    Parameters
+    ----------
+    layout : tuple
+        the ROI layout of the pixels returned by `_xsvs_layout`
+    number_of_img : int
+    max_cts : int
+    timebin_num : int
+    dtype : dtype, optional
+        floating point or unsigned integer data type of the ring buffer
+
+    Returns
+    -------
+    internal_state : namedtuple
+        The namedtuple that contains all the state information that
+        `lazy_xsvs` requires so that it can be used to pick up processing
+        after it was interrupted
+    """
+    roi_index, pixel_list, num_roi = layout
+
+    # number of integration times
+    num_times = len(geometric_series(timebin_num, number_of_img))
+
+    dtype = np.dtype(dtype)
+    if dtype.kind == "u":
+        # the counts are capped at max_cts * 2**(num_times - 1), see
+        # _xsvs_gen, and summed in pairs
+        if max_cts * 2**num_times > np.iinfo(dtype).max:
+            raise ValueError(
+                "max_cts * 2**{} = {} does not fit into {}, use a wider integer type".format(
+                    num_times, max_cts * 2**num_times, dtype
+                )
+            )
+    elif dtype.kind != "f":
+        raise ValueError("dtype must be a floating point or an unsigned integer type. Got {}".format(dtype))
+
+    # probability density of detecting photons and its square
+    prob_k = np.zeros([num_times, num_roi], dtype=np.object_)
+    prob_k_pow = np.zeros_like(prob_k)
+
+    # get the bin edges for each time bin for each ROI
+    bin_edges = np.zeros(num_times, dtype=np.object_)
+    for i in range(num_times):
+        bin_edges[i] = np.arange(max_cts * 2**i)
+
+    # Ring buffer, a buffer with periodic boundary conditions.
+    # Images must be keep for up to maximum delay in buf.
+    buf = np.zeros((num_times, timebin_num, len(pixel_list)), dtype=dtype)
+    # bad images in the ring buffer
+    buf_bad = np.zeros((num_times, timebin_num), dtype=bool)
+
+    # to track how many images processed in each level
+    img_per_level = np.zeros(num_times, dtype=np.int64)
+
+    # to track processing each time level
+    track_level = np.zeros(num_times)
+
+    # to track bad images in each time level
+    #  bad images, represented as an array filled with np.nan
+    # (using bad_to_nan function in mask.py all the bad
+    # images are converted into np.nan arrays)
+    track_bad = np.zeros(num_times)
+
+    # to increment buffer
+    cur = np.full(num_times, timebin_num)
+
+    return _xsvs_internal_state(
+        buf,
+        prob_k,
+        prob_k_pow,
+        img_per_level,
+        track_level,
+        track_bad,
+        cur,
+        roi_index,
+        pixel_list,
+        bin_edges,
+        max_cts,
+        buf_bad,
+    )
+
+
+def lazy_xsvs(
+    image_iterable,
+    label_array,
+    number_of_img,
+    max_cts,
+    timebin_num=2,
+    internal_state=None,
+    dtype=np.float64,
+    bad_images=None,
+):
+    """Generator implementation of XSVS
+
+    The probability density of detecting photons is updated with every
+    image and yielded, so that the speckle statistics can be followed while
+    the images are acquired. Only the ring buffer of the summed images of
+    the integration times is kept in memory.
+
+    Parameters
+    ----------
+    image_iterable : iterable of 2D arrays
+        the images, bad images are represented as arrays filled with np.nan
+    label_array : array
+        labeled array; 0 is background.
+        Each ROI is represented by a distinct label (i.e., integer).
+    number_of_img : int
+        number of images (how far to go with integration times when finding
+        the time_bin, using skbeam.utils.geometric function)
+    max_cts : int
+        the brightest pixel in any ROI in any image. Pixel values outside of
+        ``[0, max_cts * 2**level - 1]`` are not histogrammed
+    timebin_num : int, optional
+        integration time; default is 2
+    internal_state : namedtuple, optional
+        internal_state is a bucket for all of the internal state of the
+        generator. It is part of the `xsvs_results` object that is yielded
+        from this generator
+    dtype : dtype, optional
+        data type of the buffered images, defaults to np.float64. Ignored
+        when resuming from `internal_state`. With an unsigned integer type,
+        e.g. np.uint16 or np.uint32, the images must hold non-negative
+        integer counts. They are buffered and histogrammed as integers,
+        and bad images can only be marked through `bad_images`
+    bad_images : list of int, optional
+        indices into `image_iterable` of the bad images. With a floating
+        point `dtype`, images that contain np.nan are bad as well
+
+    Yields
+    ------
+    namedtuple
+        A `xsvs_results` object is yielded after every image has been
+        processed. It contains, in this order:
+
+        - `prob_k`: probability density of detecting photons, shape
+          (number of integration times, number of ROI's) of arrays
+        - `prob_k_std_dev`: standard deviation of `prob_k`
+        - `internal_state`: all of the internal state. Can be passed back in
+          to `lazy_xsvs` as the `internal_state` parameter
+
+        `prob_k` is part of the internal state and is updated in place when
+        the following images are processed.
+
+    See Also
+    --------
+    xsvs : the XSVS of several sets of images
+    """
+    if internal_state is None:
+        internal_state = _init_state_xsvs(
+            _xsvs_layout(label_array), number_of_img, max_cts, timebin_num, dtype=dtype
+        )
+    for s in _xsvs_gen(image_iterable, timebin_num, internal_state, bad_images):
+        # rounding may make the variance slightly negative
+        with np.errstate(invalid="ignore"):
+            prob_k_std_dev = np.power((s.prob_k_pow - np.power(s.prob_k, 2)), 0.5)
+        yield xsvs_results(s.prob_k, prob_k_std_dev, s)
+
+
+def _xsvs_gen(image_iterable, timebin_num, internal_state, bad_images=None):
+    """Process the images of `lazy_xsvs` and yield the internal state
+    after every image"""
+    # create a shorthand reference to the results and state named tuple
+    s = internal_state
+    num_times, num_roi = s.prob_k.shape
+    buf, buf_bad, cur, track_level = s.buf, s.buf_bad, s.cur, s.track_level
+    bad_images = set() if bad_images is None else set(bad_images)
+    integer = buf.dtype.kind == "u"
+    # counts from this one on are out of the range of the bins of every
+    # integration time, and so are all their sums. Capping them keeps the
+    # integer sums from overflowing
+    max_count = s.max_cts * 2 ** (num_times - 1)
+
+    for n, img in enumerate(image_iterable):
+        cur[0] = (1 + cur[0]) % timebin_num
+        # read each frame
+        # Put the image into the ring buffer.
+        buf_no = cur[0] - 1
+        if n in bad_images:
+            buf_bad[0, buf_no] = True
+        elif integer:
+            counts = (np.ravel(img))[s.pixel_list]
+            if counts.dtype.kind != "u" and not counts.min() >= 0:
+                raise ValueError("The integer path needs non-negative counts, mark bad images through bad_images")
+            np.minimum(counts, max_count, out=buf[0, buf_no], casting="unsafe")
+            buf_bad[0, buf_no] = False
+        else:
+            buf[0, buf_no] = (np.ravel(img))[s.pixel_list]
+            #  bad images, represented as an array filled with np.nan
+            # (using bad_to_nan function in mask.py all the bad
+            # images are converted into np.nan arrays)
+            buf_bad[0, buf_no] = np.isnan(buf[0, buf_no]).any()
+
+        _process(
+            num_roi,
+            0,
+            buf_no,
+            buf,
+            s.img_per_level,
+            s.roi_index,
+            s.max_cts,
+            s.bin_edges[0],
+            s.prob_k,
+            s.prob_k_pow,
+            s.track_bad,
+            buf_bad,
+        )
+
+        # check whether the number of levels is one, otherwise
+        # continue processing the next level
+        level = 1
+
+        while level < num_times:
+            if not track_level[level]:
+                track_level[level] = 1
+            else:
+                prev = 1 + (cur[level - 1] - 2) % timebin_num
+                cur[level] = 1 + cur[level] % timebin_num
+
+                buf_no = cur[level] - 1
+                np.add(buf[level - 1, prev - 1], buf[level - 1, cur[level - 1] - 1], out=buf[level, buf_no])
+                if integer:
+                    np.minimum(buf[level, buf_no], max_count, out=buf[level, buf_no])
+                buf_bad[level, buf_no] = buf_bad[level - 1, prev - 1] | buf_bad[level - 1, cur[level - 1] - 1]
+                track_level[level] = 0
+
+                _process(
+                    num_roi,
+                    level,
+                    buf_no,
+                    buf,
+                    s.img_per_level,
+                    s.roi_index,
+                    s.max_cts,
+                    s.bin_edges[level],
+                    s.prob_k,
+                    s.prob_k_pow,
+                    s.track_bad,
+                    buf_bad,
+                )
+                level += 1
+        yield s
+
+
 def _process(
-    num_roi, level, buf_no, buf, img_per_level, labels, max_cts, bin_edges, prob_k, prob_k_pow, track_bad
+    num_roi,
+    level,
+    buf_no,
+    buf,
+    img_per_level,
+    roi_index,
+    max_cts,
+    bin_edges,
+    prob_k,
+    prob_k_pow,
+    track_bad,
+    buf_bad,
 ):
     """
     Internal helper function. This modifies inputs in place.
@@ -251,8 +477,8 @@ def _process(
         image data array to use for XSVS
     img_per_level : int
         to track how many images processed in each level
-    labels : array
-        labels of the required region of interests(ROI's)
+    roi_index : array
+        the ROI of each pixel in `buf`, counted from 0
     max_cts: int
         maximum pixel count
     bin_edges : array
@@ -263,31 +489,66 @@ def _process(
         squares of probability density of detecting photons
     track_bad : array
         to track bad images in each level
+    buf_bad : array
+        True for the bad images in `buf`
     """
     img_per_level[level] += 1
-    u_labels = list(np.unique(labels))
 
-    #  Check if there are any bad images, represented as an array filled
-    #  with np.nan (using bad_to_nan function in mask.py all the bad
-    # images are converted into np.nan arrays)
-    if np.isnan(buf[level, buf_no]).any():
+    if buf_bad[level, buf_no]:
         track_bad[level] += 1
         return
 
-    for j, label in enumerate(u_labels):
-        roi_data = buf[level, buf_no][labels == label]
-        with warnings.catch_warnings():
-            # It appears that having nans in ``roi_data`` and ``spe_hist`` is normal mode of
-            #   operation for this function. So let's disable warnings.
-            warnings.filterwarnings("ignore", category=RuntimeWarning)
-            spe_hist, bin_edges = np.histogram(roi_data, bins=bin_edges, density=True)
-        spe_hist = np.nan_to_num(spe_hist)
-        prob_k[level, j] += (spe_hist - prob_k[level, j]) / (img_per_level[level] - track_bad[level])
-        prob_k_pow[level, j] += (np.power(spe_hist, 2) - prob_k_pow[level, j]) / (
+    spe_hist = _roi_histograms(buf[level, buf_no], roi_index, num_roi, bin_edges)
+    for j in range(num_roi):
+        prob_k[level, j] += (spe_hist[j] - prob_k[level, j]) / (img_per_level[level] - track_bad[level])
+        prob_k_pow[level, j] += (np.power(spe_hist[j], 2) - prob_k_pow[level, j]) / (
             img_per_level[level] - track_bad[level]
         )
 
 
+def _roi_histograms(data, roi_index, num_roi, bin_edges):
+    """
+    Histogram the pixel values of all the ROIs in one pass
+
+    Parameters
+    ----------
+    data : array
+        pixel values
+    roi_index : array
+        the ROI of each pixel, counted from 0
+    num_roi : int
+        number of ROI's
+    bin_edges : array
+        the unit width bins ``np.arange(num_bins + 1)``
+
+    Returns
+    -------
+    spe_hist : array
+        shape (num_roi, num_bins). The same as
+        ``np.histogram(data[roi_index == j], bins=bin_edges, density=True)``
+        for every ROI j, with 0 instead of np.nan for the ROIs without any
+        pixel value in the range of the bins
+    """
+    num_bins = len(bin_edges) - 1
+    if data.dtype.kind == "u":
+        # like np.histogram, the last bin includes its right edge. The
+        # larger counts go to an extra overflow bin
+        width = num_bins + 2
+        counts_index = roi_index * width + np.minimum(data, num_bins + 1)
+        spe_hist = np.bincount(counts_index, minlength=num_roi * width).reshape(num_roi, width)
+        spe_hist[:, num_bins - 1] += spe_hist[:, num_bins]
+        spe_hist = spe_hist[:, :num_bins]
+    else:
+        # like np.histogram, the last bin includes its right edge
+        in_range = (data >= 0) & (data <= num_bins)
+        counts_index = np.minimum(data[in_range].astype(np.intp), num_bins - 1)
+        counts_index += roi_index[in_range] * num_bins
+        spe_hist = np.bincount(counts_index, minlength=num_roi * num_bins).reshape(num_roi, num_bins)
+    total = spe_hist.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nan_to_num(spe_hist / total)
+
+
 def normalize_bin_edges(num_times, num_rois, mean_roi, max_cts):
     """
     This will provide the normalized bin edges and bin centers for each
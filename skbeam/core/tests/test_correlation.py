@@ -34,25 +34,33 @@
 ########################################################################
 from __future__ import absolute_import, division, print_function
 
+import copy
 import logging
+import os
+import warnings
 
 import numpy as np
 import pytest
-from numpy.testing import assert_array_almost_equal, assert_equal
+from numpy.testing import assert_array_almost_equal, assert_array_equal, assert_equal
+from scipy import fft as sp_fft
 
+import skbeam.core.correlation as corr
 import skbeam.core.utils as utils
 from skbeam.core.correlation import (
     CrossCorrelator,
+    TriangularTwoTime,
     auto_corr_scat_factor,
     lazy_one_time,
+    lazy_one_time_sparse,
     lazy_two_time,
+    lazy_two_time_sparse,
     multi_tau_auto_corr,
     one_time_from_two_time,
     two_time_corr,
     two_time_state_to_results,
 )
 from skbeam.core.mask import bad_to_nan_gen
-from skbeam.core.roi import ring_edges, segmented_rings
+from skbeam.core.roi import LabelIndex, compact_labels, ring_edges, segmented_rings
 
 logger = logging.getLogger(__name__)
 
@@ -166,6 +174,177 @@ def test_lazy_one_time():
     assert np.all(full_result.g2 == second_half_result.g2)
 
 
+def test_two_time_storage(tmpdir):
+    setup()
+    images = img_stack[:40]
+    expected = two_time_corr(rois, images, 40, num_bufs, 3)
+
+    g2_file = os.path.join(tmpdir, "g2.npy")
+    on_disk = two_time_corr(rois, images, 40, num_bufs, 3, g2_file=g2_file)
+    assert isinstance(on_disk.g2, np.memmap)
+    assert_equal(on_disk.g2, expected.g2)
+    assert_equal(np.load(g2_file).transpose(2, 0, 1), expected.g2)
+
+    triangle = two_time_corr(rois, images, 40, num_bufs, 3, triangular=True)
+    assert isinstance(triangle.g2, TriangularTwoTime)
+    assert triangle.g2.shape == expected.g2.shape
+    assert_equal(np.asarray(triangle.g2), expected.g2)
+    assert_equal(triangle.g2[1], expected.g2[1])
+    assert_equal(triangle.g2[:, 5, 30], expected.g2[:, 5, 30])
+    # slices and arrays on the frame axes follow numpy's rules
+    index = np.array([[3, 0], [39, 7]])
+    for key in [
+        (0, slice(None), 3),
+        (0, slice(2, 5), slice(2, 5)),
+        (slice(None), slice(30, 3, -4), -1),
+        (1, slice(None, 10), index),
+        (slice(1, None), index, slice(5, 9)),
+        (slice(None), 5, index),
+    ]:
+        assert_equal(triangle.g2[key], expected.g2[key])
+    assert_equal(triangle.g2.diagonal(-4), np.array([np.diagonal(g, -4) for g in expected.g2]))
+
+    triangle_file = os.path.join(tmpdir, "g2_triangle.npy")
+    two_time_corr(rois, images, 40, num_bufs, 3, g2_file=triangle_file, triangular=True)
+    assert_equal(np.asarray(TriangularTwoTime.load(triangle_file)), expected.g2)
+
+    with pytest.raises(IndexError):
+        triangle.g2[:, 40, 0] = 1
+
+
+def _interrupted(gen, path, every, stop):
+    """Run a checkpointed generator that crashes after `stop` images"""
+    for n, _ in enumerate(corr.checkpoint_gen(gen, path, every=every), 1):
+        if n == stop:
+            break
+
+
+def test_compact_labels():
+    rs = np.random.RandomState(11)
+    images = rs.poisson(4, (30, 20, 30)).astype(float)
+    labels = segmented_rings(ring_edges(2, 3, 1, num_rings=2), 3, (10, 14), (20, 30))
+
+    g2, lag_steps = corr.multi_tau_auto_corr(3, 4, labels, images)
+    g2_two = corr.two_time_corr(labels, images, 30, 4, 2).g2
+    for compact in (compact_labels(labels), LabelIndex(labels)):
+        assert_array_equal(corr.multi_tau_auto_corr(3, 4, compact, images)[0], g2)
+        assert_array_equal(corr.two_time_corr(compact, images, 30, 4, 2).g2, g2_two)
+
+
+@pytest.mark.parametrize("num_levels, num_bufs", [(1, 8), (3, 4), (4, 6)])
+def test_merge_one_time(num_levels, num_bufs):
+    setup()
+    images = np.random.poisson(1, (100,) + rois.shape).astype(float)
+    images[[3, 31, 32, 64, 97]] = np.nan
+    for full in lazy_one_time(images, num_levels, num_bufs, rois):
+        pass
+
+    step = 2 ** (num_levels - 1)
+    bounds = [0, 3 * step, 5 * step, 13 * step, 100]
+    partials = [
+        corr.partial_one_time(images[start:stop], num_levels, num_bufs, rois)
+        for start, stop in zip(bounds[:-1], bounds[1:])
+    ]
+    merged = corr.merge_one_time(partials)
+    result = corr.one_time_state_to_results(merged.internal_state)
+    assert_array_almost_equal(result.g2, full.g2, decimal=12)
+    assert_equal(result.lag_steps, full.lag_steps)
+    assert merged.internal_state.norm == full.internal_state.norm
+    for name in ("img_per_level", "cur", "track_level"):
+        assert_equal(getattr(merged.internal_state, name), getattr(full.internal_state, name))
+
+    # the merged state can be resumed
+    more = np.random.poisson(1, (20,) + rois.shape).astype(float)
+    for resumed in lazy_one_time(more, num_levels, num_bufs, rois, internal_state=merged.internal_state):
+        pass
+    for expected in lazy_one_time(more, num_levels, num_bufs, rois, internal_state=full.internal_state):
+        pass
+    assert_array_almost_equal(resumed.g2, expected.g2, decimal=12)
+
+    if num_levels > 1:
+        with pytest.raises(ValueError):
+            # the first chunk does not end on whole downsampled images
+            short = corr.partial_one_time(images[:3], num_levels, num_bufs, rois)
+            corr.merge_one_time([short, partials[1]])
+
+
+def test_multi_tau_auto_corr_parallel(tmpdir):
+    setup()
+    images = img_stack[:50]
+    g2, lag_steps = multi_tau_auto_corr(num_levels, num_bufs, rois, images)
+    g2_parallel, lag_steps_parallel = corr.multi_tau_auto_corr_parallel(
+        num_levels, num_bufs, rois, images, processes=3
+    )
+    assert_array_almost_equal(g2_parallel, g2, decimal=12)
+    assert_equal(lag_steps_parallel, lag_steps)
+
+    # the workers read their frames of a memmapped file themselves, slices
+    # of the memmap are sent to them
+    filename = os.path.join(tmpdir, "images.npy")
+    np.save(filename, images)
+    on_disk = np.load(filename, mmap_mode="r")
+    for stack, expected in (
+        (on_disk, g2),
+        (on_disk[10:], multi_tau_auto_corr(num_levels, num_bufs, rois, images[10:])[0]),
+    ):
+        g2_parallel, _ = corr.multi_tau_auto_corr_parallel(num_levels, num_bufs, rois, stack, processes=3)
+        assert_array_almost_equal(g2_parallel, expected, decimal=12)
+
+    with pytest.raises(ValueError):
+        corr.multi_tau_auto_corr_parallel(num_levels, num_bufs, rois, images[:0])
+
+
+def test_checkpoint_one_time(tmpdir):
+    setup()
+    images = np.random.poisson(1, (60,) + rois.shape).astype(float)
+    path = os.path.join(tmpdir, "state")
+    for full in lazy_one_time(images, num_levels, num_bufs, rois):
+        pass
+
+    _interrupted(lazy_one_time(images, num_levels, num_bufs, rois), path, 10, 25)
+    for mmap_mode in (None, "c"):
+        state = corr.load_state(path, mmap_mode=mmap_mode)
+        assert_equal(state.img_per_level[0], 20)
+        for resumed in lazy_one_time(images[20:], num_levels, num_bufs, rois, internal_state=state):
+            pass
+        assert_equal(resumed.g2, full.g2)
+        assert resumed.internal_state.norm == full.internal_state.norm
+
+    # the state is also written when the generator is exhausted
+    for result in corr.checkpoint_gen(lazy_one_time(images, num_levels, num_bufs, rois), path, every=25):
+        pass
+    assert_equal(corr.load_state(path).G, full.internal_state.G)
+
+    events = _to_events(images)
+    for full in lazy_one_time_sparse(events, num_levels, num_bufs, rois):
+        pass
+    _interrupted(lazy_one_time_sparse(events, num_levels, num_bufs, rois), path, 8, 30)
+    state = corr.load_state(path)
+    for resumed in lazy_one_time_sparse(events[24:], num_levels, num_bufs, rois, internal_state=state):
+        pass
+    assert_equal(resumed.g2, full.g2)
+
+    with pytest.raises(ValueError):
+        corr.save_state(full, path)
+
+
+@pytest.mark.parametrize("storage", [{}, {"g2_file": "g2.npy"}, {"triangular": True}])
+def test_checkpoint_two_time(tmpdir, storage):
+    setup()
+    images = img_stack[:40]
+    if "g2_file" in storage:
+        storage = {"g2_file": os.path.join(tmpdir, storage["g2_file"])}
+    expected = two_time_corr(rois, images, 40, num_bufs, 3)
+    path = os.path.join(tmpdir, "state")
+
+    _interrupted(lazy_two_time(rois, images, 40, num_bufs, 3, **storage), path, 6, 15)
+    state = corr.load_state(path)
+    assert_equal(state.current_img_time, 12)
+    for resumed in lazy_two_time(rois, images[12:], 40, num_bufs, 3, two_time_internal_state=state):
+        pass
+    assert_equal(np.asarray(two_time_state_to_results(resumed).g2), expected.g2)
+
+
 def test_two_time_corr():
     setup()
     y = []
@@ -206,6 +385,105 @@ def test_bad_images():
     assert_array_almost_equal(g2[:, 1], g2_n[:, 1], decimal=3)
 
 
+def test_one_time_engines():
+    setup()
+    bad_img_list = [3, 21, 35, 48]
+    for images in (img_stack, list(bad_to_nan_gen(img_stack, bad_img_list))):
+        for ref_result in lazy_one_time(images, num_levels, num_bufs, rois, engine="reference"):
+            pass
+        for vec_result in lazy_one_time(images, num_levels, num_bufs, rois, engine="vectorized"):
+            pass
+        assert_equal(vec_result.g2, ref_result.g2)
+        assert_equal(vec_result.lag_steps, ref_result.lag_steps)
+        for name in ("G", "past_intensity", "future_intensity", "img_per_level"):
+            assert_equal(getattr(vec_result.internal_state, name), getattr(ref_result.internal_state, name))
+        assert vec_result.internal_state.norm == ref_result.internal_state.norm
+
+        # a state of one engine can be resumed with another
+        for first in lazy_one_time(images[:23], num_levels, num_bufs, rois, engine="reference"):
+            pass
+        for engine in ("vectorized", "compiled"):
+            state = copy.deepcopy(first.internal_state)
+            for resumed in lazy_one_time(
+                images[23:], num_levels, num_bufs, rois, internal_state=state, engine=engine
+            ):
+                pass
+            assert_array_almost_equal(resumed.g2, ref_result.g2, decimal=12)
+
+    with pytest.raises(ValueError):
+        multi_tau_auto_corr(num_levels, num_bufs, rois, img_stack, engine="fancy")
+
+
+def test_compiled_engine_fallback(monkeypatch):
+    setup()
+    g2, lag_steps = multi_tau_auto_corr(num_levels, num_bufs, rois, img_stack)
+    monkeypatch.delitem(corr._one_time_engines, "compiled", raising=False)
+    g2_fallback, lag_steps_fallback = multi_tau_auto_corr(num_levels, num_bufs, rois, img_stack, engine="compiled")
+    assert_equal(g2_fallback, g2)
+    assert_equal(lag_steps_fallback, lag_steps)
+
+
+def _to_events(images):
+    """Convert dense images into (pixel_index, counts) photon events"""
+    events = []
+    for image in images:
+        pixel_index = np.flatnonzero(np.ravel(image))
+        events.append((pixel_index, np.ravel(image)[pixel_index]))
+    return events
+
+
+def test_sparse_vs_dense():
+    setup()
+    images = np.random.poisson(0.1, img_stack.shape).astype(float)
+    images[[3, 21, 35, 48]] = np.nan
+    events = _to_events(images)
+
+    for dense_result in lazy_one_time(images, num_levels, num_bufs, rois):
+        pass
+    for sparse_result in lazy_one_time_sparse(events, num_levels, num_bufs, rois):
+        pass
+    assert_array_almost_equal(sparse_result.g2, dense_result.g2)
+    assert_equal(sparse_result.lag_steps, dense_result.lag_steps)
+    assert sparse_result.internal_state.norm == dense_result.internal_state.norm
+
+    # resume from the internal state
+    for first_half in lazy_one_time_sparse(events[:50], num_levels, num_bufs, rois):
+        pass
+    for second_half in lazy_one_time_sparse(
+        events[50:], num_levels, num_bufs, rois, internal_state=first_half.internal_state
+    ):
+        pass
+    assert_equal(second_half.g2, sparse_result.g2)
+
+    images = images[:50]
+    events = events[:50]
+    for dense_state in lazy_two_time(rois, images, 50, num_bufs, 3):
+        pass
+    for sparse_state in lazy_two_time_sparse(rois, events, 50, num_bufs, 3):
+        pass
+    assert_array_almost_equal(sparse_state.g2, dense_state.g2)
+
+
+def test_sparse_events():
+    setup()
+    image = np.zeros_like(rois, dtype=float)
+    image[rois > 0] = 2.0
+    roi_pixels = np.flatnonzero(rois)
+    background_pixels = np.flatnonzero(rois == 0)[:10]
+    # every ROI pixel gets two separate single photon events and the
+    # events outside of the ROIs are ignored
+    pixel_index = np.concatenate([roi_pixels, background_pixels, roi_pixels[::-1]])
+    events = (pixel_index, np.ones(len(pixel_index)))
+
+    g2_dense, _ = multi_tau_auto_corr(1, 4, rois, [image] * 4)
+    for sparse_result in lazy_one_time_sparse([events] * 4, 1, 4, rois):
+        pass
+    assert_array_almost_equal(sparse_result.g2, g2_dense)
+
+    with pytest.raises(ValueError):
+        list(lazy_one_time_sparse([(roi_pixels, np.ones(3))], 1, 4, rois))
+
+
 def test_one_time_from_two_time():
     np.random.seed(333)
     num_lev = 1
@@ -258,6 +536,31 @@ def test_one_time_from_two_time():
     )
 
 
+def test_one_time_from_two_time_blocks():
+    rs = np.random.RandomState(5)
+    two_time = rs.rand(3, 40, 40) + 1
+    two_time[0, 3, 10] = np.nan
+    two_time[1, 5:9] = np.nan
+    expected = np.array([[np.nanmean(np.diag(g, k=k)) for k in range(40)] for g in two_time])
+    expected_err = np.array([[np.nanstd(np.diag(g, k=k)) / np.sqrt(40 - k) for k in range(40)] for g in two_time])
+    for block_size in (None, 1, 7, 40):
+        one_time, err = one_time_from_two_time(two_time, calc_errors=True, block_size=block_size)
+        assert_array_almost_equal(one_time, expected, decimal=12)
+        assert_array_almost_equal(err, expected_err, decimal=12)
+        assert_array_almost_equal(one_time_from_two_time(two_time, block_size=block_size), expected, decimal=12)
+
+    # a triangular matrix gives the same as the full symmetric matrix
+    symmetric = np.array([np.tril(g) + np.tril(g, -1).T for g in two_time])
+    triangle = TriangularTwoTime(3, 40)
+    for t1 in range(40):
+        triangle[:, t1, : t1 + 1] = symmetric[:, t1, : t1 + 1]
+    for expected, result in zip(
+        one_time_from_two_time(symmetric, calc_errors=True),
+        one_time_from_two_time(triangle, calc_errors=True, block_size=9),
+    ):
+        assert_array_almost_equal(result, expected, decimal=12)
+
+
 @pytest.mark.skipif(int(np.__version__.split(".")[1]) > 14, reason="Test is numerically unstable")
 def test_CrossCorrelator1d():
     """Test the 1d version of the cross correlator with these methods:
@@ -439,6 +742,105 @@ def test_CrossCorrelator2d():
     )
 
 
+@pytest.mark.parametrize("shape", [(1, 17), (7, 1), (13, 8), (32, 45)])
+def test_fft_corr(shape):
+    rs = np.random.RandomState(0)
+    img1, img2 = rs.random_sample((2,) + shape)
+    fft_shape = corr._fft_corr_shape(shape)
+    fft1, fft2 = sp_fft.rfftn(img1, fft_shape), sp_fft.rfftn(img2, fft_shape)
+    assert_array_almost_equal(
+        corr._fft_corr(fft1, fft2, shape, fft_shape), corr._cross_corr(img1, img2), decimal=12
+    )
+    # leading axes are broadcast
+    batch = corr._fft_corr(np.stack([fft1, fft2]), fft1, shape, fft_shape)
+    assert_array_almost_equal(batch[1], corr._cross_corr(img2, img1), decimal=12)
+
+
+def _cc_data(num_images=3, shape=(40, 50)):
+    rs = np.random.RandomState(42)
+    images = rs.poisson(5, (num_images,) + shape).astype(float)
+    edges = ring_edges(3, 5, num_rings=3)
+    labels = segmented_rings(edges, 6, np.array(shape) // 2, shape)
+    return images, labels
+
+
+@pytest.mark.parametrize("normalization", ["regular", "symavg", ["regular", "symavg"]])
+def test_CrossCorrelator_workers(normalization):
+    images, labels = _cc_data()
+    cc = CrossCorrelator(labels.shape, mask=labels, normalization=normalization)
+    cc_threaded = CrossCorrelator(labels.shape, mask=labels, normalization=normalization, workers=4)
+    assert_equal(cc.nids, 18)
+
+    for img2 in (None, images[1]):
+        ref = cc(images[0], img2)
+        for res in (cc_threaded(images[0], img2), cc(images[0], img2, workers=-1)):
+            assert_equal(len(res), len(ref))
+            for r1, r2 in zip(ref, res):
+                assert_array_equal(r1, r2)
+
+    # a batch of image pairs gives the same results as one call per pair
+    batch = cc_threaded.map(images[:-1], images[1:])
+    assert_equal(len(batch), len(images) - 1)
+    for img1, img2, res in zip(images[:-1], images[1:], batch):
+        for r1, r2 in zip(cc(img1, img2), res):
+            assert_array_equal(r1, r2)
+
+    with pytest.raises(ValueError):
+        cc(images[0], workers=0)
+    with pytest.raises(ValueError):
+        cc.map(images, images[1:])
+
+
+@pytest.mark.parametrize("normalization", ["regular", "symavg"])
+def test_CrossCorrelator_stack(normalization):
+    images, labels = _cc_data(num_images=7)
+    cc = CrossCorrelator(labels.shape, mask=labels, normalization=normalization)
+    for images2 in (None, images[::-1]):
+        if images2 is None:
+            ref = [cc(img) for img in images]
+        else:
+            ref = [cc(img1, img2) for img1, img2 in zip(images, images2)]
+        # chunks do not have to divide the number of frames
+        res = cc.correlate_stack(images, images2, chunk_size=3)
+        mean = cc.correlate_stack(images, images2, mean=True, chunk_size=3, workers=2)
+        assert_equal(len(res), cc.nids)
+        for i in range(cc.nids):
+            assert_array_almost_equal(res[i], [r[i] for r in ref], decimal=10)
+            assert_array_almost_equal(mean[i], np.mean([r[i] for r in ref], axis=0), decimal=10)
+
+    # 1D curves
+    cc1D = CrossCorrelator((20,), normalization=normalization)
+    curves = images[:, 0, :20]
+    assert_array_almost_equal(cc1D.correlate_stack(curves), [cc1D(c) for c in curves], decimal=10)
+
+    with pytest.raises(ValueError):
+        cc.correlate_stack(images[:, :, 1:])
+    with pytest.raises(ValueError):
+        cc.correlate_stack(images, images[1:])
+    with pytest.raises(ValueError):
+        cc.correlate_stack(images, workers=0)
+
+
+@pytest.mark.parametrize("shape", [(40, 50), (200,)])
+def test_CrossCorrelator_no_warnings(shape):
+    # sparse images give exact zeros in the symmetric averaging
+    rs = np.random.RandomState(0)
+    labels = np.zeros(shape, dtype=int)
+    labels[2:20] = 1
+    labels[22:38] = 2
+    labels[rs.rand(*shape) < 0.3] = 0
+    img = rs.poisson(0.2, shape).astype(float)
+    for normalization in ("regular", "symavg", ["regular", "symavg"]):
+        cc = CrossCorrelator(shape, mask=labels, normalization=normalization)
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            res = cc(img)
+            cc(img, img + 1)
+        assert_equal(len(res), 2)
+        if normalization == "symavg":
+            assert not all(np.isfinite(r).all() for r in res)
+
+
 def test_CrossCorrelator_badinputs():
     with pytest.raises(ValueError):
         CrossCorrelator((1, 1, 1))
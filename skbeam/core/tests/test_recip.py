@@ -42,6 +42,7 @@ import pytest
 from numpy.testing import assert_array_almost_equal
 
 from skbeam.core import recip
+from skbeam.core.utils import grid3d
 
 
 @pytest.mark.skipif(os.name == "nt", reason="Test is not supported on Windows")
@@ -97,6 +98,50 @@ def test_process_to_q():
         recip.process_to_q(frame_mode=passes, **pdict)
 
 
+@pytest.mark.skipif(os.name == "nt", reason="Test is not supported on Windows")
+def test_process_to_q_chunks():
+    rs = np.random.RandomState(0)
+    ub_mat = np.array(
+        [
+            [-0.01231028454, 0.7405370482, 0.06323870032],
+            [0.4450897473, 0.04166852402, -0.9509449389],
+            [-0.7449130975, 0.01265920962, -0.5692399963],
+        ]
+    )
+    pdict = dict(
+        setting_angles=rs.uniform(0, 60, (7, 6)),
+        detector_size=(64, 48),
+        pixel_size=(0.108, 0.108),
+        calibrated_center=(32.0, 24.0),
+        dist_sample=355.0,
+        wavelength=12398.4 / 640,
+        ub=ub_mat,
+    )
+    hkl = recip.process_to_q(**pdict)
+    chunks = list(recip.lazy_process_to_q(chunk_size=3, **pdict))
+    assert [len(c) for c in chunks] == [3 * 64 * 48, 3 * 64 * 48, 64 * 48]
+    npt.assert_array_equal(np.concatenate(chunks), hkl)
+    hkl32 = recip.process_to_q(dtype=np.float32, num_threads=2, **pdict)
+    assert hkl32.dtype == np.float32
+    npt.assert_allclose(hkl32, hkl, rtol=1e-6)
+    with pytest.raises(ValueError):
+        recip.process_to_q(dtype=np.int32, **pdict)
+    with pytest.raises(ValueError):
+        next(recip.lazy_process_to_q(chunk_size=0, **pdict))
+
+    # gridding batch by batch gives the grid of all the HKL values at once
+    images = rs.poisson(5, (7, 48, 64)).astype(float)
+    mask = rs.rand(48, 64) > 0.2
+    for kwargs in ({}, dict(binary_mask=mask), dict(nx=10, ny=12, nz=8, xmin=-0.5, xmax=0.5, ymin=-0.5, ymax=0.5)):
+        with np.errstate(invalid="ignore"):
+            expected = grid3d(hkl, images, **kwargs)
+            result = recip.process_to_grid(img_stack=images, chunk_size=3, **dict(pdict, **kwargs))
+        npt.assert_allclose(result[0], expected[0])
+        npt.assert_array_equal(result[1], expected[1])
+        npt.assert_allclose(result[2], expected[2])
+        npt.assert_array_equal(result[3], expected[3])
+
+
 def _process_to_q_exception(param_dict, frame_mode):
     with pytest.raises(KeyError):
         recip.process_to_q(frame_mode=frame_mode, **param_dict)
@@ -46,6 +46,7 @@ from numpy.testing import (
     assert_equal,
     assert_raises,
 )
+from scipy import ndimage
 from skimage import morphology
 
 from skbeam.core import roi, utils
@@ -314,6 +315,13 @@ def test_circular_average():
 
     assert_array_almost_equal(ring_avg_masked, [8.88888889, 3.84615385, 2.5, 0.0, 0.0, 0.0])
 
+    # split pixels keep the average of a flat image
+    bin_cen_split, ring_avg_split = roi.circular_average(np.full(image.shape, 3.0), calib_center, nx=6, split=3)
+    assert_array_almost_equal(bin_cen_split, bin_cen)
+    assert_array_almost_equal(ring_avg_split, 3)
+    _, ring_avg_split = roi.circular_average(image, calib_center, nx=6, split=3)
+    assert not np.allclose(ring_avg_split, ring_avg)
+
 
 def test_kymograph():
     calib_center = (25, 25)
@@ -392,3 +400,92 @@ def test_auto_find_center_rings(rgb_image):
 
     assert_equal((99, 99), center)
     assert_array_equal(41.0, np.round(radii[0]))
+
+
+def test_auto_find_center_rings_downsample():
+    y, x = np.ogrid[:400, :440]
+    r = np.hypot(y - 190.3, x - 231.6)
+    image = np.exp(-((r - 80) ** 2) / 200.0) + np.exp(-((r - 150) ** 2) / 200.0)
+    image += np.random.RandomState(0).normal(0, 0.02, image.shape)
+    image /= image.max()
+
+    expected = roi.auto_find_center_rings(image, sigma=2, no_rings=4, max_trials=200, rng=0)
+    center, ring_image, radii, timings = roi.auto_find_center_rings(
+        image, sigma=2, no_rings=4, max_trials=200, downsample=4, rng=0, return_timings=True
+    )
+    assert_equal(center, expected[0])
+    assert_array_almost_equal(np.sort(radii), np.sort(expected[2]), decimal=0)
+    assert ring_image.shape == image.shape
+    assert set(timings) == {"edges", "fit", "refine", "total"}
+    # a seeded rng makes the result reproducible
+    again = roi.auto_find_center_rings(image, sigma=2, no_rings=4, max_trials=200, downsample=4, rng=0)
+    assert_array_equal(again[2], radii)
+
+    # once the time is up only the first ring is fitted
+    _, _, radii = roi.auto_find_center_rings(image, sigma=2, no_rings=4, downsample=4, time_limit=0)
+    assert len(radii) == 1
+    with pytest.raises(ValueError):
+        roi.auto_find_center_rings(image, downsample=0)
+
+
+def test_label_index():
+    rs = np.random.RandomState(3)
+    images = rs.poisson(5, (7, 30, 40)).astype(np.uint16)
+    labels = np.zeros((30, 40), dtype=np.int64)
+    labels[2:10, 5:25] = 4
+    labels[12:20, 3:9] = 1
+    labels[21:28, 10:38] = 9
+    label_index = roi.LabelIndex(labels)
+    assert_array_equal(label_index.labels, [1, 4, 9])
+    assert_array_equal(label_index.counts, [48, 160, 196])
+    assert_array_equal(label_index.positions([9, 2, 1]), [2, -1, 0])
+
+    for lbl in (labels, label_index):
+        intensity, index = roi.mean_intensity(images, lbl)
+        assert_array_equal(index, [1, 4, 9])
+        expected = [ndimage.mean(img, labels, index=[1, 4, 9]) for img in images]
+        assert_array_almost_equal(intensity, expected)
+
+        pixels, index = roi.roi_pixel_values(images[0], lbl)
+        assert_array_equal(index, np.arange(1, 10))
+        for n, pix in zip(index, pixels):
+            assert_array_equal(pix, images[0][labels == n])
+
+        assert_array_equal(roi.kymograph(images, lbl, 4), images[:, labels == 4])
+        assert roi.roi_max_counts([images, iter(images[:3])], lbl) == images[:, labels > 0].max()
+
+    compact = roi.compact_labels(labels)
+    assert compact.dtype == np.uint8
+    assert_array_equal(compact, labels)
+    assert_array_equal(label_index.to_array(), labels)
+    assert label_index.labels.dtype == np.uint8
+    assert label_index.pixel_list.dtype == np.uint16
+    assert label_index.nbytes < compact.nbytes
+    label_mask, pixel_list = roi.extract_label_indices(labels)
+    for expected, result in zip((label_mask, pixel_list), roi.extract_label_indices(label_index)):
+        assert_array_equal(result, expected)
+    assert_raises(ValueError, roi.compact_labels, -labels)
+
+    intensity, index = roi.mean_intensity(images, label_index, index=[4, 5])
+    assert np.all(np.isnan(intensity[:, 1]))
+    assert_raises(ValueError, roi.mean_intensity, images[:, :20], label_index)
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 3, 100])
+def test_mean_intensity_chunked(tmpdir, chunk_size):
+    rs = np.random.RandomState(5)
+    labels = roi.rings(roi.ring_edges(2, 3, 1, num_rings=3), (12, 14), (25, 30))
+    path = str(tmpdir.join("stack.npy"))
+    np.save(path, rs.poisson(4, (10, 25, 30)).astype(np.uint16))
+    images = np.load(path, mmap_mode="r")
+
+    intensity, index = roi.mean_intensity(images, labels, chunk_size=chunk_size)
+    expected = [ndimage.mean(img, labels, index=[1, 2, 3]) for img in images]
+    assert_array_almost_equal(intensity, expected)
+    # a list of images reduces the same way
+    assert_array_equal(roi.mean_intensity(list(images), labels, chunk_size=chunk_size)[0], intensity)
+
+
+def test_mean_intensity_bad_chunk_size():
+    labels = roi.rectangles([[1, 1, 3, 3]], (6, 6))
+    assert_raises(ValueError, roi.mean_intensity, np.ones((2, 6, 6)), labels, chunk_size=0)
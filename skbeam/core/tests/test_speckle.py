@@ -37,7 +37,8 @@ from __future__ import absolute_import, division, print_function
 import logging
 
 import numpy as np
-from numpy.testing import assert_array_almost_equal
+import pytest
+from numpy.testing import assert_array_almost_equal, assert_array_equal
 
 import skbeam.core.mask as mask
 import skbeam.core.speckle as xsvs
@@ -81,6 +82,97 @@ def test_xsvs():
     assert_array_almost_equal(new_prob_k[0, 1], np.array([0.0, 0.2, 0.2, 0.2, 0.4]))
 
 
+def test_lazy_xsvs():
+    rs = np.random.RandomState(3)
+    images = rs.poisson(2, (12, 20, 20)).astype(float)
+    images[4] = np.nan
+    label_array = roi.rectangles(np.array([[2, 2, 6, 6], [10, 10, 8, 5]]), shape=(20, 20))
+    prob_k_all, std = xsvs.xsvs([images], label_array, number_of_img=12, timebin_num=2, max_cts=10)
+
+    results = list(xsvs.lazy_xsvs(images, label_array, 12, 10))
+    assert len(results) == len(images)
+    for level in range(prob_k_all.shape[0]):
+        for j in range(prob_k_all.shape[1]):
+            assert_array_almost_equal(results[-1].prob_k[level, j], prob_k_all[level, j])
+            assert_array_almost_equal(results[-1].prob_k_std_dev[level, j], std[level, j])
+
+    # resume from the internal state
+    for first in xsvs.lazy_xsvs(images[:5], label_array, 12, 10):
+        pass
+    for second in xsvs.lazy_xsvs(images[5:], label_array, 12, 10, internal_state=first.internal_state):
+        pass
+    for level in range(prob_k_all.shape[0]):
+        for j in range(prob_k_all.shape[1]):
+            assert_array_almost_equal(second.prob_k[level, j], prob_k_all[level, j])
+
+
+def test_xsvs_integer_counts():
+    rs = np.random.RandomState(4)
+    images = rs.poisson(2, (12, 20, 20)).astype(np.uint16)
+    # counts beyond the bins of every integration time
+    images[3, 2, 2] = 1000
+    label_array = roi.rectangles(np.array([[2, 2, 6, 6], [10, 10, 8, 5]]), shape=(20, 20))
+    float_images = images.astype(float)
+    float_images[6] = np.nan
+
+    for expected, result in zip(
+        xsvs.lazy_xsvs(float_images, label_array, 12, 6),
+        xsvs.lazy_xsvs(images, label_array, 12, 6, dtype=np.uint16, bad_images=[6]),
+    ):
+        assert result.internal_state.buf.dtype == np.uint16
+        for level in range(expected.prob_k.shape[0]):
+            for j in range(expected.prob_k.shape[1]):
+                assert_array_almost_equal(result.prob_k[level, j], expected.prob_k[level, j], decimal=14)
+    assert_array_equal(result.internal_state.track_bad, expected.internal_state.track_bad)
+
+    prob_k_all, std = xsvs.xsvs([images], label_array, number_of_img=12, max_cts=6, dtype=np.uint32)
+    expected_all, expected_std = xsvs.xsvs([images.astype(float)], label_array, number_of_img=12, max_cts=6)
+    for level in range(prob_k_all.shape[0]):
+        for j in range(prob_k_all.shape[1]):
+            assert_array_almost_equal(prob_k_all[level, j], expected_all[level, j], decimal=14)
+
+    with pytest.raises(ValueError):
+        # max_cts * 2 ** 4 integration times does not fit
+        list(xsvs.lazy_xsvs(images, label_array, 12, 5000, dtype=np.uint16))
+    with pytest.raises(ValueError):
+        list(xsvs.lazy_xsvs(float_images, label_array, 12, 6, dtype=np.uint16))
+    with pytest.raises(ValueError):
+        list(xsvs.lazy_xsvs(images, label_array, 12, 6, dtype=np.int32))
+
+
+def test_compact_labels():
+    rs = np.random.RandomState(11)
+    images = rs.poisson(4, (30, 20, 30)).astype(float)
+    labels = roi.segmented_rings(roi.ring_edges(2, 3, 1, num_rings=2), 3, (10, 14), (20, 30))
+
+    prob_k, _ = xsvs.xsvs([images], labels, 30, max_cts=20)
+    for compact in (roi.compact_labels(labels), roi.LabelIndex(labels)):
+        compact_k, _ = xsvs.xsvs([images], compact, 30, max_cts=20)
+        for level in range(prob_k.shape[0]):
+            for j in range(prob_k.shape[1]):
+                assert_array_equal(compact_k[level, j], prob_k[level, j])
+
+
+def test_roi_histograms():
+    rs = np.random.RandomState(5)
+    data = rs.poisson(3, 500).astype(float)
+    # fractional, negative and out of range values and the last edge
+    data[:20] = rs.uniform(-2, 12, 20)
+    data[20:25] = 7
+    roi_index = rs.randint(0, 4, 500)
+    # a ROI with all its values out of the range of the bins
+    roi_index[data > 8] = 4
+    assert np.any(roi_index == 4)
+    bin_edges = np.arange(8)
+
+    spe_hist = xsvs._roi_histograms(data, roi_index, 5, bin_edges)
+    assert spe_hist.shape == (5, 7)
+    for j in range(4):
+        expected, _ = np.histogram(data[roi_index == j], bins=bin_edges, density=True)
+        assert_array_almost_equal(spe_hist[j], expected, decimal=14)
+    assert_array_almost_equal(spe_hist[4], np.zeros(7))
+
+
 def test_normalize_bin_edges():
     num_times = 3
     num_rois = 2
@@ -568,6 +568,110 @@ def test_radial_grid():
     assert_equal(a[3, 4], 1)
 
 
+def test_float32_grids():
+    # the accuracy budget documented in radial_grid
+    center, shape, pixel_size = (310.3, 290.8), (600, 640), (0.172, 0.1)
+    r = core.radial_grid(center, shape, pixel_size)
+    r32 = core.radial_grid(center, shape, pixel_size, dtype=np.float32)
+    assert r32.dtype == np.float32
+    assert np.all(np.abs(r32 - r) <= 3e-7 * r)
+    a32 = core.angle_grid(center, shape, pixel_size, dtype=np.float32)
+    assert a32.dtype == np.float32
+    assert np.all(np.abs(a32 - core.angle_grid(center, shape, pixel_size)) <= 5e-7)
+    assert core.radial_range(center, shape, pixel_size) == (r.min(), r.max())
+
+    # float32 values are summed in float64
+    rs = np.random.RandomState(0)
+    x = rs.rand(10**6)
+    y = rs.normal(1000, 1, 10**6).astype(np.float32)
+    edges, val, count = core.bin_1D(x, y, 5)
+    assert val.dtype == np.float64
+    assert_array_equal(val, core.bin_1D(x, y.astype(np.float64), 5)[1])
+
+
+def test_geometry_cache():
+    # room for two float64 maps of 7 x 9 pixels
+    cache = core.GeometryCache(maxbytes=2 * 7 * 9 * 8)
+    r = cache.radial_grid((3.5, 2), (7, 9), pixel_size=(0.5, 1))
+    assert r.dtype == np.float32
+    assert not r.flags.writeable
+    assert_array_almost_equal(r, core.radial_grid((3.5, 2), (7, 9), (0.5, 1)), decimal=6)
+    assert cache.radial_grid((3.5, 2.0), [7, 9], pixel_size=[0.5, 1.0]) is r
+    assert cache.nbytes == r.nbytes
+
+    a = cache.angle_grid((3.5, 2), (7, 9), dtype=np.float64)
+    assert_array_equal(a, core.angle_grid((3.5, 2), (7, 9)))
+    assert len(cache) == 2
+    assert cache.nbytes == r.nbytes + a.nbytes
+    # r was used least recently, so it is evicted first
+    cache.radial_grid((3, 3), (7, 9), dtype=np.float64)
+    assert len(cache) == 2
+    assert cache.angle_grid((3.5, 2), (7, 9), dtype=np.float64) is a
+    assert cache.radial_grid((3.5, 2), (7, 9), pixel_size=(0.5, 1)) is not r
+    assert cache.nbytes <= cache.maxbytes
+
+    # an entry larger than the cache is returned but not kept
+    big = cache.radial_grid((0, 0), (20, 20))
+    assert big.shape == (20, 20)
+    assert cache.radial_grid((0, 0), (20, 20)) is not big
+    matrix = cache.integration_matrix((2, 2), (5, 5), bins=4)
+    assert cache.integration_matrix((2, 2), (5, 5), bins=4) is matrix
+    assert cache.nbytes <= cache.maxbytes
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.nbytes == 0
+    disabled = core.GeometryCache(maxbytes=0)
+    assert disabled.radial_grid((1, 1), (3, 3)) is not disabled.radial_grid((1, 1), (3, 3))
+
+
+def test_integration_matrix():
+    rs = np.random.RandomState(5)
+    shape = (40, 50)
+    center = (18.3, 27.6)
+    image = rs.poisson(5, shape).astype(float)
+    r = core.radial_grid(center, shape)
+    phi = core.angle_grid(center, shape)
+
+    matrix = core.IntegrationMatrix.from_geometry(center, shape, bins=12)
+    sums, edges = np.histogram(r, bins=12, weights=image)
+    assert_array_almost_equal(matrix.matvec(image), sums)
+    assert_array_equal(matrix.counts, np.histogram(r, bins=12)[0])
+    assert_array_almost_equal(matrix.bin_centers[0], core.bin_edges_to_centers(edges))
+
+    matrix = core.IntegrationMatrix.from_geometry(center, shape, bins=6, phi_bins=8, phi_range=(-np.pi, np.pi))
+    sums = np.histogram2d(r.ravel(), phi.ravel(), bins=matrix.edges, weights=image.ravel())[0]
+    assert_array_almost_equal(matrix.matvec(image), sums)
+    stack = rs.rand(3, *shape)
+    assert_array_almost_equal(matrix.matmat(stack), [matrix.matvec(im) for im in stack])
+    mask = rs.rand(*shape) > 0.3
+    mean, counts = matrix.mean(image, mask)
+    assert_array_almost_equal(counts, np.histogram2d(r[mask], phi[mask], bins=matrix.edges)[0])
+    assert_array_almost_equal(
+        mean, np.histogram2d(r[mask], phi[mask], bins=matrix.edges, weights=image[mask])[0] / counts
+    )
+    with pytest.raises(ValueError):
+        matrix.matvec(image[:-1])
+
+    # split pixels share their weight between the bins they cover
+    split = core.IntegrationMatrix.from_geometry(center, shape, bins=np.linspace(0, 50, 41), split=2)
+    assert_almost_equal(split.counts.sum(), image.size)
+    assert_array_almost_equal(split.counts * 4, np.round(split.counts * 4))
+    assert np.any(split.counts * 4 % 4)
+    mean, _ = split.mean(np.ones(shape))
+    assert_array_almost_equal(mean[split.counts > 0], 1)
+    with pytest.raises(ValueError):
+        core.IntegrationMatrix.from_geometry(center, shape, split=0)
+
+    cache = core.GeometryCache()
+    cached = cache.integration_matrix(center, shape, bins=12, split=2)
+    assert cache.integration_matrix(list(center), shape, bins=12, split=2) is cached
+    assert cache.integration_matrix(center, shape, bins=12) is not cached
+    cached = cache.coordinate_matrix([r.ravel()], [edges])
+    assert cache.coordinate_matrix([r.ravel().copy()], [edges.copy()]) is cached
+    assert_array_almost_equal(cached.matvec(image), np.histogram(r, bins=edges, weights=image)[0])
+
+
 def test_geometric_series():
     time_series = core.geometric_series(common_ratio=5, number_of_images=150)
 
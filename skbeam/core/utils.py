@@ -38,16 +38,19 @@ This module is for the 'core' data types.
 """
 from __future__ import absolute_import, division, print_function
 
+import hashlib
 import logging
 import sys
+import threading
 import time
-from collections import defaultdict, deque, namedtuple
+from collections import OrderedDict, defaultdict, deque, namedtuple
 from collections.abc import MutableMapping
 from itertools import tee
 
 import numpy as np
 import scipy.stats as sts
 import six
+from scipy import sparse
 from six import string_types
 from six.moves import zip
 
@@ -554,7 +557,11 @@ def bin_1D(x, y, nx=None, min_x=None, max_x=None):
     if nx is None:
         nx = int(max_x - min_x)
 
-    # use a weighted histogram to get the bin sum
+    # use a weighted histogram to get the bin sum, np.histogram sums in
+    # the precision of the weights, float32 values are summed in float64
+    y = np.asarray(y)
+    if y.dtype.kind == "f" and y.dtype.itemsize < 8:
+        y = y.astype(np.float64)
     bins = np.linspace(start=min_x, stop=max_x, num=nx + 1, endpoint=True)
     val, _ = np.histogram(a=x, bins=bins, weights=y)
     # use an un-weighted histogram to get the counts
@@ -563,7 +570,7 @@ def bin_1D(x, y, nx=None, min_x=None, max_x=None):
     return bins, val, count
 
 
-def radial_grid(center, shape, pixel_size=None):
+def radial_grid(center, shape, pixel_size=None, dtype=np.float64):
     """Convert a cartesian grid (x,y) to the radius relative to some center
 
     Parameters
@@ -579,24 +586,79 @@ def radial_grid(center, shape, pixel_size=None):
         The physical size of the pixels.
         len(pixel_size) should be the same as len(shape)
         defaults to (1,1)
+    dtype : np.dtype, optional
+        The floating point type the grid is computed in. Defaults to
+        float64
 
     Returns
     -------
     r : array
         The distance of each pixel from `center`
         Shape of the return value is equal to the `shape` input parameter
+
+    Notes
+    -----
+    A float32 grid takes half the memory of a float64 one, which matters
+    for the 16 Mpixel detectors where a float64 map is 128 MB. The radii
+    computed in float32 are within a relative 3e-7 of the float64 radii,
+    i.e. 1e-3 pixel at a radius of 3000 pixels, and the angles of
+    `angle_grid` within 5e-7 radians. This is well below the
+    size of a pixel, but pixels that are closer than that to a bin edge can
+    land in the neighbouring bin. The binning functions accumulate their
+    sums in float64 whatever the precision of the grid or the values, so
+    apart from those pixels a float32 grid gives the float64 result.
     """
 
     if pixel_size is None:
         pixel_size = (1, 1)
 
-    X, Y = np.meshgrid(
-        pixel_size[1] * (np.arange(shape[1]) - center[1]), pixel_size[0] * (np.arange(shape[0]) - center[0])
-    )
-    return np.sqrt(X * X + Y * Y)
+    X, Y = _centered_positions(center, shape, pixel_size, dtype)
+    # broadcasting the row and column positions allocates the grid once
+    r = X * X + Y * Y
+    return np.sqrt(r, out=r)
+
+
+def radial_range(center, shape, pixel_size=None):
+    """The smallest and the largest radius of `radial_grid`
 
+    This gives the same values as the minimum and the maximum of the float64
+    `radial_grid`, without computing the grid.
+
+    Parameters
+    ----------
+    center : tuple
+        point in image where r=0. Order is (rr, cc).
+    shape : tuple
+        Image shape. Order is (rr, cc).
+    pixel_size : sequence, optional
+        The physical size of the pixels, defaults to (1, 1)
 
-def angle_grid(center, shape, pixel_size=None):
+    Returns
+    -------
+    r_min, r_max : float
+        The smallest and the largest distance of a pixel from `center`
+    """
+    if pixel_size is None:
+        pixel_size = (1, 1)
+    X, Y = _centered_positions(center, shape, pixel_size, np.float64)
+    X = X * X
+    Y = Y * Y
+    # the rounded sum of squares grows with each of the squares, so the
+    # extreme radii come from the extreme squares
+    return np.sqrt(X.min() + Y.min()), np.sqrt(X.max() + Y.max())
+
+
+def _centered_positions(center, shape, pixel_size, dtype):
+    """The column positions as a row and the row positions as a column,
+    relative to `center`"""
+    dtype = np.dtype(dtype)
+    cols = pixel_size[1] * (np.arange(shape[1]) - center[1])
+    rows = pixel_size[0] * (np.arange(shape[0]) - center[0])
+    # only the 1D positions are computed in float64
+    return cols.astype(dtype, copy=False)[np.newaxis, :], rows.astype(dtype, copy=False)[:, np.newaxis]
+
+
+def angle_grid(center, shape, pixel_size=None, dtype=np.float64):
     """
     Make a grid of angular positions.
 
@@ -612,6 +674,13 @@ def angle_grid(center, shape, pixel_size=None):
         Image shape which is used to determine the maximum extent of output
         pixel coordinates. Order is (rr, cc).
 
+    pixel_size : sequence, optional
+        The physical size of the pixels, defaults to (1, 1)
+
+    dtype : np.dtype, optional
+        The floating point type the grid is computed in, see `radial_grid`
+        for the accuracy of float32. Defaults to float64
+
     Returns
     -------
     agrid : array
@@ -629,12 +698,432 @@ def angle_grid(center, shape, pixel_size=None):
         pixel_size = (1, 1)
 
     # row is y, column is x. "so say we all. amen."
-    x, y = np.meshgrid(
-        pixel_size[1] * (np.arange(shape[1]) - center[1]), pixel_size[0] * (np.arange(shape[0]) - center[0])
-    )
+    x, y = _centered_positions(center, shape, pixel_size, dtype)
     return np.arctan2(y, x)
 
 
+class IntegrationMatrix(object):
+    """Sparse matrix mapping the pixels of a detector to integration bins
+
+    Row ``i`` of `matrix` holds the fraction of pixel ``i`` that falls into
+    each bin. Integrating an image is then a single sparse matrix-vector
+    product, instead of digitizing the pixel coordinates and building a
+    histogram on every call.
+
+    Pixels can be split: each pixel is represented by S sub-pixels that
+    are binned separately and carry 1 / S of the pixel each. A pixel that
+    straddles a bin edge is then shared between the bins it covers instead
+    of going entirely to the bin of its center, which reduces the aliasing
+    of fine bins.
+
+    Parameters
+    ----------
+    flatbins : array
+        The flat index into the bins of every pixel, shape (N,), or of
+        every sub-pixel, shape (S, N). Negative values mark pixels (or
+        sub-pixels) outside all bins.
+    shape : tuple
+        The shape of the bins, e.g. ``(num_r, num_phi)``
+    edges : list of arrays, optional
+        The bin edges along each dimension of `shape`
+
+    Attributes
+    ----------
+    matrix : scipy.sparse.csr_matrix
+        The (N, num_bins) pixel-to-bin matrix
+    counts : array
+        The number of pixels in each bin; fractional for split pixels
+    num_pixels : int
+        N
+
+    See Also
+    --------
+    GeometryCache.integration_matrix : cached radial and (r, phi) matrices
+    """
+
+    def __init__(self, flatbins, shape, edges=None):
+        flatbins = np.asarray(flatbins)
+        if flatbins.ndim == 1:
+            flatbins = flatbins[np.newaxis]
+        if flatbins.ndim != 2:
+            raise ValueError("flatbins must have the shape (N,) or (S, N). Received: {}".format(flatbins.shape))
+        num_sub, self.num_pixels = flatbins.shape
+        self.shape = tuple(int(n) for n in shape)
+        self.edges = edges
+        num_bins = int(np.prod(self.shape))
+
+        inside = flatbins >= 0
+        rows = np.broadcast_to(np.arange(self.num_pixels), flatbins.shape)[inside]
+        self.matrix = sparse.csr_matrix(
+            (np.full(len(rows), 1.0 / num_sub), (rows, flatbins[inside])), shape=(self.num_pixels, num_bins)
+        )
+        self.matrix.sum_duplicates()
+        # a product with the transpose (csc) streams through the pixels,
+        # this is faster than gathering the pixels of each bin
+        self._transpose = self.matrix.T
+        self.counts = np.asarray(self.matrix.sum(axis=0)).reshape(self.shape)
+
+    @property
+    def nbytes(self):
+        """Memory of the matrix and the counts in bytes, the transpose
+        shares the arrays of the matrix"""
+        matrix = self.matrix
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes + self.counts.nbytes
+
+    @classmethod
+    def from_coords(cls, coords, edges):
+        """Bin pixels by their coordinates
+
+        Parameters
+        ----------
+        coords : sequence of arrays
+            One array per dimension of the bins with the coordinate of every
+            pixel, shape (N,), or of every sub-pixel, shape (S, N).
+        edges : sequence of arrays
+            The monotonically increasing bin edges along each dimension.
+            As in `np.histogram`, the last bin includes its right edge.
+
+        Returns
+        -------
+        IntegrationMatrix
+        """
+        if len(coords) != len(edges):
+            raise ValueError("coords and edges must have the same length")
+        edges = [np.asarray(e, dtype=float) for e in edges]
+        shape = tuple(len(e) - 1 for e in edges)
+        inside = True
+        indices = []
+        for coord, edge, num in zip(coords, edges, shape):
+            coord = np.asarray(coord)
+            index = np.searchsorted(edge, coord, side="right") - 1
+            index[coord == edge[-1]] = num - 1
+            inside = inside & (index >= 0) & (index < num)
+            indices.append(np.clip(index, 0, num - 1))
+        flatbins = np.where(inside, np.ravel_multi_index(tuple(indices), shape), -1)
+        return cls(flatbins, shape, edges)
+
+    @classmethod
+    def from_geometry(
+        cls, center, shape, bins=10, range=None, pixel_size=None, phi_bins=None, phi_range=None, split=1
+    ):
+        """Radial or (r, phi) integration of a detector
+
+        Parameters
+        ----------
+        center : tuple
+            point in image where r=0; may be a float giving subpixel
+            precision. Order is (rr, cc).
+        shape : tuple
+            Image shape. Order is (rr, cc).
+        bins : int or array, optional
+            Number of radial bins, or the radial bin edges. Defaults to 10
+        range : tuple, optional
+            (min, max) of the radial bins when `bins` is an int. Defaults to
+            the range of the radii of the pixel centers
+        pixel_size : tuple, optional
+            The size of a pixel, see `radial_grid`. Defaults to (1, 1)
+        phi_bins : int or array, optional
+            Number of angular bins, or the angular bin edges, see
+            `angle_grid` for the convention. Only radial bins if None
+        phi_range : tuple, optional
+            (min, max) of the angular bins when `phi_bins` is an int.
+            Defaults to the range of the angles of the pixel centers
+        split : int, optional
+            Split each pixel into ``split x split`` sub-pixels. Defaults to
+            1, every pixel goes to the bin of its center
+
+        Returns
+        -------
+        IntegrationMatrix
+            The matrix with bins of shape (num_r,) or (num_r, num_phi)
+        """
+        if int(split) < 1:
+            raise ValueError("split must be a positive integer. Received: {}".format(split))
+        split = int(split)
+        grids = [radial_grid]
+        specs = [(bins, range)]
+        if phi_bins is not None:
+            grids.append(angle_grid)
+            specs.append((phi_bins, phi_range))
+
+        # sub-pixel (dr, dc) is the pixel grid seen from a center moved by
+        # (-dr, -dc)
+        offsets = (np.arange(split) + 0.5) / split - 0.5
+        coords = []
+        edges = []
+        for grid, (num, limits) in zip(grids, specs):
+            centers = grid(center, shape, pixel_size).ravel()
+            if np.ndim(num) == 0:
+                if limits is None:
+                    limits = (centers.min(), centers.max())
+                edges.append(np.linspace(limits[0], limits[1], int(num) + 1))
+            else:
+                edges.append(np.asarray(num, dtype=float))
+            if split == 1:
+                coords.append(centers)
+                continue
+            coords.append(
+                np.array(
+                    [
+                        grid((center[0] - dr, center[1] - dc), shape, pixel_size).ravel()
+                        for dr in offsets
+                        for dc in offsets
+                    ]
+                )
+            )
+        return cls.from_coords(coords, edges)
+
+    @property
+    def bin_centers(self):
+        """The bin centers along each dimension, None without edges"""
+        if self.edges is None:
+            return None
+        return [bin_edges_to_centers(e) for e in self.edges]
+
+    def matvec(self, values):
+        """Sum the pixels of one image into the bins
+
+        Parameters
+        ----------
+        values : array
+            An image, or anything else of N values
+
+        Returns
+        -------
+        sums : array
+            The weighted sum of the pixels in each bin, in the shape of the
+            bins
+        """
+        values = np.asarray(values).reshape(-1)
+        if len(values) != self.num_pixels:
+            raise ValueError("Expected {} values. Received: {}".format(self.num_pixels, len(values)))
+        return (self._transpose @ values).reshape(self.shape)
+
+    def matmat(self, values):
+        """Sum the pixels of a stack of images into the bins
+
+        Parameters
+        ----------
+        values : array
+            A stack of images, the stack dimension first
+
+        Returns
+        -------
+        sums : array
+            The sums of `matvec` for each image, the stack dimension first
+        """
+        values = np.asarray(values)
+        if values.size % self.num_pixels or not values.size:
+            raise ValueError(
+                "Expected a multiple of {} values. Received: {}".format(self.num_pixels, values.shape)
+            )
+        values = values.reshape(-1, self.num_pixels)
+        sums = np.empty((len(values),) + self.shape)
+        # one matrix-vector product per image, scipy's sparse-dense
+        # product is slower than this for a handful of bins per pixel
+        for image, out in zip(values, sums):
+            out[...] = self.matvec(image)
+        return sums
+
+    def mean(self, values, mask=None):
+        """Mean of the pixels of one image or a stack in each bin
+
+        Parameters
+        ----------
+        values : array
+            An image, or a stack of images with the stack dimension first
+        mask : array, optional
+            The pixels to use, 1 for good pixels and 0 for bad ones.
+            Defaults to all pixels
+
+        Returns
+        -------
+        mean : array
+            The mean in each bin, NaN for empty bins
+        counts : array
+            The number of (good) pixels in each bin
+        """
+        values = np.asarray(values)
+        counts = self.counts
+        if mask is not None:
+            mask = np.asarray(mask).reshape(-1) != 0
+            counts = self.matvec(mask)
+            values = np.where(mask, values.reshape(-1, self.num_pixels), 0)
+        sums = self.matmat(values) if values.size > self.num_pixels else self.matvec(values)
+        mean = np.full(sums.shape, np.nan)
+        nonzero = np.broadcast_to(counts > 0, sums.shape)
+        np.divide(sums, counts, out=mean, where=nonzero)
+        return mean, counts
+
+
+class GeometryCache(object):
+    """Least recently used cache of detector geometry maps
+
+    Building `radial_grid` and `angle_grid` for a full detector allocates
+    several full-size float64 temporaries. Reductions against a fixed
+    geometry can take the maps from this cache instead, keyed on
+    (center, shape, pixel_size, dtype).
+
+    The maps are computed and stored as `float32` by default, half the
+    memory of `float64` maps. Code that labels pixels by comparing them to
+    bin edges, where moving a value by one float32 ulp could move a pixel
+    across an edge, needs `np.float64` maps; unless it labels the same
+    geometry over and over, it should call `radial_grid` and `angle_grid`
+    directly instead of keeping full float64 maps alive in a cache. See
+    `radial_grid` for the accuracy of float32 maps.
+
+    The returned arrays are shared between callers and are read-only.
+
+    The cache also holds the `IntegrationMatrix` of a geometry and a set of
+    bins, which replaces digitizing the maps on every integration. The
+    matrices are shared too and must not be modified.
+
+    The cache is bounded by the memory of its entries, not their number:
+    the least recently used entries are evicted once the total exceeds
+    `maxbytes`, and an entry larger than `maxbytes` is returned without
+    being cached. A float32 map of a 16 Mpx detector takes 64 MB and its
+    radial `IntegrationMatrix` about 270 MB, so code that integrates many
+    images of such a detector should raise `maxbytes` of the shared
+    `geometry_cache`.
+
+    Parameters
+    ----------
+    maxbytes : int, optional
+        Memory of the cached maps and matrices, in bytes. 0 disables the
+        cache. Defaults to 256 MiB
+
+    Attributes
+    ----------
+    nbytes : int
+        Memory of the currently cached maps and matrices, in bytes
+
+    Examples
+    --------
+    >>> cache = GeometryCache(maxbytes=2**20)
+    >>> r = cache.radial_grid((1, 1), (3, 3))
+    >>> r.dtype
+    dtype('float32')
+    >>> cache.radial_grid((1, 1), (3, 3)) is r
+    True
+    """
+
+    def __init__(self, maxbytes=2**28):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self._maps = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._maps)
+
+    def clear(self):
+        """Drop all cached maps and matrices"""
+        with self._lock:
+            self._maps.clear()
+            self.nbytes = 0
+
+    def radial_grid(self, center, shape, pixel_size=None, dtype=np.float32):
+        """Cached, read-only `radial_grid`, see there for the parameters"""
+        return self._get(radial_grid, center, shape, pixel_size, dtype)
+
+    def angle_grid(self, center, shape, pixel_size=None, dtype=np.float32):
+        """Cached, read-only `angle_grid`, see there for the parameters"""
+        return self._get(angle_grid, center, shape, pixel_size, dtype)
+
+    def integration_matrix(
+        self, center, shape, bins=10, range=None, pixel_size=None, phi_bins=None, phi_range=None, split=1
+    ):
+        """Cached `IntegrationMatrix.from_geometry`, see there for the
+        parameters"""
+        if pixel_size is None:
+            pixel_size = (1, 1)
+        key = (
+            "integration_matrix",
+            tuple(float(c) for c in center),
+            tuple(int(s) for s in shape),
+            tuple(float(p) for p in pixel_size),
+            _spec_key(bins),
+            _spec_key(range),
+            _spec_key(phi_bins),
+            _spec_key(phi_range),
+            int(split),
+        )
+        return self._lookup(
+            key,
+            lambda: IntegrationMatrix.from_geometry(
+                center, shape, bins, range, pixel_size, phi_bins, phi_range, split
+            ),
+        )
+
+    def coordinate_matrix(self, coords, edges):
+        """Cached `IntegrationMatrix.from_coords`, see there for the
+        parameters
+
+        The key is a digest of the coordinates, so that maps which are
+        computed anew for every call, e.g. a tilt corrected radius, still
+        hit the cache.
+        """
+        digest = hashlib.sha1()
+        for array in list(coords) + list(edges):
+            array = np.ascontiguousarray(array)
+            digest.update(str((array.dtype.str, array.shape)).encode())
+            digest.update(array.view(np.uint8).reshape(-1))
+        return self._lookup(
+            ("coordinate_matrix", digest.hexdigest()), lambda: IntegrationMatrix.from_coords(coords, edges)
+        )
+
+    def _get(self, func, center, shape, pixel_size, dtype):
+        if pixel_size is None:
+            pixel_size = (1, 1)
+        dtype = np.dtype(dtype)
+        key = (
+            func.__name__,
+            tuple(float(c) for c in center),
+            tuple(int(s) for s in shape),
+            tuple(float(p) for p in pixel_size),
+            dtype.str,
+        )
+
+        def build():
+            grid = func(center, shape, pixel_size, dtype=dtype)
+            grid.setflags(write=False)
+            return grid
+
+        return self._lookup(key, build)
+
+    def _lookup(self, key, build):
+        with self._lock:
+            try:
+                value = self._maps.pop(key)
+            except KeyError:
+                value = None
+            else:
+                self._maps[key] = value
+        if value is not None:
+            return value
+
+        value = build()
+        with self._lock:
+            if value.nbytes <= self.maxbytes and key not in self._maps:
+                self._maps[key] = value
+                self.nbytes += value.nbytes
+                while self.nbytes > self.maxbytes:
+                    _, evicted = self._maps.popitem(last=False)
+                    self.nbytes -= evicted.nbytes
+        return value
+
+
+def _spec_key(spec):
+    """Hashable cache key of a bin count, bin edges or range"""
+    if spec is None:
+        return None
+    return tuple(float(v) for v in np.ravel(spec))
+
+
+#: The geometry cache shared by the ROI and calibration functions
+geometry_cache = GeometryCache()
+
+
 def radius_to_twotheta(dist_sample, radius):
     """
     Converts radius from the calibrated center to scattering angle
@@ -1240,12 +1729,25 @@ def bin_grid(image, r_array, pixel_sizes, statistic="mean", mask=None, bins=None
         spacing (less general)
 
     """
-    if mask is None:
-        mask = np.ones(image.shape, dtype=int).astype(bool)
     if bins is None:
         res = np.hypot(*pixel_sizes)
         bins = np.arange(np.min(r_array) - res * 0.5, np.max(r_array) + res * 0.5, res)
 
+    if statistic in ("mean", "sum", "count"):
+        # the matrix is cached on the content of r_array, repeated calls
+        # with the same geometry skip the binning
+        matrix = geometry_cache.coordinate_matrix([np.ravel(r_array)], [bins])
+        if statistic == "mean":
+            int_stat, _ = matrix.mean(image, mask)
+        else:
+            values = np.ones(image.shape) if statistic == "count" else image
+            if mask is not None:
+                values = np.where(mask, values, 0)
+            int_stat = matrix.matvec(values)
+        return bin_edges_to_centers(matrix.edges[0]), int_stat
+
+    if mask is None:
+        mask = np.ones(image.shape, dtype=int).astype(bool)
     int_stat, bin_edge, bin_num = sts.binned_statistic(r_array[mask], image[mask], statistic=statistic, bins=bins)
 
     bin_centers = bin_edges_to_centers(bin_edge)
@@ -55,7 +55,7 @@ from skbeam.core.fitting import (
 )
 
 # import fast conversions to reciprocal space
-from skbeam.core.recip import hkl_to_q, process_to_q
+from skbeam.core.recip import hkl_to_q, lazy_process_to_q, process_to_grid, process_to_q
 
 # import utilities for real <-> reciprocal space
 from skbeam.core.utils import (
@@ -88,6 +88,8 @@ __all__ = [
     "gausssian_step",
     # recip
     "process_to_q",
+    "lazy_process_to_q",
+    "process_to_grid",
     "hkl_to_q",
     # core
     "bin_1D",
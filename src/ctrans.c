@@ -52,6 +52,7 @@
 
 
 #include <stdlib.h>
+#include <string.h>
 #include <math.h>
 
 /* Include python and numpy header files */
@@ -75,19 +76,20 @@ static PyObject* ccdToQ(PyObject *self, PyObject *args, PyObject *kwargs){
   int retval;
 
   int mode;
+  int num_threads = 0;
+  int single = 0;
 
   double lambda;
 
   double *anglesp = NULL;
-  double *qOutp = NULL;
+  void *qOutp = NULL;
   double *ubinvp = NULL;
-  double *delgam = NULL;
 
   static char *kwlist[] = { "angles", "mode", "ccd_size", "ccd_pixsize",
 			                      "ccd_cen", "dist", "wavelength",
-			                      "UBinv", NULL };
+			                      "UBinv", "num_threads", "single", NULL };
 
-  if(!PyArg_ParseTupleAndKeywords(args, kwargs, "Oi(ii)(dd)(dd)ddO", kwlist,
+  if(!PyArg_ParseTupleAndKeywords(args, kwargs, "Oi(ii)(dd)(dd)ddO|ip", kwlist,
 				                          &_angles,
 				                          &mode,
 				                          &ccd.xSize, &ccd.ySize,
@@ -95,7 +97,9 @@ static PyObject* ccdToQ(PyObject *self, PyObject *args, PyObject *kwargs){
 				                          &ccd.xCen, &ccd.yCen,
 				                          &ccd.dist,
 				                          &lambda,
-				                          &_ubinv)){
+				                          &_ubinv,
+				                          &num_threads,
+				                          &single)){
 
     return NULL;
   }
@@ -119,51 +123,46 @@ static PyObject* ccdToQ(PyObject *self, PyObject *args, PyObject *kwargs){
   dims[0] = nimages * ccd.size;
   dims[1] = 3;
 
-  qOut = (PyArrayObject*)PyArray_SimpleNew(2, dims, NPY_DOUBLE);
+  qOut = (PyArrayObject*)PyArray_SimpleNew(2, dims, single ? NPY_FLOAT : NPY_DOUBLE);
   if(!qOut){
     goto cleanup;
   }
 
   anglesp = (double *)PyArray_DATA(angles);
-  qOutp = (double *)PyArray_DATA(qOut);
-
-  // Now create the arrays for delta-gamma pairs
-  delgam = (double*)malloc(nimages * ccd.size * sizeof(double) * 2);
-  if(!delgam){
-    goto cleanup;
-  }
+  qOutp = PyArray_DATA(qOut);
 
   // Ok now we don't touch Python Object ... Release the GIL
   Py_BEGIN_ALLOW_THREADS
 
-  retval = processImages(delgam, anglesp, qOutp, lambda, mode, (unsigned long)nimages,
-                         ubinvp, &ccd);
+  retval = processImages(anglesp, qOutp, single, lambda, mode, (unsigned long)nimages,
+                         ubinvp, &ccd, num_threads);
 
   // Now we have finished with the magic ... Obtain the GIL
   Py_END_ALLOW_THREADS
 
   if(retval){
-    PyErr_SetString(PyExc_RuntimeError, "Error processing images");
+    PyErr_SetString(PyExc_MemoryError, "Could not allocate memory in processImages");
     goto cleanup;
   }
 
   Py_XDECREF(ubinv);
   Py_XDECREF(angles);
-  if(delgam) free(delgam);
   return Py_BuildValue("N", qOut);
 
  cleanup:
   Py_XDECREF(ubinv);
   Py_XDECREF(angles);
   Py_XDECREF(qOut);
-  if(delgam) free(delgam);
   return NULL;
 }
 
-int processImages(double *delgam, double *anglesp, double *qOutp, double lambda,
-                  int mode, unsigned long nimages, double *ubinvp, CCD *ccd){
+int processImages(double *anglesp, void *qOutp, int single, double lambda,
+                  int mode, unsigned long nimages, double *ubinvp, CCD *ccd,
+                  int num_threads){
 
   int retval = 0;
+  long k;
+  long nrows = (long)nimages * ccd->ySize;
   unsigned long i;
   double UBI[3][3];
 
@@ -177,74 +176,117 @@ int processImages(double *delgam, double *anglesp, double *qOutp, double lambda,
     ubinvp+=3;
   }
 
-#pragma omp parallel for shared(anglesp, qOutp, delgam, mode)
-  for(i=0;i<nimages;i++){
-    // Calculate pointer offsets
-
-    double *_anglesp = anglesp + (i * 6);
-    double *_qOutp = qOutp + (i * ccd->size * 3);
-    double *_delgam = delgam + (i * ccd->size * 2);
+  if(num_threads <= 0){
+    num_threads = omp_get_max_threads();
+  }
 
-    // For each image process
-    calcDeltaGamma(_delgam, ccd, _anglesp[0], _anglesp[5]);
-    calcQTheta(_delgam, _anglesp[1], _anglesp[4], _qOutp,
-	       ccd->size, lambda);
-    if(mode > 1){
-      calcQPhiFromQTheta(_qOutp, ccd->size, _anglesp[2], _anglesp[3]);
+  // The work is split into the rows of all the images, so that a batch of
+  // a few images still keeps all the threads busy. Each thread converts a
+  // row at a time in its own buffers.
+#pragma omp parallel num_threads(num_threads) shared(anglesp, qOutp, mode, retval)
+  {
+    // gamma only depends on the column, its sine and cosine are computed
+    // once per image instead of once per pixel
+    double *gamTrig = (double *)malloc(sizeof(double) * ccd->xSize * 2);
+    double *qRow = (double *)malloc(sizeof(double) * ccd->xSize * 3);
+    long lastImage = -1;
+    if(!gamTrig || !qRow){
+      retval = 1;
     }
-    if(mode == 4){
-      calcHKLFromQPhi(_qOutp, ccd->size, UBI);
+
+#pragma omp for schedule(static)
+    for(k=0;k<nrows;k++){
+      if(gamTrig && qRow){
+        unsigned long image = k / ccd->ySize;
+        int row = k % ccd->ySize;
+        long offset = (image * ccd->size + (long)row * ccd->xSize) * 3;
+        double *_anglesp = anglesp + (image * 6);
+
+        if((long)image != lastImage){
+          calcGammaTrig(gamTrig, ccd, _anglesp[5]);
+          lastImage = image;
+        }
+        calcQThetaRow(gamTrig, ccd, row, _anglesp[0], _anglesp[1], _anglesp[4],
+                      qRow, lambda);
+        if(mode > 1){
+          calcQPhiFromQTheta(qRow, ccd->xSize, _anglesp[2], _anglesp[3]);
+        }
+        if(mode == 4){
+          calcHKLFromQPhi(qRow, ccd->xSize, UBI);
+        }
+
+        if(single){
+          float *out = (float *)qOutp + offset;
+          long m;
+          for(m=0;m<(long)ccd->xSize * 3;m++){
+            out[m] = (float)qRow[m];
+          }
+        } else {
+          memcpy((double *)qOutp + offset, qRow, sizeof(double) * ccd->xSize * 3);
+        }
+      }
     }
+
+    if(gamTrig) free(gamTrig);
+    if(qRow) free(qRow);
   }
 
   return retval;
 }
 
-int calcDeltaGamma(double *delgam, CCD *ccd, double delCen, double gamCen){
-  // Calculate Delta Gamma Values for CCD
-  int i,j;
-  double *delgamp = delgam;
-  double xPix, yPix;
+int calcGammaTrig(double *gamTrig, CCD *ccd, double gamCen){
+  // Calculate the sine and cosine of the gamma value of each CCD column
+  int i;
+  double xPix, gam;
 
   xPix = ccd->xPixSize / ccd->dist;
-  yPix = ccd->yPixSize / ccd->dist;
 
-  for(j=0;j<ccd->ySize;j++){
-    for(i=0;i<ccd->xSize;i++){
-      *(delgamp++) = delCen - atan( ((double)j - ccd->yCen) * yPix);
-      *(delgamp++) = gamCen - atan( ((double)i - ccd->xCen) * xPix);
-    }
+  for(i=0;i<ccd->xSize;i++){
+    gam = gamCen - atan( ((double)i - ccd->xCen) * xPix);
+    *(gamTrig++) = sin(gam);
+    *(gamTrig++) = cos(gam);
   }
 
   return true;
 }
 
-int calcQTheta(double* diffAngles, double theta, double mu, double *qTheta, int n, double lambda){
-  // Calculate Q in the Theta frame
-  // angles -> Six cicle detector angles [delta gamma]
-  // theta  -> Theta value at this detector setting
-  // mu     -> Mu value at this detector setting
-  // qTheta -> Q Values
-  // n      -> Number of values to convert
+int calcQThetaRow(double *gamTrig, CCD *ccd, int row, double delCen, double theta,
+                  double mu, double *qTheta, double lambda){
+  // Calculate Q in the Theta frame for one row of the CCD
+  // gamTrig -> sine and cosine of gamma of each column (calcGammaTrig)
+  // row     -> The CCD row, delta is the same along a row
+  // delCen  -> Delta value at this detector setting
+  // theta   -> Theta value at this detector setting
+  // mu      -> Mu value at this detector setting
+  // qTheta  -> Q Values
   int i;
-  double *angles;
   double *qt;
-  double kl;
-  double del, gam;
+  double kl, yPix, del;
+  double sinDel, cosDel, sinMu, cosThetaMu, sinThetaMu;
+  double sinGam, cosGam;
 
-  angles = diffAngles;
   qt = qTheta;
   kl = 2 * M_PI / lambda;
-  for(i=0;i<n;i++){
-    del = *(angles++);
-    gam = *(angles++);
-    *qt = (-1.0 * sin(gam) * kl) - (sin(mu) * kl);
+  yPix = ccd->yPixSize / ccd->dist;
+  del = delCen - atan( ((double)row - ccd->yCen) * yPix);
+
+  // the terms that do not change along the row
+  sinDel = sin(del - theta);
+  cosDel = cos(del - theta);
+  sinMu = sin(mu) * kl;
+  cosThetaMu = cos(theta) * cos(mu) * kl;
+  sinThetaMu = sin(theta) * cos(mu) * kl;
+
+  for(i=0;i<ccd->xSize;i++){
+    sinGam = *(gamTrig++);
+    cosGam = *(gamTrig++);
+    *qt = (-1.0 * sinGam * kl) - sinMu;
 
     qt++;
-    *qt = (cos(del - theta) * cos(gam) * kl) - (cos(theta) * cos(mu) * kl);
+    *qt = (cosDel * cosGam * kl) - cosThetaMu;
 
     qt++;
-    *qt = (sin(del - theta) * cos(gam) * kl) + (sin(theta) * cos(mu) * kl);
+    *qt = (sinDel * cosGam * kl) + sinThetaMu;
 
     qt++;
   }
@@ -61,15 +61,16 @@ typedef struct {
   unsigned long *nout;
 } gridderThreadData;
 
-int calcQTheta(double* diffAngles, double theta, double mu,
-               double *qTheta, int n, double lambda);
+int calcQThetaRow(double *gamTrig, CCD *ccd, int row, double delCen, double theta,
+                  double mu, double *qTheta, double lambda);
 int calcQPhiFromQTheta(double *qTheta, int n, double chi, double phi);
-int calcDeltaGamma(double *delgam, CCD *ccd, double delCen, double gamCen);
+int calcGammaTrig(double *gamTrig, CCD *ccd, double gamCen);
 int matmulti(double *val, int n, double mat[][3]);
 int calcHKLFromQPhi(double *qPhi, int n, double mat[][3]);
 
-int processImages(double *delgam, double *anglesp, double *qOutp, double lambda,
-                  int mode, unsigned long nimages, double *ubinvp, CCD *ccd);
+int processImages(double *anglesp, void *qOutp, int single, double lambda,
+                  int mode, unsigned long nimages, double *ubinvp, CCD *ccd,
+                  int num_threads);
 
 int c_grid3d(double *dout, double *d2out, unsigned long *nout, double *sterr, double *data,
              double *grid_start, double *grid_stop, unsigned long max_data,
@@ -1,4 +1,5 @@
 if __name__ == "__main__":
+    import os
     import timeit
 
     import numpy as np
@@ -26,3 +27,11 @@ if __name__ == "__main__":
 
     h._always_use_fillnd = True
     print("Timing h.fill with _always_use_fillnd", timethis("h.fill(x, y, weights=w)"))
+    h._always_use_fillnd = False
+
+    # scaling of the parallel fill with the number of threads
+    serial = timethis("h.fill(x, y, weights=w)")
+    for num_threads in sorted({2, 4, 8, os.cpu_count() or 1}):
+        gg["num_threads"] = num_threads
+        parallel = timethis("h.fill(x, y, weights=w, num_threads=num_threads)")
+        print("Timing h.fill with num_threads={}".format(num_threads), parallel, "speedup", serial / parallel)